@@ -0,0 +1,29 @@
+"""Benchmark of the compact records against the DataObjects models.
+
+Run from the repository root::
+
+    python benchmarks/bench_records.py --n 100000
+
+Prints the construction time per object and the memory held by ``n`` objects
+of each type as JSON. It is the model_construction benchmark of
+``python -m helium_api_wrapper bench``, which runs all benchmarks.
+"""
+import argparse
+import json
+
+from helium_api_wrapper.bench import load_fixtures
+from helium_api_wrapper.bench import model_construction
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    args = parser.parse_args()
+
+    results = model_construction(load_fixtures("tests/data"), args.n)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
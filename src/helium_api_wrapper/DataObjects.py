@@ -8,10 +8,18 @@
 
 """
 
+from datetime import datetime
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Generator
+from typing import Iterator
 from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+from typing import overload
 
 from pydantic import BaseModel
 
@@ -89,6 +97,246 @@ class Witness(BaseModel):
     snr: Optional[float] = None
 
 
+class WitnessArray(Sequence[Witness]):
+    """Struct of arrays storage for the witnesses of a challenge.
+
+    Numeric fields are kept in NumPy arrays and gateway, owner, location and
+    datarate are dictionary encoded, so filtering and top k selection run
+    vectorized instead of walking Witness objects. Indexing and iteration
+    still return Witness objects for compatibility with lists.
+    NumPy is only imported once an array is built.
+    """
+
+    __ENCODED = ("gateway", "owner", "location", "datarate")
+
+    def __init__(
+        self,
+        columns: Dict[str, Any],
+        categories: Dict[str, Tuple[str, ...]],
+        packet_hash: List[str],
+    ) -> None:
+        """Create the array from its columns.
+
+        :param columns: NumPy arrays of timestamp, signal, snr, is_valid and
+            the codes of the dictionary encoded fields
+        :param categories: Values of the dictionary encoded fields
+        :param packet_hash: Packet hashes of the witnesses
+        """
+        self.timestamp = columns["timestamp"]
+        self.signal = columns["signal"]
+        self.snr = columns["snr"]
+        self.is_valid = columns["is_valid"]
+        self.codes = {field: columns[field] for field in self.__ENCODED}
+        self.categories = categories
+        self.packet_hash = packet_hash
+
+    @classmethod
+    def from_dicts(cls, witnesses: Sequence[Dict[str, Any]]) -> "WitnessArray":
+        """Build the array from witness payloads without creating models.
+
+        :param witnesses: Witness payloads from the API
+        :return: The witness array
+        """
+        import numpy as np
+
+        columns: Dict[str, Any] = {
+            "timestamp": np.array([w["timestamp"] for w in witnesses], dtype=np.int64),
+            "signal": np.array([w["signal"] for w in witnesses], dtype=np.int32),
+            "snr": np.array(
+                [np.nan if w.get("snr") is None else w["snr"] for w in witnesses],
+                dtype=np.float64,
+            ),
+            "is_valid": np.array(
+                [-1 if w.get("is_valid") is None else w["is_valid"] for w in witnesses],
+                dtype=np.int8,
+            ),
+        }
+        categories = {}
+        for field in cls.__ENCODED:
+            lookup: Dict[str, int] = {}
+            codes = [
+                -1 if w.get(field) is None else lookup.setdefault(w[field], len(lookup))
+                for w in witnesses
+            ]
+            columns[field] = np.array(codes, dtype=np.int32)
+            categories[field] = tuple(lookup)
+        return cls(columns, categories, [w["packet_hash"] for w in witnesses])
+
+    @classmethod
+    def from_witnesses(cls, witnesses: Sequence[Witness]) -> "WitnessArray":
+        """Build the array from witness models.
+
+        :param witnesses: The witnesses
+        :return: The witness array
+        """
+        return cls.from_dicts([witness.__dict__ for witness in witnesses])
+
+    @classmethod
+    def __get_validators__(cls) -> Generator[Callable[[Any], Any], None, None]:
+        """Allow the array as value of pydantic fields."""
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value: Any) -> "WitnessArray":
+        """Accept only witness arrays, lists are validated as List[Witness].
+
+        :param value: The value of the field
+        :raises TypeError: If the value is not a witness array
+        :return: The witness array
+        """
+        if not isinstance(value, cls):
+            raise TypeError("WitnessArray required")
+        return value
+
+    def __len__(self) -> int:
+        """Return the number of witnesses."""
+        return len(self.signal)
+
+    @overload
+    def __getitem__(self, index: int) -> Witness:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "WitnessArray":
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Witness, "WitnessArray"]:
+        """Get a witness or a slice of the array."""
+        if isinstance(index, slice):
+            return self.take(range(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("WitnessArray index out of range")
+        snr = float(self.snr[index])
+        is_valid = int(self.is_valid[index])
+        values: Dict[str, Any] = {
+            field: self.__decode(field, index) for field in self.__ENCODED
+        }
+        return Witness.construct(
+            timestamp=int(self.timestamp[index]),
+            signal=int(self.signal[index]),
+            packet_hash=self.packet_hash[index],
+            snr=None if snr != snr else snr,
+            is_valid=None if is_valid == -1 else bool(is_valid),
+            **values,
+        )
+
+    def __iter__(self) -> Iterator[Witness]:
+        """Iterate over the witnesses."""
+        return (self[index] for index in range(len(self)))
+
+    def to_list(self) -> List[Witness]:
+        """Convert the array to a list of witnesses.
+
+        :return: The witnesses
+        """
+        return list(self)
+
+    def take(self, indices: Any) -> "WitnessArray":
+        """Select witnesses by position.
+
+        :param indices: Positions of the witnesses
+        :return: The selected witnesses
+        """
+        import numpy as np
+
+        indices = np.asarray(indices, dtype=np.intp)
+        columns = {
+            "timestamp": self.timestamp[indices],
+            "signal": self.signal[indices],
+            "snr": self.snr[indices],
+            "is_valid": self.is_valid[indices],
+        }
+        for field, codes in self.codes.items():
+            columns[field] = codes[indices]
+        packet_hash = [self.packet_hash[index] for index in indices]
+        return WitnessArray(columns, self.categories, packet_hash)
+
+    def filter(self, mask: Any) -> "WitnessArray":
+        """Select the witnesses of a boolean mask.
+
+        :param mask: Boolean array with one entry per witness
+        :return: The selected witnesses
+        """
+        return self.take(mask.nonzero()[0])
+
+    def mask(
+        self,
+        valid_only: bool = False,
+        min_snr: Optional[float] = None,
+        datarates: Optional[Sequence[str]] = None,
+    ) -> Any:
+        """Build a boolean mask of the witnesses passing the given filters.
+
+        :param valid_only: Only accept witnesses that are valid
+        :param min_snr: Minimum snr of a witness
+        :param datarates: Accepted datarates
+        :return: Boolean array with one entry per witness
+        """
+        import numpy as np
+
+        mask = np.ones(len(self), dtype=bool)
+        if valid_only:
+            mask &= self.is_valid == 1
+        if min_snr is not None:
+            mask &= self.snr >= min_snr
+        if datarates is not None:
+            mask &= self.isin("datarate", datarates)
+        return mask
+
+    def isin(self, field: str, values: Sequence[str]) -> Any:
+        """Check the values of a dictionary encoded field.
+
+        :param field: gateway, owner, location or datarate
+        :param values: The accepted values
+        :return: Boolean array with one entry per witness
+        """
+        import numpy as np
+
+        wanted = set(values)
+        accepted = [
+            code for code, value in enumerate(self.categories[field]) if value in wanted
+        ]
+        return np.isin(self.codes[field], accepted)
+
+    def top_k(
+        self,
+        k: Optional[int] = None,
+        by: str = "signal",
+        mask: Any = None,
+        largest: bool = True,
+    ) -> Any:
+        """Get the positions of the k best witnesses.
+
+        Uses a partial sort, so selecting k out of n witnesses is O(n).
+        Missing snr values are ranked last.
+
+        :param k: Number of witnesses, None sorts all of them
+        :param by: signal or snr
+        :param mask: Boolean array of the witnesses to consider
+        :param largest: Select the witnesses with the highest values
+        :return: Positions of the selected witnesses, best first
+        """
+        import numpy as np
+
+        values = {"signal": self.signal, "snr": self.snr}[by].astype(np.float64)
+        candidates = np.arange(len(self)) if mask is None else mask.nonzero()[0]
+        scores = -values[candidates] if largest else values[candidates]
+        scores[np.isnan(scores)] = np.inf
+        if k is None or k >= len(candidates):
+            order = scores.argsort(kind="stable")
+        else:
+            part = scores.argpartition(k - 1)[:k]
+            order = part[scores[part].argsort(kind="stable")]
+        return candidates[order]
+
+    def __decode(self, field: str, index: int) -> Optional[str]:
+        """Get the value of a dictionary encoded field."""
+        code = int(self.codes[field][index])
+        return None if code == -1 else self.categories[field][code]
+
+
 class Receipt(BaseModel):
     """Class to describe Receipt Object."""
 
@@ -145,7 +393,7 @@ class ChallengeResolved(BaseModel):
     onion_key_hash: Optional[str] = None
     height: Optional[int] = None
     hash: Optional[str] = None
-    witnesses: Optional[List[Witness]] = None
+    witnesses: Optional[Union[WitnessArray, List[Witness]]] = None
     receipt: Optional[Receipt] = None
     geocode: Optional[Geocode] = None
     challengee_owner: Optional[str] = None
@@ -160,6 +408,11 @@ class ChallengeResolved(BaseModel):
     challenger: Optional[str] = None
     fee: Optional[int] = None
 
+    class Config:
+        """Serialize witness arrays like lists of witnesses."""
+
+        json_encoders = {WitnessArray: lambda witnesses: witnesses.to_list()}
+
 
 class Device(BaseModel):
     """Class to describe Device in Helium API."""
@@ -198,3 +451,56 @@ class IntegrationEvent(Event):
     """Class to describe an Integration Event."""
 
     hotspots: List[IntegrationHotspot]
+
+
+class EventQuery(BaseModel):
+    """Class to describe a filter of Console device events.
+
+    Times are datetimes or integer timestamps in milliseconds, like
+    reported_at. Integers are kept as they are and never read as seconds.
+    """
+
+    category: Optional[str] = None
+    sub_category: Optional[str] = None
+    start: Optional[Union[int, datetime]] = None
+    end: Optional[Union[int, datetime]] = None
+    limit: Optional[int] = None
+
+    def params(self) -> Dict[str, Any]:
+        """Get the query parameters of the request.
+
+        :return: Parameters of the set filters, times in milliseconds
+        """
+        params: Dict[str, Any] = {}
+        for name, value in self.dict(exclude_none=True).items():
+            if name in ("start", "end"):
+                value = self.__milliseconds(value)
+            params[name] = value
+        return params
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """Check an event payload against the filter without parsing its data.
+
+        :param event: Event as returned by the API
+        :return: True if the event passes the filter
+        """
+        if self.category is not None and event.get("category") != self.category:
+            return False
+        if (
+            self.sub_category is not None
+            and event.get("sub_category") != self.sub_category
+        ):
+            return False
+        if self.start is None and self.end is None:
+            return True
+        reported_at = int(event["reported_at"])
+        if self.start is not None and reported_at < self.__milliseconds(self.start):
+            return False
+        return self.end is None or reported_at < self.__milliseconds(self.end)
+
+    @staticmethod
+    def __milliseconds(value: Union[int, datetime]) -> int:
+        """Convert a time to a timestamp in milliseconds."""
+        if isinstance(value, datetime):
+            return int(value.timestamp() * 1000)
+        return value
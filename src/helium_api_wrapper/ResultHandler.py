@@ -8,64 +8,1195 @@
 
 """
 
+import json
 import logging
+import math
+import multiprocessing
+import operator
 import os
+import pickle  # noqa: S403
+import queue
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC
+from abc import abstractmethod
+from contextlib import ExitStack
+from datetime import datetime
+from datetime import timezone
+from functools import reduce
+from itertools import chain
+from itertools import islice
+from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import Generator
-from typing import Sequence
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Type
 from typing import Union
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
 from pydantic import BaseModel
 
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.records import Record
+from helium_api_wrapper.schemas import file_schema
+from helium_api_wrapper.schemas import nullable_pandas_type
+from helium_api_wrapper.schemas import schema_of
+from helium_api_wrapper.schemas import to_record_batch
+from helium_api_wrapper.sqlite_store import SQLiteStore
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+Data = Union[Iterable[BaseModel], Iterable[Record], Iterable[pa.RecordBatch]]
+
+RegionFunction = Callable[[Optional[float], Optional[float]], str]
+
+FILE_EXTENSIONS = {
+    "csv": ".csv",
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "pickle": ".pkl",
+    "pickle-chunks": ".chunks.pkl",
+    "feather": ".feather",
+    "parquet": ".parquet",
+    "sqlite": ".sqlite",
+}
+
+DATASET_FORMATS = ("parquet", "feather")
+# Formats that store repeated identifiers dictionary encoded
+DICTIONARY_FORMATS = ("pickle-chunks", "feather", "parquet")
+# Formats whose writers compress the file, the others are written as they are
+COMPRESSED_FORMATS = ("feather", "parquet")
+MANIFEST_FILE = "_manifest.json"
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+# Columns of hotspot addresses that are matched by the addresses filter of read
+ADDRESS_COLUMNS = ("challengee", "witness", "address")
+# Location of the rows that is used to partition them by region
+REGION_COLUMNS = ("challengee_lat", "challengee_lng")
+
+SHARD_KEYS = ("hash", "time")
+PARTITION_SCHEMA = pa.schema([("date", pa.string()), ("region", pa.string())])
+
+# Guards the manifests against the threads of one process, datasets support
+# a single writing process at a time
+__MANIFEST_LOCK = threading.Lock()
+# Queued to the shard workers to drop their file
+__ABORT = "abort"
+# Seconds after which a blocked shard queue checks if its worker is alive
+__WORKER_POLL = 1.0
+
 
 def write(
-    data: Union[Sequence[BaseModel], Generator[BaseModel, None, None]],
+    data: Data,
     path: str,
     file_name: str,
     file_format: str,
+    dictionary_encode: bool = True,
+    chunk_size: int = 100_000,
 ) -> None:
-    """Write the data to a file."""
-    parsed_data = pd.DataFrame([x.dict() for x in data])
-    os.makedirs(path, exist_ok=True)
-    if file_format == "csv":
-        __write_csv(parsed_data, path, file_name)
-    elif file_format == "json":
-        __write_json(parsed_data, path, file_name)
-    elif file_format == "pickle":
-        __write_pickle(parsed_data, path, file_name)
-    elif file_format == "feather":
-        __write_feather(parsed_data, path, file_name)
-    elif file_format == "parquet":
-        __write_parquet(parsed_data, path, file_name)
-    else:
+    """Write the data to a file.
+
+    The data is consumed and written in chunks of ``chunk_size`` rows, so
+    memory stays flat no matter how many rows a generator yields. Parquet
+    files get one row group and Feather files one record batch per chunk and
+    CSV and JSON Lines are appended. Pickle files hold one data frame, read
+    with pandas.read_pickle, for which the chunks are kept in memory as Arrow
+    tables until the end. The pickle-chunks format instead holds one data
+    frame per chunk, see read_pickle. The file is written under a temporary
+    name and moved into place once complete.
+
+    Chunks are converted to Arrow with the schema of their model, see
+    arrow_schema, so all chunks and runs share the same column types.
+    Columns of repeated identifiers like hotspot addresses are dictionary
+    encoded in parquet, feather and pickle-chunks files, i.e. categorical in
+    the latter.
+
+    The sqlite format adds the rows to an SQLiteStore instead, which keeps
+    the rows of earlier runs.
+
+    :param data: Models, records or record batches, e.g. from load_challenge_data
+    :param path: Directory of the output file
+    :param file_name: Name of the output file without extension
+    :param file_format: csv, json, jsonl, pickle, pickle-chunks, feather,
+        parquet or sqlite
+    :param dictionary_encode: Store repeated identifiers dictionary encoded
+    :param chunk_size: Number of rows per chunk
+    """
+    if file_format not in FILE_EXTENSIONS:
         logger.error(f"File format {file_format} not supported.")
+        return
+
+    os.makedirs(path, exist_ok=True)
+    file_path = os.path.join(path, file_name + FILE_EXTENSIONS[file_format])
+    if file_format == "sqlite":
+        with SQLiteStore(file_path, batch_size=chunk_size) as store:
+            inserted = store.write(data)
+        logger.info(f"Added {inserted} rows to {file_path}")
+        return
+
+    writer = __open_writer(file_format, file_path)
+    encode = dictionary_encode and file_format in DICTIONARY_FORMATS
+    try:
+        for chunk in iter_tables(data, chunk_size, encode):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
     logger.info(f"File {file_name} saved to {path}")
 
 
-def __write_csv(data: pd.DataFrame, path: str, file_name: str) -> None:
-    """Write the data to a csv file."""
-    data.to_csv(os.path.join(path, file_name + ".csv"))
+def iter_tables(
+    data: Data, chunk_size: int, dictionary_encode: bool = True
+) -> Generator[pa.Table, None, None]:
+    """Convert models, records or record batches to Arrow tables chunk by chunk.
+
+    :param data: Models, records or record batches
+    :param chunk_size: Number of rows per chunk
+    :param dictionary_encode: Dictionary encode repeated identifiers
+    :return: Tables of at most chunk_size rows with the schema of the file
+    """
+    items = iter(data)
+    first = next(items, None)
+    if first is None:
+        return
+    if isinstance(first, pa.RecordBatch):
+        schema = file_schema(first.schema, dictionary_encode)
+        for batches in __iter_batch_chunks(chain([first], items), chunk_size):
+            yield pa.Table.from_batches(batches).cast(schema)
+        return
+
+    schema = schema_of(first, dictionary_encode)
+    rows: Iterator[Any] = chain([first], items)
+    while chunk := list(islice(rows, chunk_size)):
+        yield pa.Table.from_batches([to_record_batch(chunk, schema)])
+
+
+def read_pickle(file_path: str) -> pd.DataFrame:
+    """Read a pickle file written in chunks by write in the pickle-chunks format.
+
+    Files of the pickle format, which hold one data frame, are read as well.
+
+    :param file_path: Path of the pickle file
+    :return: The concatenated data frame
+    """
+    frames = []
+    with open(file_path, "rb") as file:
+        while True:
+            try:
+                frames.append(pickle.load(file))  # noqa: S301
+            except EOFError:
+                break
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_incremental(
+    data: Data,
+    path: str,
+    file_name: str,
+    file_format: str,
+    every: int = 1_000,
+    interval: float = 60.0,
+    region: Union[bool, RegionFunction] = False,
+    dictionary_encode: bool = True,
+    on_flush: Optional[Callable[[], None]] = None,
+) -> int:
+    """Write the data while it is loaded, every few challenges or seconds.
+
+    Rows are buffered until ``every`` challenges were loaded or ``interval``
+    seconds passed and then appended atomically: parquet and feather to the
+    dataset path/file_name, see write_dataset, sqlite to the database
+    path/file_name.sqlite in one transaction per batch and the other formats
+    as part files with unique names in the directory path/file_name, so
+    later runs add parts next to those of earlier ones. What was flushed can
+    be read while loading goes on and survives a crash, and memory is
+    bounded by the buffer.
+
+    Buffers are only flushed between challenges. The rows of the last
+    challenge of a record batch are held back until the next batch shows
+    whether it goes on. Pass the flush method of a SeenChallengeIndex as
+    on_flush, so challenges are only marked as seen once their rows are
+    stored.
+
+    :param data: Models, records or record batches, e.g. from load_challenge_data
+    :param path: Directory of the output
+    :param file_name: Name of the dataset, database or part directory
+    :param file_format: csv, json, jsonl, pickle, pickle-chunks, feather,
+        parquet or sqlite
+    :param every: Number of challenges after which to flush
+    :param interval: Seconds after which to flush
+    :param region: Partition datasets by region, see write_dataset
+    :param dictionary_encode: Store repeated identifiers dictionary encoded
+    :param on_flush: Called after each flush
+    :raises ValueError: If the file format is not supported
+    :return: Number of flushes
+    """
+    if file_format not in FILE_EXTENSIONS:
+        raise ValueError(f"File format {file_format} not supported.")
+    target = os.path.join(path, file_name)
+
+    with ExitStack() as stack:
+        store = None
+        if file_format == "sqlite":
+            store = stack.enter_context(SQLiteStore(target + FILE_EXTENSIONS["sqlite"]))
+
+        def flush(buffer: List[Any]) -> None:
+            if store is not None:
+                store.write(buffer)
+            elif file_format in DATASET_FORMATS:
+                write_dataset(
+                    buffer,
+                    target,
+                    file_format,
+                    region,
+                    dictionary_encode=dictionary_encode,
+                )
+            else:
+                write(
+                    buffer,
+                    target,
+                    f"part-{uuid.uuid4().hex}",
+                    file_format,
+                    dictionary_encode=dictionary_encode,
+                )
+            if on_flush is not None:
+                on_flush()
+
+        return __buffer_challenges(data, flush, every, interval)
+
+
+def write_dataset(
+    data: Data,
+    path: str,
+    file_format: str = "parquet",
+    region: Union[bool, RegionFunction] = False,
+    dictionary_encode: bool = True,
+    chunk_size: int = 100_000,
+) -> List[Dict[str, Any]]:
+    """Append the data to a partitioned dataset.
+
+    Rows are laid out Hive style by the date of their ``time``, e.g.
+    ``date=2023-01-31/part-<id>.parquet``, and optionally by the region of
+    the challengee, e.g. ``date=2023-01-31/region=N50E010/...``. Every call
+    adds new files and never rewrites existing ones. Files are written under
+    hidden temporary names, moved into place once complete and then added to
+    the manifest ``_manifest.json``, which lists the files of the dataset.
+    Readers like pyarrow.dataset ignore the hidden and the manifest files.
+
+    Threads of one process may append to a dataset at the same time, but
+    only one process may write to it at once. The manifest is only locked
+    within a process, so concurrent processes can lose each other's files.
+
+    :param data: Models, records or record batches with a time column
+    :param path: Directory of the dataset
+    :param file_format: parquet or feather
+    :param region: True to partition by a 10 degree grid of the challengee
+        location or a function mapping latitude and longitude to a region
+    :param dictionary_encode: Store repeated identifiers dictionary encoded
+    :param chunk_size: Number of rows per chunk
+    :raises ValueError: If the file format is not supported
+    :return: The manifest entries of the new files
+    """
+    if file_format not in DATASET_FORMATS:
+        raise ValueError(f"File format {file_format} not supported for datasets.")
+    region_of = grid_region if region is True else region or None
+
+    writers: Dict[str, _ChunkWriter] = {}
+    try:
+        for chunk in iter_tables(data, chunk_size, dictionary_encode):
+            for partition, table in __partition(chunk, region_of):
+                writer = writers.get(partition)
+                if writer is None:
+                    writer = writers[partition] = __open_part(
+                        path, partition, file_format
+                    )
+                writer.write(table)
+    except BaseException:
+        for writer in writers.values():
+            writer.abort()
+        raise
+
+    entries = []
+    for partition, writer in writers.items():
+        writer.close()
+        entries.append(__manifest_entry(path, partition, writer.file_path, writer.rows))
+    if entries:
+        __update_manifest(path, file_format, added=entries)
+    logger.info(f"Appended {len(entries)} files to dataset {path}")
+    return entries
+
+
+def write_sharded(
+    data: Data,
+    path: str,
+    file_name: str,
+    file_format: str = "parquet",
+    shards: int = 4,
+    shard_by: str = "hash",
+    workers: str = "thread",
+    compression: Optional[str] = None,
+    dictionary_encode: bool = True,
+    chunk_size: int = 100_000,
+    queue_size: int = 4,
+) -> List[Dict[str, Any]]:
+    """Write the data to several files in parallel.
+
+    Rows are spread over ``shards`` files by the challenge hash, so all
+    witnesses of a challenge end up in the same file, or by the day of their
+    time. Each shard is written by its own worker with its own compressor
+    and fed through a bounded queue, so serialization and compression use
+    one core per shard while memory stays bounded. Threads suffice for
+    parquet and feather, whose writers release the GIL, processes also
+    parallelize csv and json. The files are laid out as
+    path/file_name/shard=<n>/part-<id>.<ext> and listed in the manifest of
+    that directory, see read_manifest, so parquet and feather shards can be
+    read with read.
+
+    :param data: Models, records or record batches, e.g. from load_challenge_data
+    :param path: Directory of the output
+    :param file_name: Name of the directory of the shards
+    :param file_format: csv, json, jsonl, pickle, pickle-chunks, feather or
+        parquet
+    :param shards: Number of shards and workers
+    :param shard_by: hash or time
+    :param workers: thread or process
+    :param compression: Codec of parquet and feather files, e.g. zstd
+    :param dictionary_encode: Store repeated identifiers dictionary encoded
+    :param chunk_size: Number of rows per chunk
+    :param queue_size: Number of chunks that may wait for each worker
+    :raises ValueError: If an argument is not supported
+    :raises RuntimeError: If a worker failed or died
+    :return: The manifest entries of the new files
+    """
+    __check_shard_options(file_format, shard_by, workers, compression)
+    target = os.path.join(path, file_name)
+    partitions = [f"shard={shard:05d}" for shard in range(shards)]
+    files = [__part_path(target, partition, file_format) for partition in partitions]
+    chunks, results, runners = __start_shard_workers(
+        workers, queue_size, file_format, files, compression
+    )
+
+    encode = dictionary_encode and file_format in DICTIONARY_FORMATS
+    end = None
+    try:
+        for table in iter_tables(data, chunk_size, encode):
+            for shard, part in __shard(table, shards, shard_by):
+                if not __put_chunk(chunks[shard], part, runners[shard]):
+                    raise RuntimeError(f"Writing shards failed, shard {shard} died")
+    except BaseException:
+        end = __ABORT
+        raise
+    finally:
+        for shard_chunks, worker in zip(chunks, runners):
+            __put_chunk(shard_chunks, end, worker)
+        outcomes = __collect_outcomes(results, runners)
+        for worker in runners:
+            worker.join()
+
+    errors = [f"shard {shard}: {error}" for shard, _, error in outcomes if error]
+    if errors:
+        raise RuntimeError(f"Writing shards failed, {'; '.join(errors)}")
+    entries = []
+    for (shard, rows, _), partition, file_path in zip(outcomes, partitions, files):
+        if rows == 0:
+            os.remove(file_path)
+            continue
+        entries.append(__manifest_entry(target, partition, file_path, rows))
+    __update_manifest(target, file_format, added=entries)
+    logger.info(f"Wrote {len(entries)} shards to {target}")
+    return entries
+
+
+def compact_dataset(path: str, min_rows: int = 1_000_000) -> int:
+    """Merge the small files of each partition of a dataset.
+
+    Files with less than ``min_rows`` rows are merged per partition into one
+    new file. The manifest is switched to the new file before the merged
+    files are deleted, so readers of the manifest never see rows twice.
+    Like write_dataset, it must not run while another process writes to the
+    dataset.
+
+    :param path: Directory of the dataset
+    :param min_rows: Files with less rows are merged
+    :return: Number of merged files
+    """
+    manifest = read_manifest(path)
+    file_format = manifest["format"]
+    small: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in manifest["files"]:
+        if entry["rows"] < min_rows:
+            small.setdefault(entry["partition"], []).append(entry)
+
+    merged = 0
+    for partition, entries in small.items():
+        if len(entries) < 2:
+            continue
+        writer = __open_part(path, partition, file_format)
+        try:
+            for entry in entries:
+                writer.write(
+                    __read_part(os.path.join(path, entry["path"]), file_format)
+                )
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        __update_manifest(
+            path,
+            file_format,
+            added=[__manifest_entry(path, partition, writer.file_path, writer.rows)],
+            removed=[entry["path"] for entry in entries],
+        )
+        for entry in entries:
+            os.remove(os.path.join(path, entry["path"]))
+        merged += len(entries)
+    logger.info(f"Compacted {merged} files of dataset {path}")
+    return merged
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    """Read the manifest of a dataset.
+
+    :param path: Directory of the dataset
+    :return: The manifest, with no files for a new dataset
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {"format": None, "files": []}
+    with open(manifest_path) as file:
+        manifest: Dict[str, Any] = json.load(file)
+    return manifest
+
+
+def open_dataset(path: str) -> ds.Dataset:
+    """Open an exported file or dataset without reading it.
+
+    Feather files are memory mapped. Datasets of write_dataset are opened
+    with the files of their manifest and their Hive partitions, so filters on
+    ``date`` and ``region`` skip whole directories.
+
+    :param path: Path of a parquet or feather file or of a dataset directory
+    :raises ValueError: If the format of the path is not supported
+    :return: The pyarrow dataset
+    """
+    filesystem = pafs.LocalFileSystem(use_mmap=True)
+    if not os.path.isdir(path):
+        return ds.dataset(path, format=__dataset_format(path), filesystem=filesystem)
+
+    manifest = read_manifest(path)
+    if manifest["files"]:
+        files = [os.path.join(path, entry["path"]) for entry in manifest["files"]]
+        file_format = manifest["format"]
+    else:
+        files = [path]
+        file_format = next(
+            (
+                __dataset_format(name)
+                for _, _, names in os.walk(path)
+                for name in names
+                if name.endswith((".parquet", ".feather"))
+            ),
+            "parquet",
+        )
+    return ds.dataset(
+        files,
+        format=__dataset_format(f".{file_format}"),
+        filesystem=filesystem,
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+        partition_base_dir=path,
+    )
+
+
+def read(
+    path: str,
+    columns: Optional[List[str]] = None,
+    start: Optional[Union[int, datetime]] = None,
+    end: Optional[Union[int, datetime]] = None,
+    addresses: Optional[Iterable[str]] = None,
+    min_signal: Optional[int] = None,
+    output: str = "arrow",
+    model: Type[BaseModel] = ChallengeResult,
+) -> Union[pa.Table, pd.DataFrame, Iterator[BaseModel]]:
+    """Read an export back, only loading the requested rows and columns.
+
+    Filters are pushed down to the files: partitions of other days are
+    skipped, parquet row groups are skipped by their statistics and feather
+    files are memory mapped, so only the pages that are needed are read.
+
+    :param path: Path of a parquet or feather file or of a dataset directory
+    :param columns: Columns to read, None reads all
+    :param start: Earliest time of the rows, as a timestamp or datetime
+    :param end: Time before which the rows are, as a timestamp or datetime
+    :param addresses: Hotspots, matched against the challengee, witness and
+        address columns
+    :param min_signal: Minimum signal of the rows
+    :param output: arrow for a pyarrow Table, pandas for a DataFrame or
+        models for an iterator of models
+    :param model: Model of the rows for output models
+    :raises ValueError: If the output is not supported
+    :return: The rows
+    """
+    if output not in ("arrow", "pandas", "models"):
+        raise ValueError(f"Output {output} not supported.")
+    dataset = open_dataset(path)
+    names = dataset.schema.names
+    condition = __filter(names, start, end, addresses, min_signal)
+
+    if output == "models":
+        fields = [name for name in columns or names if name in model.__fields__]
+        return __iter_models(dataset, fields, condition, model)
+    table = dataset.to_table(columns=columns, filter=condition)
+    if output == "pandas":
+        return _to_data_frame(table)
+    return table
+
+
+def grid_region(lat: Optional[float], lng: Optional[float], size: float = 10.0) -> str:
+    """Get the cell of a location in a grid of size degrees, e.g. N50E010.
+
+    :param lat: Latitude of the location
+    :param lng: Longitude of the location
+    :param size: Size of the grid cells in degrees
+    :return: The cell, named after its south west corner
+    """
+    if lat is None or lng is None or math.isnan(lat) or math.isnan(lng):
+        return DEFAULT_PARTITION
+    south = math.floor(lat / size) * size
+    west = math.floor(lng / size) * size
+    return (
+        f"{'N' if south >= 0 else 'S'}{abs(south):02.0f}"
+        f"{'E' if west >= 0 else 'W'}{abs(west):03.0f}"
+    )
+
+
+def __dataset_format(path: str) -> str:
+    """Get the pyarrow dataset format of a file by its extension."""
+    if path.endswith(".parquet"):
+        return "parquet"
+    if path.endswith((".feather", ".arrow")):
+        return "feather"
+    raise ValueError(f"Can not read {path}, only parquet and feather are supported.")
+
+
+def __filter(
+    names: List[str],
+    start: Optional[Union[int, datetime]],
+    end: Optional[Union[int, datetime]],
+    addresses: Optional[Iterable[str]],
+    min_signal: Optional[int],
+) -> Optional[ds.Expression]:
+    """Build the filter expression of read for the columns of a dataset."""
+    conditions = []
+    if start is not None:
+        conditions.append(ds.field("time") >= __timestamp(start))
+        if "date" in names:
+            conditions.append(ds.field("date") >= __date(start))
+    if end is not None:
+        conditions.append(ds.field("time") < __timestamp(end))
+        if "date" in names:
+            conditions.append(ds.field("date") <= __date(end))
+    if addresses is not None:
+        values = pa.array(list(addresses), pa.string())
+        matches = [
+            ds.field(column).isin(values)
+            for column in ADDRESS_COLUMNS
+            if column in names
+        ]
+        if matches:
+            conditions.append(reduce(operator.or_, matches))
+    if min_signal is not None:
+        conditions.append(ds.field("signal") >= min_signal)
+    return reduce(operator.and_, conditions) if conditions else None
+
+
+def __timestamp(value: Union[int, datetime]) -> int:
+    """Convert a datetime to a timestamp in seconds."""
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return value
+
+
+def __date(value: Union[int, datetime]) -> str:
+    """Get the date partition of a time."""
+    return datetime.fromtimestamp(__timestamp(value), timezone.utc).strftime("%Y-%m-%d")
+
+
+def __iter_models(
+    dataset: ds.Dataset,
+    columns: List[str],
+    condition: Optional[ds.Expression],
+    model: Type[BaseModel],
+) -> Generator[BaseModel, None, None]:
+    """Create models batch by batch from the scanned rows."""
+    for batch in dataset.to_batches(columns=columns, filter=condition):
+        for row in batch.to_pylist():
+            yield model.construct(**row)
+
+
+def __buffer_challenges(
+    data: Data,
+    flush: Callable[[List[Any]], None],
+    every: int,
+    interval: float,
+) -> int:
+    """Pass the data to flush in buffers of whole challenges."""
+    buffer: List[Any] = []
+    pending: List[pa.RecordBatch] = []
+    challenges = 0
+    last_hash = None
+    started = time.monotonic()
+    flushes = 0
+    for item in data:
+        if isinstance(item, pa.RecordBatch):
+            # batches are cut by size, the last challenge of a batch may go on
+            # in the next one and is held back until it is complete
+            complete, pending = __complete_challenges(item, pending)
+            buffer.extend(complete)
+            challenges += sum(
+                pc.count_distinct(batch.column("hash")).as_py() for batch in complete
+            )
+            due = bool(complete)
+        else:
+            item_hash = getattr(item, "hash", None)
+            due = item_hash != last_hash
+            if due:
+                challenges += 1
+                last_hash = item_hash
+        due = due and (challenges > every or time.monotonic() - started >= interval)
+        if due and buffer:
+            flush(buffer)
+            flushes += 1
+            buffer = []
+            challenges = 0 if isinstance(item, pa.RecordBatch) else 1
+            started = time.monotonic()
+        if not isinstance(item, pa.RecordBatch):
+            buffer.append(item)
+    buffer.extend(pending)
+    if buffer:
+        flush(buffer)
+        flushes += 1
+    return flushes
+
+
+def __complete_challenges(
+    batch: pa.RecordBatch, pending: List[pa.RecordBatch]
+) -> Tuple[List[pa.RecordBatch], List[pa.RecordBatch]]:
+    """Split the rows of finished challenges from those of the last challenge.
+
+    :param batch: The next record batch
+    :param pending: Rows of the last challenge of the previous batches
+    :return: Batches of finished challenges and of the last challenge
+    """
+    if batch.num_rows == 0:
+        return [], pending
+    hashes = batch.column("hash").to_pylist()
+    start = len(hashes) - 1
+    while start > 0 and hashes[start - 1] == hashes[-1]:
+        start -= 1
+    if start == 0 and pending and pending[-1].column("hash")[-1].as_py() == hashes[-1]:
+        return [], pending + [batch]
+    complete = pending + ([batch.slice(0, start)] if start > 0 else [])
+    return complete, [batch.slice(start)]
+
+
+def __shard(
+    table: pa.Table, shards: int, shard_by: str
+) -> Generator[Tuple[int, pa.Table], None, None]:
+    """Split a table into the parts of its shards."""
+    if shard_by == "hash":
+        keys = [
+            zlib.crc32(value.encode()) if value is not None else 0
+            for value in table["hash"].to_pylist()
+        ]
+    else:
+        keys = [(value or 0) // 86_400 for value in table["time"].to_pylist()]
+
+    rows: Dict[int, List[int]] = {}
+    for index, key in enumerate(keys):
+        rows.setdefault(key % shards, []).append(index)
+    for shard, indices in rows.items():
+        yield shard, table.take(pa.array(indices, pa.int64()))
+
+
+def __check_shard_options(
+    file_format: str, shard_by: str, workers: str, compression: Optional[str]
+) -> None:
+    """Check the options of write_sharded."""
+    if file_format not in FILE_EXTENSIONS or file_format == "sqlite":
+        raise ValueError(f"File format {file_format} not supported for shards.")
+    if compression is not None and file_format not in COMPRESSED_FORMATS:
+        raise ValueError(
+            f"Compression is not supported for {file_format}, "
+            f"only for {COMPRESSED_FORMATS}."
+        )
+    if shard_by not in SHARD_KEYS:
+        raise ValueError(f"Can not shard by {shard_by}, use one of {SHARD_KEYS}.")
+    if workers not in ("thread", "process"):
+        raise ValueError(f"Workers {workers} not supported, use thread or process.")
+
+
+def __start_shard_workers(
+    workers: str,
+    queue_size: int,
+    file_format: str,
+    files: List[str],
+    compression: Optional[str],
+) -> Tuple[List[Any], Any, List[Any]]:
+    """Start a thread or process per shard with its queue of chunks."""
+    runner: Any = threading.Thread
+    chunks: List[Any] = [queue.Queue(queue_size) for _ in files]
+    results: Any = queue.Queue()
+    if workers == "process":
+        context = multiprocessing.get_context()
+        runner = context.Process
+        chunks = [context.Queue(queue_size) for _ in files]
+        results = context.Queue()
+    runners = [
+        runner(
+            target=__write_shard,
+            args=(chunks[shard], results, shard, file_format, file_path, compression),
+            daemon=True,
+        )
+        for shard, file_path in enumerate(files)
+    ]
+    for worker in runners:
+        worker.start()
+    return chunks, results, runners
+
+
+def __put_chunk(chunks: Any, chunk: Any, worker: Any) -> bool:
+    """Queue a chunk for a shard worker, waiting as long as it is alive.
+
+    :return: False if the worker died, so the chunk was not queued
+    """
+    while True:
+        try:
+            chunks.put(chunk, timeout=__WORKER_POLL)
+            return True
+        except queue.Full:
+            if not worker.is_alive():
+                return False
+
+
+def __collect_outcomes(results: Any, runners: List[Any]) -> List[Tuple[int, int, Any]]:
+    """Wait for the outcome of every shard worker.
+
+    A worker that died without reporting, e.g. a killed process, is given an
+    error. It has to be found dead twice in a row, so a result it sent just
+    before exiting is still received.
+    """
+    outcomes: Dict[int, Tuple[int, int, Any]] = {}
+    dead: Set[int] = set()
+    while len(outcomes) < len(runners):
+        try:
+            shard, rows, error = results.get(timeout=__WORKER_POLL)
+            outcomes[shard] = (shard, rows, error)
+            continue
+        except queue.Empty:
+            pass
+        for shard, worker in enumerate(runners):
+            if shard in outcomes or worker.is_alive():
+                continue
+            if shard in dead:
+                exitcode = getattr(worker, "exitcode", None)
+                outcomes[shard] = (shard, 0, f"worker died, exit code {exitcode}")
+            dead.add(shard)
+    return [outcomes[shard] for shard in sorted(outcomes)]
+
+
+def __write_shard(
+    chunks: Any,
+    results: Any,
+    shard: int,
+    file_format: str,
+    file_path: str,
+    compression: Optional[str],
+) -> None:
+    """Write the chunks of a queue to a file until the end is queued.
+
+    The queue is drained after an error, so the producer never blocks on it.
+    """
+    writer = __open_writer(file_format, file_path, compression)
+    error = None
+    while True:
+        chunk = chunks.get()
+        if not isinstance(chunk, pa.Table):
+            break
+        if error is None:
+            try:
+                writer.write(chunk)
+            except Exception as e:
+                error = repr(e)
+                writer.abort()
+    if error is None:
+        try:
+            if chunk == __ABORT:
+                writer.abort()
+            else:
+                writer.close()
+        except Exception as e:
+            error = repr(e)
+    results.put((shard, writer.rows, error))
+
+
+def __partition(
+    table: pa.Table, region_of: Optional[RegionFunction]
+) -> Generator[Tuple[str, pa.Table], None, None]:
+    """Split a table into the parts of its partitions."""
+    if "time" not in table.column_names:
+        raise ValueError("Datasets are partitioned by time, which is missing.")
+    dates = pc.strftime(table["time"].cast(pa.timestamp("s")), format="%Y-%m-%d")
+    keys = [
+        f"date={date}" for date in pc.fill_null(dates, DEFAULT_PARTITION).to_pylist()
+    ]
+    if region_of is not None:
+        lats = table[REGION_COLUMNS[0]].to_pylist()
+        lngs = table[REGION_COLUMNS[1]].to_pylist()
+        keys = [
+            f"{key}/region={region_of(lat, lng)}"
+            for key, lat, lng in zip(keys, lats, lngs)
+        ]
+
+    rows: Dict[str, List[int]] = {}
+    for index, key in enumerate(keys):
+        rows.setdefault(key, []).append(index)
+    for key, indices in rows.items():
+        yield key, table.take(pa.array(indices, pa.int64()))
+
+
+def __open_part(
+    path: str, partition: str, file_format: str, compression: Optional[str] = None
+) -> "_ChunkWriter":
+    """Open a new file in a partition of a dataset."""
+    return __open_writer(
+        file_format, __part_path(path, partition, file_format), compression
+    )
+
+
+def __part_path(path: str, partition: str, file_format: str) -> str:
+    """Get the path of a new file in a partition of a dataset."""
+    directory = os.path.join(path, partition)
+    os.makedirs(directory, exist_ok=True)
+    name = f"part-{uuid.uuid4().hex}{FILE_EXTENSIONS[file_format]}"
+    return os.path.join(directory, name)
+
+
+def __read_part(file_path: str, file_format: str) -> pa.Table:
+    """Read a file of a dataset."""
+    if file_format == "parquet":
+        return pq.read_table(file_path, partitioning=None)
+    with pa.memory_map(file_path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def __manifest_entry(
+    path: str, partition: str, file_path: str, rows: int
+) -> Dict[str, Any]:
+    """Describe a new file of a dataset."""
+    return {
+        "path": os.path.relpath(file_path, path),
+        "partition": partition,
+        "rows": rows,
+        "bytes": os.path.getsize(file_path),
+        "created": time.time(),
+    }
+
+
+def __update_manifest(
+    path: str,
+    file_format: str,
+    added: List[Dict[str, Any]],
+    removed: Optional[List[str]] = None,
+) -> None:
+    """Add and remove files in the manifest of a dataset atomically."""
+    with __MANIFEST_LOCK:
+        manifest = read_manifest(path)
+        if manifest["format"] not in (None, file_format):
+            raise ValueError(f"Dataset {path} is stored as {manifest['format']}.")
+        dropped = set(removed or [])
+        manifest["format"] = file_format
+        manifest["files"] = [
+            entry for entry in manifest["files"] if entry["path"] not in dropped
+        ] + added
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        tmp_path = os.path.join(path, f".{MANIFEST_FILE}.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(tmp_path, manifest_path)
+
+
+def __iter_batch_chunks(
+    batches: Iterable[pa.RecordBatch], chunk_size: int
+) -> Generator[List[pa.RecordBatch], None, None]:
+    """Group record batches to chunks of about chunk_size rows."""
+    chunk: List[pa.RecordBatch] = []
+    rows = 0
+    for batch in batches:
+        chunk.append(batch)
+        rows += batch.num_rows
+        if rows >= chunk_size:
+            yield chunk
+            chunk = []
+            rows = 0
+    if chunk:
+        yield chunk
+
+
+def _to_data_frame(table: pa.Table) -> pd.DataFrame:
+    """Convert a table to a data frame with nullable integer columns."""
+    return table.to_pandas(types_mapper=nullable_pandas_type)
+
+
+class _ChunkWriter(ABC):
+    """Base class of the writers that write a file chunk by chunk."""
+
+    def __init__(self, file_path: str, compression: Optional[str] = None) -> None:
+        """Open a temporary file next to the final file.
+
+        :param file_path: Path of the final file
+        :param compression: Codec of parquet and feather files
+        """
+        directory, name = os.path.split(file_path)
+        self.compression = compression
+        self.file_path = file_path
+        self.tmp_path = os.path.join(directory, f".{name}.tmp")
+        self.rows = 0
+
+    def write(self, chunk: pa.Table) -> None:
+        """Write a chunk of rows.
+
+        :param chunk: The rows to write
+        """
+        self._write(chunk)
+        self.rows += chunk.num_rows
+
+    def close(self) -> None:
+        """Finish the file and move it into place."""
+        self._close()
+        if not os.path.exists(self.tmp_path):
+            self._write_empty()
+        os.replace(self.tmp_path, self.file_path)
+
+    def abort(self) -> None:
+        """Close and remove the temporary file."""
+        try:
+            self._close()
+        finally:
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+
+    @abstractmethod
+    def _write(self, chunk: pa.Table) -> None:
+        """Write a chunk to the open file."""
+
+    def _close(self) -> None:
+        """Release open handles."""
+
+    def _write_empty(self) -> None:
+        """Write a file without rows."""
+        open(self.tmp_path, "w").close()
+
+
+class _CsvWriter(_ChunkWriter):
+    """Append chunks to a csv file, the header is written once."""
+
+    def _write(self, chunk: pa.Table) -> None:
+        frame = _to_data_frame(chunk)
+        frame.index += self.rows
+        frame.to_csv(self.tmp_path, mode="a", header=self.rows == 0)
+
+
+class _JsonWriter(_ChunkWriter):
+    """Stream the rows of all chunks into one json array."""
+
+    def __init__(self, file_path: str, compression: Optional[str] = None) -> None:
+        super().__init__(file_path, compression)
+        self.file = open(self.tmp_path, "w")
+        self.file.write("[")
+
+    def _write(self, chunk: pa.Table) -> None:
+        if chunk.num_rows == 0:
+            return
+        if self.rows > 0:
+            self.file.write(",")
+        self.file.write(_to_data_frame(chunk).to_json(orient="records")[1:-1])
+
+    def _close(self) -> None:
+        if not self.file.closed:
+            self.file.write("]")
+            self.file.close()
+
+
+class _JsonLinesWriter(_ChunkWriter):
+    """Append chunks to a json lines file."""
+
+    def _write(self, chunk: pa.Table) -> None:
+        frame = _to_data_frame(chunk)
+        with open(self.tmp_path, "a") as file:
+            file.write(frame.to_json(orient="records", lines=True).rstrip("\n"))
+            file.write("\n")
+
+
+class _PickleWriter(_ChunkWriter):
+    """Pickle the rows of all chunks as one data frame.
+
+    The chunks are kept as Arrow tables, which are more compact than data
+    frames, and converted at once when the file is closed.
+    """
+
+    def __init__(self, file_path: str, compression: Optional[str] = None) -> None:
+        super().__init__(file_path, compression)
+        self.tables: List[pa.Table] = []
+
+    def _write(self, chunk: pa.Table) -> None:
+        self.tables.append(chunk)
+
+    def _close(self) -> None:
+        if self.tables:
+            frame = _to_data_frame(pa.concat_tables(self.tables))
+            self.tables = []
+            frame.to_pickle(self.tmp_path)
+
+    def _write_empty(self) -> None:
+        pd.DataFrame().to_pickle(self.tmp_path)
+
+    def abort(self) -> None:
+        """Drop the chunks and remove the temporary file."""
+        self.tables = []
+        super().abort()
+
+
+class _PickleChunksWriter(_ChunkWriter):
+    """Pickle one data frame per chunk into the same file."""
+
+    def __init__(self, file_path: str, compression: Optional[str] = None) -> None:
+        super().__init__(file_path, compression)
+        self.file = open(self.tmp_path, "wb")
+
+    def _write(self, chunk: pa.Table) -> None:
+        frame = _to_data_frame(chunk)
+        pickle.dump(frame, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _close(self) -> None:
+        if not self.file.closed:
+            if self.rows == 0:
+                pickle.dump(pd.DataFrame(), self.file)
+            self.file.close()
+
+
+class _ArrowWriter(_ChunkWriter):
+    """Base class of the writers of Arrow based formats."""
+
+    def __init__(self, file_path: str, compression: Optional[str] = None) -> None:
+        super().__init__(file_path, compression)
+        self.writer: Any = None
+
+    def _write(self, chunk: pa.Table) -> None:
+        if self.writer is None:
+            self.writer = self._open(chunk.schema)
+        self.writer.write_table(chunk)
+
+    @abstractmethod
+    def _open(self, schema: pa.Schema) -> Any:
+        """Open the writer of the format for a schema."""
+
+    def _close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class _ParquetWriter(_ArrowWriter):
+    """Write one row group per chunk to a parquet file."""
+
+    def _open(self, schema: pa.Schema) -> Any:
+        compression = self.compression or "snappy"
+        return pq.ParquetWriter(self.tmp_path, schema, compression=compression)
+
+    def _write_empty(self) -> None:
+        pq.write_table(pa.table({}), self.tmp_path)
+
+
+class _FeatherWriter(_ArrowWriter):
+    """Write one record batch per chunk to a feather (Arrow IPC) file.
+
+    An IPC file holds one dictionary per column that may only grow, so the
+    dictionaries of the chunks are unified per column and written as deltas.
+    """
 
+    def __init__(self, file_path: str, compression: Optional[str] = None) -> None:
+        super().__init__(file_path, compression)
+        self.dictionaries: Dict[str, Dict[str, int]] = {}
 
-def __write_json(data: pd.DataFrame, path: str, file_name: str) -> None:
-    """Write the data to a json file."""
-    data.to_json(os.path.join(path, file_name + ".json"), orient="records")
+    def _open(self, schema: pa.Schema) -> Any:
+        options = pa.ipc.IpcWriteOptions(
+            compression=self.compression or "lz4", emit_dictionary_deltas=True
+        )
+        return pa.ipc.new_file(self.tmp_path, schema, options=options)
 
+    def _write(self, chunk: pa.Table) -> None:
+        for index, field in enumerate(chunk.schema):
+            if pa.types.is_dictionary(field.type):
+                codes = self.dictionaries.setdefault(field.name, {})
+                column = self.__unify(chunk.column(index).combine_chunks(), codes)
+                chunk = chunk.set_column(index, field, column)
+        super()._write(chunk)
 
-def __write_pickle(data: pd.DataFrame, path: str, file_name: str) -> None:
-    """Write the data to a pickle file."""
-    data.to_pickle(os.path.join(path, file_name + ".pkl"))
+    @staticmethod
+    def __unify(
+        column: pa.DictionaryArray, codes: Dict[str, int]
+    ) -> pa.DictionaryArray:
+        """Encode a dictionary column with the codes of the whole file."""
+        indices = pa.array(
+            [
+                codes.setdefault(value, len(codes))
+                for value in column.dictionary.to_pylist()
+            ],
+            column.indices.type,
+        )
+        return pa.DictionaryArray.from_arrays(
+            pc.take(indices, column.indices), pa.array(list(codes), pa.string())
+        )
 
+    def _write_empty(self) -> None:
+        with pa.ipc.new_file(self.tmp_path, pa.schema([])):
+            pass
 
-def __write_feather(data: pd.DataFrame, path: str, file_name: str) -> None:
-    """Write the data to a feather file."""
-    data.to_feather(os.path.join(path, file_name + ".feather"))
 
+def __open_writer(
+    file_format: str, file_path: str, compression: Optional[str] = None
+) -> "_ChunkWriter":
+    """Create the chunk writer of a file format.
 
-def __write_parquet(data: pd.DataFrame, path: str, file_name: str) -> None:
-    """Write the data to a parquet file."""
-    data.to_parquet(os.path.join(path, file_name + ".parquet"))
+    :param file_format: csv, json, jsonl, pickle, pickle-chunks, feather or
+        parquet
+    :param file_path: Path of the final file
+    :param compression: Codec of parquet and feather files
+    :return: The writer
+    """
+    writers: Dict[str, Callable[[str, Optional[str]], _ChunkWriter]] = {
+        "csv": _CsvWriter,
+        "json": _JsonWriter,
+        "jsonl": _JsonLinesWriter,
+        "pickle": _PickleWriter,
+        "pickle-chunks": _PickleChunksWriter,
+        "feather": _FeatherWriter,
+        "parquet": _ParquetWriter,
+    }
+    return writers[file_format](file_path, compression)
@@ -7,9 +7,24 @@
 .. moduleauthor:: DSIA21
 
 """
+from importlib import import_module
+from typing import Any
+
 import __main__
 
-from helium_api_wrapper import DataObjects as DataObjects
-from helium_api_wrapper import challenges as challenges
-from helium_api_wrapper import devices as devices
-from helium_api_wrapper import hotspots as hotspots
+
+# Submodules are imported on first access, so the CLI and scripts only load
+# the dependencies of the modules they use
+__all__ = ["DataObjects", "challenges", "devices", "hotspots"]
+
+
+def __getattr__(name: str) -> Any:
+    """Import a submodule on first access.
+
+    :param name: Name of the submodule
+    :raises AttributeError: If it is not a submodule of the package
+    :return: The submodule
+    """
+    if name in __all__:
+        return import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -8,30 +8,65 @@
 
 """
 
+import json
+import logging
+import os
+import signal
+import sys
+from contextlib import ExitStack
+from functools import partial
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Callable
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import TextIO
+from typing import Tuple
+from typing import Union
 
 import click
 
-from helium_api_wrapper.challenges import get_challenges
-from helium_api_wrapper.challenges import get_challenges_by_address
-from helium_api_wrapper.challenges import load_challenge_data
-from helium_api_wrapper.DataObjects import ChallengeResolved
-from helium_api_wrapper.DataObjects import Device
-from helium_api_wrapper.DataObjects import Event
-from helium_api_wrapper.DataObjects import Hotspot
-from helium_api_wrapper.devices import get_device_by_uuid
-from helium_api_wrapper.devices import get_last_event
-from helium_api_wrapper.devices import get_last_integration
-from helium_api_wrapper.hotspots import get_hotspot_by_address
-from helium_api_wrapper.hotspots import get_hotspots
-from helium_api_wrapper.ResultHandler import write
+
+# Commands import what they need, so starting the CLI does not load pandas
+# and pyarrow for commands that do not write files
+if TYPE_CHECKING:
+    from helium_api_wrapper.DataObjects import ChallengeResolved
+    from helium_api_wrapper.DataObjects import Device
+    from helium_api_wrapper.DataObjects import Event
+    from helium_api_wrapper.DataObjects import Hotspot
+    from helium_api_wrapper.metrics import Progress
+    from helium_api_wrapper.records import HotspotRecord
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 @click.command()
 @click.option("--address", type=str, help="Address of the hotspot")
+@click.option(
+    "--input",
+    "input_file",
+    type=click.File("r"),
+    default=None,
+    help="File with one address per line, - reads stdin. Prints one JSON line each.",
+)
+@click.option(
+    "--workers",
+    default=8,
+    type=int,
+    help="Number of concurrent requests with --input.",
+)
 @click.version_option(version="0.1")
-def get_hotspot(address: str) -> Hotspot:
+def get_hotspot(
+    address: str, input_file: Optional[TextIO], workers: int
+) -> Optional["Hotspot"]:
     """This function returns a Hotspot for a given address."""
+    from helium_api_wrapper.hotspots import get_hotspot_by_address
+
+    if input_file is not None:
+        __run_batch(__resolve_hotspot, input_file, workers)
+        return None
     if address:
         hotspot = get_hotspot_by_address(address)
     else:
@@ -44,8 +79,10 @@ def get_hotspot(address: str) -> Hotspot:
 @click.command()
 @click.option("--n", type=int, help="Nr. of pages to load. 1 page = 1000 hotspots")
 @click.version_option(version="0.1")
-def load_hotspots(n: int) -> List[Hotspot]:
+def load_hotspots(n: int) -> Union[List["Hotspot"], List["HotspotRecord"]]:
     """This function returns a given number of random Hotspots."""
+    from helium_api_wrapper.hotspots import get_hotspots
+
     hotspots = get_hotspots(n)
     print(hotspots[:3])
     return hotspots
@@ -53,9 +90,29 @@ def load_hotspots(n: int) -> List[Hotspot]:
 
 @click.command()
 @click.option("--address", type=str, help="Address of the hotspot")
+@click.option(
+    "--input",
+    "input_file",
+    type=click.File("r"),
+    default=None,
+    help="File with one address per line, - reads stdin. Prints one JSON line each.",
+)
+@click.option(
+    "--workers",
+    default=8,
+    type=int,
+    help="Number of concurrent requests with --input.",
+)
 @click.version_option(version="0.1")
-def get_challenges_for_hotspot(address: str) -> List[ChallengeResolved]:
+def get_challenges_for_hotspot(
+    address: str, input_file: Optional[TextIO], workers: int
+) -> Optional[List["ChallengeResolved"]]:
     """This function returns a list of challenges for a given hotspot."""
+    from helium_api_wrapper.challenges import get_challenges_by_address
+
+    if input_file is not None:
+        __run_batch(get_challenges_by_address, input_file, workers)
+        return None
     challenges = get_challenges_by_address(address)
     print(challenges[:3])
     return challenges
@@ -64,7 +121,21 @@ def get_challenges_for_hotspot(address: str) -> List[ChallengeResolved]:
 @click.command()
 @click.option("--n", type=int, help="Amount of challenges to return")
 @click.option(
-    "--incremental", is_flag=True, help="Set to save data after each challenge"
+    "--incremental",
+    is_flag=True,
+    help="Set to save the data while loading, see --flush_every and --flush_interval",
+)
+@click.option(
+    "--flush_every",
+    default=1_000,
+    type=int,
+    help="Number of challenges after which incremental output is saved.",
+)
+@click.option(
+    "--flush_interval",
+    default=60.0,
+    type=float,
+    help="Seconds after which incremental output is saved.",
 )
 @click.option(
     "--file_format",
@@ -78,33 +149,184 @@ def get_challenges_for_hotspot(address: str) -> List[ChallengeResolved]:
 @click.option(
     "--path", default="./data", type=str, help="Defines the path for the output file."
 )
+@click.option(
+    "--columnar",
+    is_flag=True,
+    help="Set to load the data in record batches instead of single objects",
+)
+@click.option(
+    "--seen_index",
+    default=None,
+    type=str,
+    help="Path of an index of loaded challenges. Seen challenges are skipped.",
+)
+@click.option(
+    "--dataset",
+    is_flag=True,
+    help="Set to append the data to a dataset partitioned by date at path/file_name.",
+)
+@click.option(
+    "--by_region",
+    is_flag=True,
+    help="Set to partition the dataset by the region of the challengee as well.",
+)
+@click.option(
+    "--shards",
+    default=1,
+    type=int,
+    help="Number of files to write in parallel to the directory path/file_name.",
+)
+@click.option(
+    "--shard_by",
+    default="hash",
+    type=click.Choice(["hash", "time"]),
+    help="Spread the rows over the shards by challenge hash or day.",
+)
+@click.option(
+    "--workers",
+    default="thread",
+    type=click.Choice(["thread", "process"]),
+    help="Write the shards in threads or processes.",
+)
+@click.option(
+    "--compression",
+    default=None,
+    type=str,
+    help="Compression of parquet and feather shards, e.g. zstd.",
+)
+@click.option(
+    "--chunk_size",
+    default=100_000,
+    type=int,
+    help="Number of rows to write at once.",
+)
+@click.option(
+    "--stats",
+    default=None,
+    type=str,
+    help="Path of per hotspot witness statistics to update with the loaded data.",
+)
+@click.option(
+    "--progress",
+    is_flag=True,
+    help="Set to report rows/s, requests/s, cache hits, retries and ETA on stderr.",
+)
+@click.option(
+    "--profile",
+    default=None,
+    type=str,
+    help="Path of a cProfile file, a tracemalloc snapshot is saved next to it.",
+)
 @click.version_option(version="0.1")
 def load_challenges(
-    n: int, incremental: bool, file_format: str, file_name: str, path: str
+    n: int,
+    incremental: bool,
+    flush_every: int,
+    flush_interval: float,
+    file_format: str,
+    file_name: str,
+    path: str,
+    columnar: bool,
+    seen_index: Optional[str],
+    dataset: bool,
+    by_region: bool,
+    shards: int,
+    shard_by: str,
+    workers: str,
+    compression: Optional[str],
+    chunk_size: int,
+    stats: Optional[str],
+    progress: bool,
+    profile: Optional[str],
 ) -> None:
     """This function returns a list of challenges."""
-    if incremental:
-        challenges = get_challenges(limit=n)
-        write(
-            load_challenge_data(challenges),
-            file_format=file_format,
-            file_name=file_name,
-            path=path,
-        )
-    else:
-        write(
-            load_challenge_data(load_type="all", limit=n),
-            file_format=file_format,
-            file_name=file_name,
-            path=path,
-        )
+    __check_output_options(file_format, incremental, dataset, shards)
+
+    from helium_api_wrapper.challenges import load_challenge_batches
+    from helium_api_wrapper.challenges import load_challenge_data
+    from helium_api_wrapper.ResultHandler import write_incremental
+    from helium_api_wrapper.seen_challenges import SeenChallengeIndex
+    from helium_api_wrapper.witness_stats import WitnessStatsAggregator
+
+    load = load_challenge_batches if columnar else load_challenge_data
+    aggregator = None
+    if stats is not None:
+        aggregator = WitnessStatsAggregator()
+        if os.path.exists(stats):
+            aggregator = WitnessStatsAggregator.load(stats)
+
+    with ExitStack() as stack:
+        reporter = __instrument(stack, progress, profile, total=n)
+        index = None
+        if seen_index is not None:
+            # challenges are only marked as seen once they are stored
+            index = stack.enter_context(
+                SeenChallengeIndex(seen_index, commit_every=sys.maxsize)
+            )
+
+        data = load(load_type="all", limit=n, seen_index=index)
+        if reporter is not None:
+            data = reporter.track(data)
+        if aggregator is not None:
+            data = aggregator.consume(data)
+
+        if incremental:
+            write_incremental(
+                data,
+                path,
+                file_name,
+                file_format,
+                every=flush_every,
+                interval=flush_interval,
+                region=by_region,
+                on_flush=index.flush if index is not None else None,
+            )
+        else:
+            __write_challenges(
+                data,
+                path,
+                file_name,
+                file_format,
+                dataset=dataset,
+                by_region=by_region,
+                shards=shards,
+                shard_by=shard_by,
+                workers=workers,
+                compression=compression,
+                chunk_size=chunk_size,
+            )
+            if index is not None:
+                index.flush()
+
+    if aggregator is not None and stats is not None:
+        aggregator.dump(stats)
 
 
 @click.command()
 @click.option("--uuid", type=str, help="UUID of the device")
+@click.option(
+    "--input",
+    "input_file",
+    type=click.File("r"),
+    default=None,
+    help="File with one UUID per line, - reads stdin. Prints one JSON line each.",
+)
+@click.option(
+    "--workers",
+    default=8,
+    type=int,
+    help="Number of concurrent requests with --input.",
+)
 @click.version_option(version="0.1")
-def get_device(uuid: str) -> Device:
+def get_device(
+    uuid: str, input_file: Optional[TextIO], workers: int
+) -> Optional["Device"]:
     """This function returns a device for a given UUID."""
+    from helium_api_wrapper.devices import get_device_by_uuid
+
+    if input_file is not None:
+        __run_batch(get_device_by_uuid, input_file, workers)
+        return None
     device = get_device_by_uuid(uuid)
     print(device)
     return device
@@ -113,8 +335,10 @@ def get_device(uuid: str) -> Device:
 @click.command()
 @click.option("--uuid", type=str, help="UUID of the device")
 @click.version_option(version="0.1")
-def get_device_integration(uuid: str) -> Event:
+def get_device_integration(uuid: str) -> "Event":
     """This function returns the last integration for a given UUID."""
+    from helium_api_wrapper.devices import get_last_integration
+
     integration = get_last_integration(uuid)
     print(integration)
     return integration
@@ -123,13 +347,307 @@ def get_device_integration(uuid: str) -> Event:
 @click.command()
 @click.option("--uuid", type=str, help="UUID of the device")
 @click.version_option(version="0.1")
-def get_device_event(uuid: str) -> Event:
+def get_device_event(uuid: str) -> "Event":
     """This function returns the last event for a given UUID."""
+    from helium_api_wrapper.devices import get_last_event
+
     event = get_last_event(uuid)
     print(event)
     return event
 
 
+@click.command()
+@click.option(
+    "--n",
+    default=10_000,
+    type=int,
+    help="Size of each benchmark, e.g. the number of rows or objects.",
+)
+@click.option(
+    "--fixtures",
+    default="tests/data",
+    type=str,
+    help="Directory of the recorded hotspots.json and challenges.json.",
+)
+@click.option(
+    "--only",
+    multiple=True,
+    type=str,
+    help="Name of a benchmark to run, can be repeated. Runs all by default.",
+)
+@click.option(
+    "--output",
+    default=None,
+    type=str,
+    help="Path of a JSON file for the results instead of stdout.",
+)
+@click.version_option(version="0.1")
+def bench(n: int, fixtures: str, only: Tuple[str, ...], output: Optional[str]) -> None:
+    """This function benchmarks the package against a local stand-in API."""
+    from helium_api_wrapper.bench import run_benchmarks
+
+    try:
+        results = run_benchmarks(fixtures=fixtures, n=n, only=only)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="--only") from error
+    if output is None:
+        click.echo(json.dumps(results, indent=2))
+    else:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+@click.command()
+@click.option(
+    "--path",
+    default="./data/helium.sqlite",
+    type=str,
+    help="Path of the SQLite database the data is mirrored to.",
+)
+@click.option(
+    "--challenge_interval",
+    default=60.0,
+    type=float,
+    help="Seconds between two syncs of new challenges.",
+)
+@click.option(
+    "--hotspot_interval",
+    default=600.0,
+    type=float,
+    help="Seconds between two hotspot refreshes.",
+)
+@click.option(
+    "--hotspot_pages",
+    default=1,
+    type=int,
+    help="Pages of hotspots refreshed per run. 1 page = 1000 hotspots",
+)
+@click.option(
+    "--initial_pages",
+    default=1,
+    type=int,
+    help="Pages of challenges loaded into an empty database.",
+)
+@click.option(
+    "--health",
+    default=None,
+    type=str,
+    help="Path of a JSON file the health is written to after every job.",
+)
+@click.option(
+    "--once",
+    is_flag=True,
+    default=False,
+    help="Run every job once and exit instead of running until stopped.",
+)
+@click.version_option(version="0.1")
+def sync(
+    path: str,
+    challenge_interval: float,
+    hotspot_interval: float,
+    hotspot_pages: int,
+    initial_pages: int,
+    health: Optional[str],
+    once: bool,
+) -> None:
+    """This function mirrors hotspots and challenges into a SQLite database."""
+    from helium_api_wrapper.sqlite_store import SQLiteStore
+    from helium_api_wrapper.sync import SyncDaemon
+
+    with SQLiteStore(path) as store:
+        daemon = SyncDaemon(
+            store,
+            challenge_interval=challenge_interval,
+            hotspot_interval=hotspot_interval,
+            hotspot_pages=hotspot_pages,
+            initial_pages=initial_pages,
+            health_path=health,
+        )
+        if once:
+            with daemon.metrics:
+                daemon.run_pending()
+        else:
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signal_number, lambda *_: daemon.stop())
+            daemon.run()
+    if any(status.consecutive_failures for status in daemon.status.values()):
+        sys.exit(1)
+
+
+def __instrument(
+    stack: ExitStack, progress: bool, profile: Optional[str], total: int
+) -> Optional["Progress"]:
+    """Start the profile and the progress report of a job.
+
+    :param stack: Stack that stops them when the job ends
+    :param progress: Report the progress
+    :param profile: Path of the profile, None to not profile
+    :param total: Number of challenges of the job
+    :return: The progress report, whose track counts the rows
+    """
+    from helium_api_wrapper.metrics import Progress
+    from helium_api_wrapper.metrics import profile as start_profile
+
+    if profile is not None:
+        stack.enter_context(start_profile(profile))
+    if not progress:
+        return None
+    return stack.enter_context(Progress(total=total))
+
+
+def __check_output_options(
+    file_format: str, incremental: bool, dataset: bool, shards: int
+) -> None:
+    """Reject output options of load-challenges that can not be combined.
+
+    :param file_format: Format of the output
+    :param incremental: Save the data while loading
+    :param dataset: Append to a dataset partitioned by date
+    :param shards: Number of shards
+    :raises click.UsageError: If the options conflict
+    """
+    from helium_api_wrapper.ResultHandler import DATASET_FORMATS
+
+    if incremental and (dataset or shards > 1):
+        raise click.UsageError(
+            "--incremental can not be used with --dataset or --shards."
+        )
+    if dataset and shards > 1:
+        raise click.UsageError("--dataset can not be used with --shards.")
+    if dataset and file_format not in DATASET_FORMATS:
+        raise click.BadParameter(
+            f"Datasets are stored as {' or '.join(DATASET_FORMATS)}, not {file_format}.",
+            param_hint="--file_format",
+        )
+
+
+def __write_challenges(
+    data: Iterable[Any],
+    path: str,
+    file_name: str,
+    file_format: str,
+    dataset: bool,
+    by_region: bool,
+    shards: int,
+    shard_by: str,
+    workers: str,
+    compression: Optional[str],
+    chunk_size: int,
+) -> None:
+    """Write loaded challenges to a file, a dataset or shards.
+
+    :param data: Challenge results or record batches
+    :param path: Directory of the output
+    :param file_name: Name of the output without extension
+    :param file_format: Format of the output
+    :param dataset: Append to a dataset partitioned by date
+    :param by_region: Partition the dataset by region as well
+    :param shards: Number of shards, 1 writes a single file
+    :param shard_by: Spread the rows by challenge hash or day
+    :param workers: Write the shards in threads or processes
+    :param compression: Compression of the shards
+    :param chunk_size: Number of rows to write at once
+    """
+    from helium_api_wrapper.ResultHandler import write
+    from helium_api_wrapper.ResultHandler import write_dataset
+    from helium_api_wrapper.ResultHandler import write_sharded
+
+    if shards > 1:
+        write_sharded(
+            data,
+            path,
+            file_name,
+            file_format,
+            shards=shards,
+            shard_by=shard_by,
+            workers=workers,
+            compression=compression,
+            chunk_size=chunk_size,
+        )
+    elif dataset:
+        write_dataset(
+            data,
+            os.path.join(path, file_name),
+            file_format=file_format,
+            region=by_region,
+            chunk_size=chunk_size,
+        )
+    else:
+        write(
+            data,
+            file_format=file_format,
+            file_name=file_name,
+            path=path,
+            chunk_size=chunk_size,
+        )
+
+
+def __run_batch(
+    function: Callable[[str], Any], input_file: TextIO, workers: int
+) -> None:
+    """Resolve the IDs of a file concurrently and print a JSON line per ID.
+
+    Lines are printed as soon as an ID is resolved, so not in the order of
+    the file. Failed IDs are printed with their error and the command exits
+    with status 1 after all IDs are done.
+
+    :param function: Function that loads the data of an ID
+    :param input_file: File with one ID per line, empty lines and lines
+        starting with # are skipped
+    :param workers: Number of concurrent requests
+    """
+    from helium_api_wrapper.endpoint import concurrent_map
+    from helium_api_wrapper.endpoint import set_pool_size
+
+    set_pool_size(workers)
+    ids = (
+        line.strip()
+        for line in input_file
+        if line.strip() and not line.lstrip().startswith("#")
+    )
+    failed = 0
+    for key, (result, error) in concurrent_map(
+        partial(__try_resolve, function), ids, workers
+    ):
+        if error is None:
+            click.echo(json.dumps({"id": key, "result": __to_json(result)}))
+        else:
+            failed += 1
+            click.echo(json.dumps({"id": key, "error": error}))
+    if failed:
+        sys.exit(1)
+
+
+def __try_resolve(
+    function: Callable[[str], Any], key: str
+) -> Tuple[Any, Optional[str]]:
+    """Call the function and catch its error."""
+    try:
+        return function(key), None
+    except Exception as error:
+        logger.debug(f"Could not resolve {key}: {error!r}")
+        return None, f"{type(error).__name__}: {error}"
+
+
+def __resolve_hotspot(address: str) -> "Hotspot":
+    """Load a hotspot or raise if it was not found."""
+    from helium_api_wrapper.hotspots import get_hotspot_by_address
+
+    hotspot = get_hotspot_by_address(address)
+    if len(hotspot) == 0:
+        raise LookupError(f"No hotspot found for address {address}")
+    return hotspot[0]
+
+
+def __to_json(result: Any) -> Any:
+    """Convert a model or a list of models to JSON compatible values."""
+    if isinstance(result, list):
+        return [__to_json(item) for item in result]
+    if hasattr(result, "json"):
+        return json.loads(result.json())
+    return result
+
+
 @click.group(
     help="CLI tool to load data from the Helium Blockchain API and Helium Console API"
 )
@@ -145,6 +663,8 @@ cli.add_command(get_challenges_for_hotspot)
 cli.add_command(get_device)
 cli.add_command(get_device_integration)
 cli.add_command(get_device_event)
+cli.add_command(bench)
+cli.add_command(sync)
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,396 @@
+"""Benchmark Module.
+
+.. module:: bench
+
+:synopsis: Benchmarks of the hot paths against a local stand-in API
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import gc
+import json
+import logging
+import os
+import platform
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version
+from types import TracebackType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Type
+from typing import cast
+from urllib.parse import parse_qs
+from urllib.parse import urlsplit
+
+from helium_api_wrapper import challenges
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.DataObjects import Witness
+from helium_api_wrapper.hotspots import get_hotspots
+from helium_api_wrapper.records import ChallengeResultRecord
+from helium_api_wrapper.records import HotspotRecord
+from helium_api_wrapper.records import WitnessRecord
+from helium_api_wrapper.records import from_dict
+from helium_api_wrapper.ResultHandler import FILE_EXTENSIONS
+from helium_api_wrapper.ResultHandler import write
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Fixtures = Dict[str, List[Dict[str, Any]]]
+Benchmark = Callable[[Fixtures, int], Dict[str, Any]]
+
+PAGE_SIZE = 1000
+
+
+class StandInAPI:
+    """Local HTTP server answering Blockchain API requests from fixtures.
+
+    Hotspot pages are the fixture hotspots repeated to PAGE_SIZE, followed by
+    a cursor until ``pages`` pages were served. Every hotspot address is
+    found, challenges are the fixture challenges repeated to the requested
+    limit with unique hashes. While it runs, API_ENDPOINT points to it.
+    """
+
+    def __init__(self, fixtures: Fixtures, pages: int = 10) -> None:
+        """Create the server, it is started as a context manager.
+
+        :param fixtures: Hotspots and challenges, see load_fixtures
+        :param pages: Number of hotspot pages
+        """
+        self.fixtures = fixtures
+        self.pages = pages
+        self.requests = 0
+        self.url = ""
+        self.__server: Optional[ThreadingHTTPServer] = None
+        self.__endpoint: Optional[str] = None
+        self.__lock = threading.Lock()
+        self.__hotspot_pages = [
+            json.dumps(
+                {
+                    "data": _repeat(fixtures["hotspots"], PAGE_SIZE),
+                    "cursor": str(page + 1) if page + 1 < pages else None,
+                }
+            ).encode()
+            for page in range(pages)
+        ]
+
+    def __enter__(self) -> "StandInAPI":
+        """Start the server in a thread and point API_ENDPOINT to it."""
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        setattr(self.__server, "api", self)  # noqa: B010
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.__server.server_address[1]}"
+        self.__endpoint = os.environ.get("API_ENDPOINT")
+        os.environ["API_ENDPOINT"] = self.url
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Stop the server and restore API_ENDPOINT."""
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+        if self.__endpoint is None:
+            os.environ.pop("API_ENDPOINT", None)
+        else:
+            os.environ["API_ENDPOINT"] = self.__endpoint
+
+    def respond(self, path: str, params: Dict[str, List[str]]) -> Optional[bytes]:
+        """Get the body of a response.
+
+        :param path: Path of the request
+        :param params: Query parameters of the request
+        :return: JSON body or None if the path is unknown
+        """
+        with self.__lock:
+            self.requests += 1
+        parts = [part for part in path.split("/") if part]
+        if parts == ["hotspots"]:
+            page = int(params.get("cursor", ["0"])[0])
+            return self.__hotspot_pages[page]
+        if len(parts) == 2 and parts[0] == "hotspots":
+            hotspot = {**self.fixtures["hotspots"][0], "address": parts[1]}
+            return json.dumps({"data": hotspot}).encode()
+        if parts == ["challenges"]:
+            limit = int(params.get("limit", ["50"])[0])
+            data = [
+                {**challenge, "hash": f"{challenge['hash']}-{index}"}
+                for index, challenge in enumerate(
+                    _repeat(self.fixtures["challenges"], limit)
+                )
+            ]
+            return json.dumps({"data": data}).encode()
+        return None
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Request handler of the StandInAPI."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Answer a GET request."""
+        url = urlsplit(self.path)
+        api = cast(StandInAPI, getattr(self.server, "api"))  # noqa: B009
+        body = api.respond(url.path, parse_qs(url.query))
+        if body is None:
+            self.send_response(404)
+            body = b"{}"
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Do not log requests."""
+
+
+def load_fixtures(path: str = "tests/data") -> Fixtures:
+    """Load the recorded API responses the benchmarks run on.
+
+    :param path: Directory of hotspots.json and challenges.json
+    :return: Hotspots and challenges
+    """
+    fixtures = {}
+    for name in ("hotspots", "challenges"):
+        with open(os.path.join(path, f"{name}.json")) as file:
+            fixtures[name] = json.load(file)
+    return fixtures
+
+
+def hotspot_pages(fixtures: Fixtures, n: int) -> Dict[str, Any]:
+    """Measure loading hotspots page by page from the stand-in API.
+
+    :param fixtures: Hotspots and challenges, see load_fixtures
+    :param n: Number of hotspots, rounded up to full pages
+    :return: Pages and hotspots per second
+    """
+    pages = max(-(-n // PAGE_SIZE), 1)
+    with StandInAPI(fixtures, pages=pages) as api:
+        start = time.perf_counter()
+        hotspots = get_hotspots(pages=pages)
+        seconds = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "hotspots": len(hotspots),
+        "requests": api.requests,
+        "seconds": seconds,
+        "pages_per_s": pages / seconds,
+        "hotspots_per_s": len(hotspots) / seconds,
+    }
+
+
+def challenge_data(fixtures: Fixtures, n: int) -> Dict[str, Any]:
+    """Measure load_challenge_data against the stand-in API.
+
+    :param fixtures: Hotspots and challenges, see load_fixtures
+    :param n: Number of challenges
+    :return: Rows and requests per second
+    """
+    with StandInAPI(fixtures, pages=1) as api:
+        start = time.perf_counter()
+        rows = sum(1 for _ in challenges.load_challenge_data(limit=n))
+        seconds = time.perf_counter() - start
+    return {
+        "challenges": n,
+        "rows": rows,
+        "requests": api.requests,
+        "seconds": seconds,
+        "rows_per_s": rows / seconds,
+        "requests_per_s": api.requests / seconds,
+    }
+
+
+def resolve_challenge(fixtures: Fixtures, n: int) -> Dict[str, Any]:
+    """Measure get_challenges parsing and resolving challenges.
+
+    The challenges are served by the stand-in API in one response, so the
+    time is dominated by parsing and resolving them.
+
+    :param fixtures: Hotspots and challenges, see load_fixtures
+    :param n: Number of resolved challenges
+    :return: Microseconds per challenge
+    """
+    with StandInAPI(fixtures, pages=1):
+        start = time.perf_counter()
+        resolved = challenges.get_challenges(limit=n)
+        seconds = time.perf_counter() - start
+    return {
+        "challenges": len(resolved),
+        "seconds": seconds,
+        "us_per_challenge": seconds / len(resolved) * 1e6,
+    }
+
+
+def model_construction(fixtures: Fixtures, n: int) -> Dict[str, Any]:
+    """Measure creating models and records from API payloads.
+
+    :param fixtures: Hotspots and challenges, see load_fixtures
+    :param n: Number of objects per type
+    :return: Microseconds and bytes per object by type
+    """
+    hotspot = fixtures["hotspots"][0]
+    witness = fixtures["challenges"][1]["path"][0]["witnesses"][0]
+    row = __challenge_row(hotspot, witness)
+    cases: Dict[str, Callable[[], Any]] = {
+        "Hotspot": lambda: Hotspot(**hotspot),
+        "HotspotRecord": lambda: from_dict(HotspotRecord, hotspot),
+        "Witness": lambda: Witness(**witness),
+        "WitnessRecord": lambda: from_dict(WitnessRecord, witness),
+        "ChallengeResult": lambda: ChallengeResult(
+            **dict(zip(challenges.CHALLENGE_RESULT_FIELDS, row))
+        ),
+        "ChallengeResultRecord": lambda: ChallengeResultRecord(*row),
+    }
+    return {name: measure(build, n) for name, build in cases.items()}
+
+
+def write_formats(fixtures: Fixtures, n: int) -> Dict[str, Any]:
+    """Measure ResultHandler.write for every file format.
+
+    :param fixtures: Hotspots and challenges, see load_fixtures
+    :param n: Number of challenge results
+    :return: Rows per second and file size by format
+    """
+    hotspot = fixtures["hotspots"][0]
+    witnesses = [
+        witness
+        for challenge in fixtures["challenges"]
+        for witness in challenge["path"][0]["witnesses"]
+    ]
+    results = [
+        ChallengeResultRecord(*__challenge_row(hotspot, witness, index))
+        for index, witness in enumerate(_repeat(witnesses, n))
+    ]
+    measured = {}
+    with tempfile.TemporaryDirectory() as path:
+        for file_format, extension in FILE_EXTENSIONS.items():
+            start = time.perf_counter()
+            write(results, path, file_format, file_format)
+            seconds = time.perf_counter() - start
+            size = os.path.getsize(os.path.join(path, f"{file_format}{extension}"))
+            measured[file_format] = {
+                "rows": n,
+                "seconds": seconds,
+                "rows_per_s": n / seconds,
+                "bytes": size,
+            }
+    return measured
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "hotspot_pages": hotspot_pages,
+    "challenge_data": challenge_data,
+    "resolve_challenge": resolve_challenge,
+    "model_construction": model_construction,
+    "write_formats": write_formats,
+}
+
+
+def run_benchmarks(
+    fixtures: str = "tests/data", n: int = 10_000, only: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    """Run the benchmarks and collect their results.
+
+    Info logs are disabled while the benchmarks run, so the numbers measure
+    the work and not the console.
+
+    :param fixtures: Directory of hotspots.json and challenges.json
+    :param n: Size of each benchmark, e.g. rows or objects
+    :param only: Names of the benchmarks to run, all of BENCHMARKS if None
+    :raises ValueError: If a name is not a benchmark
+    :return: The results by benchmark with the package and Python version
+    """
+    names = list(only) if only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(
+            f"Unknown benchmarks {unknown}, choose from {list(BENCHMARKS)}"
+        )
+
+    data = load_fixtures(fixtures)
+    results = {}
+    logging.disable(logging.INFO)
+    try:
+        for name in names:
+            results[name] = BENCHMARKS[name](data, n)
+    finally:
+        logging.disable(logging.NOTSET)
+    return {
+        "version": __package_version(),
+        "python": platform.python_version(),
+        "n": n,
+        "benchmarks": results,
+    }
+
+
+def measure(build: Callable[[], Any], n: int) -> Dict[str, float]:
+    """Measure construction time and memory of n objects.
+
+    :param build: Function creating one object
+    :param n: Number of objects
+    :return: Microseconds per object and bytes per object
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects: List[Any] = [build() for _ in range(n)]
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return {"us_per_object": elapsed / n * 1e6, "bytes_per_object": size / n}
+
+
+def _repeat(items: List[Any], n: int) -> List[Any]:
+    """Repeat items to a list of length n."""
+    return [items[index % len(items)] for index in range(n)]
+
+
+def __challenge_row(
+    hotspot: Dict[str, Any], witness: Dict[str, Any], index: int = 0
+) -> Tuple[Any, ...]:
+    """Build the values of a ChallengeResult from a hotspot and a witness."""
+    return (
+        hotspot["address"],
+        hotspot["lat"],
+        hotspot["lng"],
+        witness["gateway"],
+        hotspot["lat"],
+        hotspot["lng"],
+        witness["signal"],
+        witness["snr"],
+        witness["datarate"],
+        witness["is_valid"],
+        f"hash-{index // 8}",
+        1628766652 + index,
+        1000.0,
+    )
+
+
+def __package_version() -> str:
+    """Get the installed version of the package."""
+    try:
+        return version("helium-api-wrapper")
+    except PackageNotFoundError:
+        return "unknown"
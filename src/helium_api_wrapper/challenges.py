@@ -8,32 +8,106 @@
 
 """
 
+import heapq
 import logging
+import math
+import time
+from abc import ABC
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import Generator
+from typing import Iterable
 from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Tuple
 from typing import Union
+from typing import cast
 
-from haversine import Unit
-from haversine import haversine
+from pydantic import BaseModel
 
 from helium_api_wrapper.DataObjects import Challenge
 from helium_api_wrapper.DataObjects import ChallengeResolved
 from helium_api_wrapper.DataObjects import ChallengeResult
 from helium_api_wrapper.DataObjects import Hotspot
 from helium_api_wrapper.DataObjects import Witness
+from helium_api_wrapper.DataObjects import WitnessArray
+from helium_api_wrapper.endpoint import iter_pages
 from helium_api_wrapper.endpoint import request
-from helium_api_wrapper.hotspots import get_hotspot_by_address
+from helium_api_wrapper.hotspots import HotspotCache
+from helium_api_wrapper.interning import intern_challenge
+from helium_api_wrapper.metrics import CHALLENGES
+from helium_api_wrapper.metrics import count
+from helium_api_wrapper.records import ChallengeResultRecord
+from helium_api_wrapper.seen_challenges import SeenChallengeIndex
 
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WitnessFilter = Callable[[Witness], bool]
+WitnessKey = Callable[[Witness], float]
+ChallengeRow = Tuple[Any, ...]
+DeferredChallenge = Tuple[
+    ChallengeResolved, Optional[Hotspot], List[Witness], List[ChallengeRow]
+]
+
+CHALLENGE_RESULT_FIELDS = tuple(ChallengeResult.__fields__)
+__DISTANCE_INDEX = CHALLENGE_RESULT_FIELDS.index("distance")
+
+
+def __getattr__(name: str) -> Any:
+    """Create CHALLENGE_RESULT_SCHEMA on first access, so pyarrow is only imported for it.
+
+    The schema is stored in the module, so later accesses do not get here.
+
+    :param name: Name of the attribute
+    :raises AttributeError: If it is not CHALLENGE_RESULT_SCHEMA
+    :return: The Arrow schema of ChallengeResult
+    """
+    if name == "CHALLENGE_RESULT_SCHEMA":
+        from helium_api_wrapper.schemas import arrow_schema
+
+        schema = globals()[name] = arrow_schema(ChallengeResult, downcast=False)
+        return schema
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-def get_challenges(limit: int = 50) -> List[ChallengeResolved]:
+class ResolutionReport(BaseModel):
+    """Counts of the hotspot resolution of a challenge data load."""
+
+    resolved: int = 0
+    deferred: int = 0
+    recovered: int = 0
+    unresolved: Dict[str, int] = {}
+
+    @property
+    def unresolved_count(self) -> int:
+        """Number of addresses that could not be resolved."""
+        return len(self.unresolved)
+
+    def add_unresolved(self, address: str, rows: int = 1) -> None:
+        """Count rows that were dropped because of a missing hotspot.
+
+        :param address: Address of the missing hotspot
+        :param rows: Number of dropped rows
+        """
+        self.unresolved[address] = self.unresolved.get(address, 0) + rows
+
+
+def get_challenges(
+    limit: int = 50, witness_array: bool = False
+) -> List[ChallengeResolved]:
     """Load a list of challenges.
 
     :param limit: Limit of challenges to load
+    :param witness_array: Store the witnesses in a WitnessArray
     :return: List of challenges
     """
     logger.info(f"Getting {limit} challenges")
@@ -43,13 +117,44 @@ def get_challenges(limit: int = 50) -> List[ChallengeResolved]:
         params={"limit": limit},
     )
 
-    return [__resolve_challenge(Challenge(**challenge)) for challenge in challenges]
+    return [__parse_challenge(challenge, witness_array) for challenge in challenges]
+
+
+def get_challenges_since(
+    since: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    witness_array: bool = False,
+) -> List[ChallengeResolved]:
+    """Load the challenges added to the chain since a time.
 
+    The challenges are requested from the head of the chain, newest first,
+    until a page reaches back before ``since``. Challenges at exactly
+    ``since`` are loaded again, since more challenges of the same block may
+    follow a checkpoint.
 
-def get_challenge_by_id(id: str) -> Union[ChallengeResolved, None]:
+    :param since: Time of the latest known challenge, None loads from the head
+    :param max_pages: Maximum number of pages to request, None requests
+        pages until ``since`` is reached
+    :param witness_array: Store the witnesses in a WitnessArray
+    :return: List of challenges, newest first
+    """
+    logger.info(f"Getting challenges since {since}")
+    challenges: List[ChallengeResolved] = []
+    for page in iter_pages(url="challenges", endpoint="api", pages=max_pages):
+        for challenge in page:
+            if since is not None and challenge["time"] < since:
+                return challenges
+            challenges.append(__parse_challenge(challenge, witness_array))
+    return challenges
+
+
+def get_challenge_by_id(
+    id: str, witness_array: bool = False
+) -> Union[ChallengeResolved, None]:
     """Load a challenge.
 
     :param id: Hash of the challenge
+    :param witness_array: Store the witnesses in a WitnessArray
     :return: Challenge
     """
     logger.info(f"Getting challenges from transaction {id}")
@@ -58,11 +163,12 @@ def get_challenge_by_id(id: str) -> Union[ChallengeResolved, None]:
         logger.warning(f"Transaction {id} is not a challengee")
         logger.warning(transaction)
         return None  # todo: raise exception or do sth better
-    challenge = Challenge(**transaction[0])
-    return __resolve_challenge(challenge)
+    return __parse_challenge(transaction[0], witness_array)
 
 
-def get_challenges_by_address(address: str, limit: int = 50) -> List[ChallengeResolved]:
+def get_challenges_by_address(
+    address: str, limit: int = 50, witness_array: bool = False
+) -> List[ChallengeResolved]:
     """Get a list of challenges.
 
     When passed an address, it will get the challenges for that hotspot.
@@ -73,6 +179,9 @@ def get_challenges_by_address(address: str, limit: int = 50) -> List[ChallengeRe
     :param limit: The amount of challenges to get. Defaults to 50
     :type limit: int
 
+    :param witness_array: Store the witnesses in a WitnessArray
+    :type witness_array: bool
+
     :return: The challenges.
     :rtype: list[Challenge]
     """
@@ -84,7 +193,7 @@ def get_challenges_by_address(address: str, limit: int = 50) -> List[ChallengeRe
     )
 
     challenge_resolved = [
-        __resolve_challenge(Challenge(**challenge)) for challenge in challenges
+        __parse_challenge(challenge, witness_array) for challenge in challenges
     ]
     return challenge_resolved
 
@@ -93,85 +202,637 @@ def load_challenge_data(
     challenges: Optional[List[ChallengeResolved]] = None,
     load_type: str = "all",
     limit: int = 50,
-) -> Generator[ChallengeResult, None, None]:
+    order_by: Union[str, WitnessKey] = "signal",
+    witness_filters: Optional[Sequence[WitnessFilter]] = None,
+    k: Optional[int] = None,
+    seen_index: Optional[SeenChallengeIndex] = None,
+    hotspot_cache: Optional[HotspotCache] = None,
+    report: Optional[ResolutionReport] = None,
+    retry_delay: float = 0.0,
+    as_records: bool = False,
+) -> Generator[Union[ChallengeResult, ChallengeResultRecord], None, None]:
     """Load challenge data.
 
+    Witnesses are filtered and limited before any hotspot is looked up, so
+    dropped witnesses never cost a request. Only ordering by ``distance``
+    needs the witness positions and therefore resolves every witness that
+    passes the filters before selecting the top ``k``.
+
+    Hotspots the API temporarily fails to return are not dropped right away.
+    Every missing address is requested once more after all challenges were
+    processed. The rows of a challenge with missing hotspots are held back
+    until then, so its rows are emitted together. Addresses that stay
+    missing are counted in ``report``.
+
     :param challenges: List of challenges
-    :param load_type: Load type for witnesses all, triangulation or best_signal
+    :param load_type: Load type for witnesses all, trilateration or best_signal
     :param limit: Limit of challenges to load
+    :param order_by: signal, snr, distance or a custom scoring function
+    :param witness_filters: Filters a witness has to pass to be loaded
+    :param k: Number of witnesses per challenge, overrides the load type
+    :param seen_index: Index of loaded challenges, which are skipped
+    :param hotspot_cache: Cache for hotspot lookups, shared between calls
+    :param report: Report that is filled with the resolution counts
+    :param retry_delay: Seconds to wait before missing hotspots are retried
+    :param as_records: Yield compact ChallengeResultRecords instead of models
     :return: List of challenges
     """
     logger.info("Loading challenge data")
+    for row in __iter_challenge_rows(
+        challenges=challenges,
+        load_type=load_type,
+        limit=limit,
+        order_by=order_by,
+        witness_filters=witness_filters,
+        k=k,
+        seen_index=seen_index,
+        hotspot_cache=hotspot_cache,
+        report=report,
+        retry_delay=retry_delay,
+    ):
+        if as_records:
+            yield ChallengeResultRecord(*row)
+        else:
+            yield ChallengeResult(**dict(zip(CHALLENGE_RESULT_FIELDS, row)))
+
+
+def load_challenge_batches(
+    challenges: Optional[List[ChallengeResolved]] = None,
+    load_type: str = "all",
+    limit: int = 50,
+    batch_size: int = 10_000,
+    order_by: Union[str, WitnessKey] = "signal",
+    witness_filters: Optional[Sequence[WitnessFilter]] = None,
+    k: Optional[int] = None,
+    seen_index: Optional[SeenChallengeIndex] = None,
+    hotspot_cache: Optional[HotspotCache] = None,
+    report: Optional[ResolutionReport] = None,
+    retry_delay: float = 0.0,
+) -> Generator["pa.RecordBatch", None, None]:
+    """Load challenge data as columnar record batches.
+
+    Rows are written straight into column buffers instead of creating a
+    ChallengeResult per witness. The batches follow CHALLENGE_RESULT_SCHEMA
+    and can be handed to Parquet or Feather writers without conversion.
+
+    :param challenges: List of challenges
+    :param load_type: Load type for witnesses all, trilateration or best_signal
+    :param limit: Limit of challenges to load
+    :param batch_size: Number of rows per record batch
+    :param order_by: signal, snr, distance or a custom scoring function
+    :param witness_filters: Filters a witness has to pass to be loaded
+    :param k: Number of witnesses per challenge, overrides the load type
+    :param seen_index: Index of loaded challenges, which are skipped
+    :param hotspot_cache: Cache for hotspot lookups, shared between calls
+    :param report: Report that is filled with the resolution counts
+    :param retry_delay: Seconds to wait before missing hotspots are retried
+    :return: Record batches of challenge data
+    """
+    logger.info("Loading challenge batches")
+    columns: List[List[Any]] = [[] for _ in CHALLENGE_RESULT_FIELDS]
+    rows = 0
+    for row in __iter_challenge_rows(
+        challenges=challenges,
+        load_type=load_type,
+        limit=limit,
+        order_by=order_by,
+        witness_filters=witness_filters,
+        k=k,
+        seen_index=seen_index,
+        hotspot_cache=hotspot_cache,
+        report=report,
+        retry_delay=retry_delay,
+    ):
+        for column, value in zip(columns, row):
+            column.append(value)
+        rows += 1
+
+        if rows == batch_size:
+            yield __to_record_batch(columns)
+            columns = [[] for _ in CHALLENGE_RESULT_FIELDS]
+            rows = 0
+
+    if rows > 0:
+        yield __to_record_batch(columns)
+
+
+def select_witnesses(
+    witnesses: Sequence[Witness],
+    k: Optional[int] = None,
+    key: Union[str, WitnessKey] = "signal",
+    filters: Optional[Sequence[WitnessFilter]] = None,
+    largest: bool = True,
+) -> List[Witness]:
+    """Filter witnesses and select the top k of them.
+
+    Selection uses a bounded heap, so picking k out of n witnesses costs
+    O(n log k) instead of sorting the whole list. A WitnessArray is filtered
+    and selected vectorized if the key and all filters support it. Witnesses
+    scored NaN, e.g. without snr, are ranked last in both directions.
+
+    :param witnesses: List of witnesses
+    :param k: Number of witnesses to return, None returns all of them sorted
+    :param key: Name of a registered key in WITNESS_KEYS or a scoring function
+    :param filters: Filters a witness has to pass to be selected
+    :param largest: Select the witnesses with the highest score
+    :return: List of witnesses
+    """
+    filters = filters or []
+    if (
+        isinstance(witnesses, WitnessArray)
+        and key in ARRAY_KEYS
+        and all(isinstance(f, ArrayFilter) for f in filters)
+    ):
+        mask = witnesses.mask()
+        for f in filters:
+            mask &= cast(ArrayFilter, f).mask(witnesses)
+        indices = witnesses.top_k(k, by=key, mask=mask, largest=largest)
+        return [witnesses[int(index)] for index in indices]
+
+    rank = __rank_key(WITNESS_KEYS[key] if isinstance(key, str) else key, largest)
+    candidates: Iterable[Witness] = witnesses
+    if filters:
+        candidates = [w for w in witnesses if all(f(w) for f in filters)]
+
+    if k is None:
+        return sorted(candidates, key=rank)
+    return heapq.nsmallest(k, candidates, key=rank)
+
+
+def __rank_key(
+    score: WitnessKey, largest: bool
+) -> Callable[[Witness], Tuple[bool, float]]:
+    """Turn a score into a key the best witness is the smallest of.
+
+    :param score: Scoring function
+    :param largest: Rank the witnesses with the highest score first
+    :return: Key ranking witnesses scored NaN last, like WitnessArray.top_k
+    """
+
+    def rank(witness: Witness) -> Tuple[bool, float]:
+        value = score(witness)
+        return math.isnan(value), -value if largest else value
+
+    return rank
+
+
+def by_signal(witness: Witness) -> float:
+    """Score a witness by its signal strength."""
+    return float(witness.signal)
+
+
+def by_snr(witness: Witness) -> float:
+    """Score a witness by its signal to noise ratio, NaN if it is missing."""
+    return witness.snr if witness.snr is not None else float("nan")
+
+
+class ArrayFilter(ABC):
+    """Witness filter that can also be applied to a WitnessArray at once."""
+
+    @abstractmethod
+    def __call__(self, witness: Witness) -> bool:
+        """Check if a witness passes the filter."""
+
+    @abstractmethod
+    def mask(self, witnesses: WitnessArray) -> Any:
+        """Get a boolean mask of the witnesses passing the filter.
+
+        :param witnesses: The witness array
+        """
+
+
+class IsValid(ArrayFilter):
+    """Filter witnesses that were accepted by the chain."""
+
+    def __call__(self, witness: Witness) -> bool:
+        """Check if a witness is valid."""
+        return bool(witness.is_valid)
+
+    def mask(self, witnesses: WitnessArray) -> Any:
+        """Get a boolean mask of the valid witnesses."""
+        return witnesses.mask(valid_only=True)
+
+
+class MinSnr(ArrayFilter):
+    """Filter witnesses with a minimum signal to noise ratio."""
+
+    def __init__(self, threshold: float) -> None:
+        """Create the filter.
+
+        :param threshold: Minimum snr of a witness
+        """
+        self.threshold = threshold
+
+    def __call__(self, witness: Witness) -> bool:
+        """Check the snr of a witness."""
+        return witness.snr is not None and witness.snr >= self.threshold
+
+    def mask(self, witnesses: WitnessArray) -> Any:
+        """Get a boolean mask of the witnesses with enough snr."""
+        return witnesses.mask(min_snr=self.threshold)
+
+
+class DatarateIn(ArrayFilter):
+    """Filter witnesses received with one of the given datarates."""
+
+    def __init__(self, *datarates: str) -> None:
+        """Create the filter.
+
+        :param datarates: Accepted datarates, e.g. SF9BW125
+        """
+        self.datarates = frozenset(datarates)
+
+    def __call__(self, witness: Witness) -> bool:
+        """Check the datarate of a witness."""
+        return witness.datarate in self.datarates
+
+    def mask(self, witnesses: WitnessArray) -> Any:
+        """Get a boolean mask of the witnesses with an accepted datarate."""
+        return witnesses.mask(datarates=list(self.datarates))
+
+
+is_valid = IsValid()
+min_snr = MinSnr
+datarate_in = DatarateIn
+
+WITNESS_KEYS: Dict[str, WitnessKey] = {"signal": by_signal, "snr": by_snr}
+ARRAY_KEYS = ("signal", "snr")
+
+LOAD_TYPES: Dict[str, Optional[int]] = {
+    "all": None,
+    "trilateration": 3,
+    "best_signal": 1,
+}
+
+
+def __iter_challenge_rows(
+    challenges: Optional[List[ChallengeResolved]],
+    load_type: str,
+    limit: int,
+    order_by: Union[str, WitnessKey],
+    witness_filters: Optional[Sequence[WitnessFilter]],
+    k: Optional[int],
+    seen_index: Optional[SeenChallengeIndex],
+    hotspot_cache: Optional[HotspotCache],
+    report: Optional[ResolutionReport],
+    retry_delay: float,
+) -> Generator[ChallengeRow, None, None]:
+    """Select and resolve the witnesses of challenges.
+
+    :param challenges: List of challenges
+    :param load_type: Load type for witnesses all, trilateration or best_signal
+    :param limit: Limit of challenges to load
+    :param order_by: signal, snr, distance or a custom scoring function
+    :param witness_filters: Filters a witness has to pass to be loaded
+    :param k: Number of witnesses per challenge, overrides the load type
+    :param seen_index: Index of loaded challenges, which are skipped
+    :param hotspot_cache: Cache for hotspot lookups
+    :param report: Report that is filled with the resolution counts
+    :param retry_delay: Seconds to wait before missing hotspots are retried
+    :return: Rows in the field order of ChallengeResult
+    """
     if challenges is None:
-        challenges = get_challenges(limit=limit)
-    else:
-        challenges = challenges
+        challenges = get_challenges(limit=limit, witness_array=True)
+
+    if k is None:
+        k = LOAD_TYPES.get(load_type)
+
+    cache = hotspot_cache if hotspot_cache is not None else HotspotCache()
+    report = report if report is not None else ResolutionReport()
+    deferred: List[DeferredChallenge] = []
 
+    for challenge in __unseen_challenges(challenges, seen_index):
+        witnesses = __select_challenge_witnesses(
+            challenge, order_by, k, witness_filters
+        )
+        if not witnesses or challenge.challengee is None:
+            __mark_seen(seen_index, challenge)
+            continue
+
+        rows, complete = __challenge_rows(
+            challenge,
+            cache.get(challenge.challengee),
+            witnesses,
+            order_by,
+            k,
+            cache,
+            report,
+            deferred,
+        )
+        yield from rows
+        if complete:
+            __mark_seen(seen_index, challenge)
+
+    yield from __finish_deferred(
+        deferred, order_by, k, seen_index, cache, report, retry_delay
+    )
+
+
+def __unseen_challenges(
+    challenges: Iterable[ChallengeResolved],
+    seen_index: Optional[SeenChallengeIndex],
+) -> Generator[ChallengeResolved, None, None]:
+    """Count the challenges and skip the ones in the seen index."""
     for challenge in challenges:
-        if challenge.witnesses is not None:
-            witnesses = __sort_witnesses(challenge.witnesses, load_type=load_type)
+        count(CHALLENGES)
+        if seen_index is not None and challenge.hash in seen_index:
+            logger.debug(f"Skipping seen challenge {challenge.hash}")
+            continue
+        yield challenge
+
+
+def __select_challenge_witnesses(
+    challenge: ChallengeResolved,
+    order_by: Union[str, WitnessKey],
+    k: Optional[int],
+    witness_filters: Optional[Sequence[WitnessFilter]],
+) -> List[Witness]:
+    """Select the witnesses of a challenge, all of them to order by distance."""
+    if not challenge.witnesses:
+        return []
+    if order_by == "distance":
+        return select_witnesses(challenge.witnesses, k=None, filters=witness_filters)
+    return select_witnesses(
+        challenge.witnesses, k=k, key=order_by, filters=witness_filters
+    )
 
-        if challenge.challengee is not None:
-            challengee = get_hotspot_by_address(address=challenge.challengee)
-            if len(challengee) == 0:
-                continue
 
-        for witness in witnesses:
-            witness_hotspot = get_hotspot_by_address(address=witness.gateway)
-            if len(witness_hotspot) == 0:
-                continue
+def __challenge_rows(
+    challenge: ChallengeResolved,
+    challengee: Optional[Hotspot],
+    witnesses: List[Witness],
+    order_by: Union[str, WitnessKey],
+    k: Optional[int],
+    cache: HotspotCache,
+    report: ResolutionReport,
+    deferred: List[DeferredChallenge],
+) -> Tuple[List[ChallengeRow], bool]:
+    """Resolve the rows of a challenge, deferring its missing hotspots.
+
+    :param challenge: The challenge
+    :param challengee: Hotspot of the challengee, None if it is missing
+    :param witnesses: Selected witnesses of the challenge
+    :param order_by: signal, snr, distance or a custom scoring function
+    :param k: Number of witnesses per challenge
+    :param cache: Cache for hotspot lookups
+    :param report: Report that is filled with the resolution counts
+    :param deferred: Challenges with missing hotspots, which is extended
+    :return: Rows to emit now and if the challenge is complete
+    """
+    if challengee is None:
+        report.deferred += len(witnesses)
+        deferred.append((challenge, None, witnesses, []))
+        return [], False
+
+    rows, missing = __load_witness_rows(challenge, witnesses, challengee, cache.get)
+    if missing:
+        report.deferred += len(missing)
+        # rows are held back so a challenge is emitted and marked seen at once
+        deferred.append((challenge, challengee, missing, rows))
+        return [], False
+
+    if order_by == "distance":
+        rows = __select_by_distance(rows, k=k)
+
+    report.resolved += len(rows)
+    return rows, True
+
+
+def __finish_deferred(
+    deferred: List[DeferredChallenge],
+    order_by: Union[str, WitnessKey],
+    k: Optional[int],
+    seen_index: Optional[SeenChallengeIndex],
+    cache: HotspotCache,
+    report: ResolutionReport,
+    retry_delay: float,
+) -> Generator[ChallengeRow, None, None]:
+    """Retry the deferred challenges after a delay and log what is still missing."""
+    if deferred:
+        if retry_delay > 0:
+            time.sleep(retry_delay)
+        yield from __retry_deferred(deferred, order_by, k, seen_index, cache, report)
+
+    if report.unresolved:
+        logger.warning(
+            f"{report.unresolved_count} hotspots could not be resolved, "
+            f"{sum(report.unresolved.values())} rows were dropped"
+        )
+
+
+def __retry_deferred(
+    deferred: List[DeferredChallenge],
+    order_by: Union[str, WitnessKey],
+    k: Optional[int],
+    seen_index: Optional[SeenChallengeIndex],
+    cache: HotspotCache,
+    report: ResolutionReport,
+) -> Generator[ChallengeRow, None, None]:
+    """Resolve the hotspots that were missing in the first pass.
+
+    :param deferred: Challenges with missing hotspots
+    :param order_by: signal, snr, distance or a custom scoring function
+    :param k: Number of witnesses per challenge
+    :param seen_index: Index of loaded challenges
+    :param cache: Cache for hotspot lookups
+    :param report: Report that is filled with the resolution counts
+    :return: Recovered rows in the field order of ChallengeResult
+    """
+    logger.info(f"Retrying {len(deferred)} challenges with missing hotspots")
+    challengees = __refresh_hotspots(
+        (
+            challenge.challengee
+            for challenge, challengee, _, _ in deferred
+            if challengee is None and challenge.challengee is not None
+        ),
+        cache,
+    )
+    retried = []
+    for challenge, challengee, witnesses, held in deferred:
+        if challengee is None and challenge.challengee is not None:
+            challengee = challengees[challenge.challengee]
+        if challengee is None:
+            report.add_unresolved(str(challenge.challengee), len(witnesses))
+            continue
+        retried.append((challenge, challengee, witnesses, held))
+
+    witness_hotspots = __refresh_hotspots(
+        (witness.gateway for _, _, witnesses, _ in retried for witness in witnesses),
+        cache,
+    )
+    for challenge, challengee, witnesses, held in retried:
+        rows, missing = __load_witness_rows(
+            challenge, witnesses, challengee, witness_hotspots.get
+        )
+        for witness in missing:
+            report.add_unresolved(witness.gateway)
+        report.recovered += len(rows)
+
+        rows = held + rows
+        if order_by == "distance":
+            rows = __select_by_distance(rows, k=k)
+        report.resolved += len(rows)
+        yield from rows
+        __mark_seen(seen_index, challenge)
+
+
+def __refresh_hotspots(
+    addresses: Iterable[str], cache: HotspotCache
+) -> Dict[str, Optional[Hotspot]]:
+    """Request every distinct address once, even if it is known to be missing.
+
+    :param addresses: Addresses of the hotspots, may repeat
+    :param cache: Cache for hotspot lookups
+    :return: Hotspot or None by address
+    """
+    return {
+        address: cache.get(address, refresh=True)
+        for address in dict.fromkeys(addresses)
+    }
+
+
+def __mark_seen(
+    seen_index: Optional[SeenChallengeIndex], challenge: ChallengeResolved
+) -> None:
+    """Add a processed challenge to the seen index."""
+    if seen_index is not None and challenge.hash is not None:
+        seen_index.add(challenge.hash)
+
+
+def __load_witness_rows(
+    challenge: ChallengeResolved,
+    witnesses: List[Witness],
+    challengee: Hotspot,
+    lookup: Callable[[str], Optional[Hotspot]],
+) -> Tuple[List[ChallengeRow], List[Witness]]:
+    """Resolve the witness hotspots of a challenge.
 
-            yield __get_challenge_data(
+    :param challenge: Challenge
+    :param witnesses: Selected witnesses
+    :param challengee: Challengee
+    :param lookup: Function getting a hotspot by address, None if missing
+    :return: Challenge data rows and the witnesses without a hotspot
+    """
+    rows = []
+    missing = []
+    for witness in witnesses:
+        witness_hotspot = lookup(witness.gateway)
+        if witness_hotspot is None:
+            missing.append(witness)
+            continue
+
+        rows.append(
+            __get_challenge_row(
                 challenge=challenge,
                 witness=witness,
-                hotspot=witness_hotspot[0],
-                challengee=challengee[0],
+                hotspot=witness_hotspot,
+                challengee=challengee,
             )
+        )
+    return rows, missing
+
+
+def __select_by_distance(
+    rows: List[ChallengeRow], k: Optional[int] = None
+) -> List[ChallengeRow]:
+    """Select the k witnesses farthest away from the challengee.
+
+    :param rows: Resolved challenge data rows
+    :param k: Number of rows to return
+    :return: Challenge data rows
+    """
+    if k is None:
+        return sorted(rows, key=__distance_score, reverse=True)
+    return heapq.nlargest(k, rows, key=__distance_score)
+
 
+def __distance_score(row: ChallengeRow) -> float:
+    """Score challenge data by the distance between challengee and witness."""
+    distance = row[__DISTANCE_INDEX]
+    return float(distance) if distance is not None else float("-inf")
 
-def __get_challenge_data(
+
+def __get_challenge_row(
     challenge: ChallengeResolved,
     witness: Witness,
     hotspot: Hotspot,
     challengee: Hotspot,
-) -> ChallengeResult:
+) -> ChallengeRow:
     """Get challenge data.
 
     :param challenge: Challenge
     :param witness: Witness
     :param hotspot: Witness hotspot
     :param challengee: Challengee
-    :return: Challenge data
+    :return: Challenge data in the field order of ChallengeResult
     """
+    from haversine import Unit
+    from haversine import haversine
+
     # @todo: check if best position for distance
     distance = haversine(
         (challengee.lat, challengee.lng),
         (hotspot.lat, hotspot.lng),
         unit=Unit.METERS,
     )
-    return ChallengeResult(
-        challengee=challengee.address,
-        challengee_lat=challengee.lat,
-        challengee_lng=challengee.lng,
-        witness=hotspot.address,
-        witness_lat=hotspot.lat,
-        witness_lng=hotspot.lng,
-        signal=witness.signal,
-        snr=witness.snr,
-        datarate=witness.datarate,
-        is_valid=witness.is_valid,
-        hash=challenge.hash,
-        time=challenge.time,
-        distance=distance,
+    return (
+        challengee.address,
+        challengee.lat,
+        challengee.lng,
+        hotspot.address,
+        hotspot.lat,
+        hotspot.lng,
+        witness.signal,
+        witness.snr,
+        witness.datarate,
+        witness.is_valid,
+        challenge.hash,
+        challenge.time,
+        distance,
     )
 
 
-def __resolve_challenge(challenge: Challenge) -> ChallengeResolved:
+def __to_record_batch(columns: List[List[Any]]) -> "pa.RecordBatch":
+    """Build a record batch from column buffers.
+
+    :param columns: Columns in the field order of ChallengeResult
+    :return: Record batch
+    """
+    import pyarrow as pa
+
+    from helium_api_wrapper.schemas import arrow_schema
+
+    schema = arrow_schema(ChallengeResult, downcast=False)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def __parse_challenge(
+    challenge: Dict[str, Any], witness_array: bool = False
+) -> ChallengeResolved:
+    """Parse and resolve a challenge from the API.
+
+    :param challenge: The challenge payload
+    :param witness_array: Store the witnesses in a WitnessArray
+    :return: The resolved challenge.
+    """
+    intern_challenge(challenge)
+    return __resolve_challenge(Challenge(**challenge), witness_array)
+
+
+def __resolve_challenge(
+    challenge: Challenge, witness_array: bool = False
+) -> ChallengeResolved:
     """Resolve a challenge.
 
     :param challenge: The challenge to resolve, defaults to None
     :type: Challenge
 
+    :param witness_array: Store the witnesses in a WitnessArray
+    :type: bool
+
     :return: The resolved challenge.
     :rtype: ChallengeResolved
     """
@@ -184,32 +845,8 @@ def __resolve_challenge(challenge: Challenge) -> ChallengeResolved:
         key: challenge_dict[key] for key in challenge_dict if key != "path"
     }
     challenge_resolved.update(challenge_dict["path"][0])
-    return ChallengeResolved(**challenge_resolved)
-
-
-def __sort_witnesses(witnesses: List[Witness], load_type: str = "all") -> List[Witness]:
-    """Sort witnesses by signal and limit by load type.
-
-    :param witnesses: List of witnesses
-    :param load_type: Load type
-    :return: List of witnesses
-    """
-    return_witnesses: List[Witness]
-
-    if load_type == "trilateration":
-        return_witnesses = sorted(
-            witnesses, key=lambda witness: witness.signal, reverse=False
-        )[: max(3, len(witnesses))]
-    elif load_type == "best_signal":
-        if len(witnesses) == 0:
-            return witnesses
-        return_witnesses = [
-            sorted(witnesses, key=lambda witness: witness.signal, reverse=False)[0]
-        ]
-    else:
-        return_witnesses = sorted(
-            witnesses,
-            key=lambda witness: witness.signal,
-            reverse=False,
+    if witness_array and challenge_resolved.get("witnesses") is not None:
+        challenge_resolved["witnesses"] = WitnessArray.from_dicts(
+            challenge_resolved["witnesses"]
         )
-    return return_witnesses
+    return ChallengeResolved(**challenge_resolved)
@@ -0,0 +1,419 @@
+"""Client Module.
+
+.. module:: client
+
+:synopsis: Client of the Helium APIs with its own connections, caches and limits
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import logging
+from contextlib import contextmanager
+from types import TracebackType
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Literal
+from typing import Optional
+from typing import Tuple
+from typing import Type
+from typing import TypeVar
+from typing import Union
+from typing import overload
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper import devices as devices
+from helium_api_wrapper import events as events
+from helium_api_wrapper import hotspots as hotspots
+from helium_api_wrapper.DataObjects import ChallengeResolved
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.DataObjects import Device
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.DataObjects import EventQuery
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.DataObjects import IntegrationEvent
+from helium_api_wrapper.DataObjects import Role
+from helium_api_wrapper.endpoint import RateLimiter
+from helium_api_wrapper.endpoint import Transport
+from helium_api_wrapper.endpoint import use_transport
+from helium_api_wrapper.events import LazyEvent
+from helium_api_wrapper.hotspots import HotspotCache
+from helium_api_wrapper.metrics import Metrics
+from helium_api_wrapper.records import ChallengeResultRecord
+from helium_api_wrapper.records import EventRecord
+from helium_api_wrapper.records import HotspotRecord
+
+
+# pyarrow is imported by load_challenge_batches, it is slow to import
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+class HeliumClient:
+    """Client of the Blockchain and Console APIs.
+
+    A client owns a Transport, i.e. its session, endpoints, API key and rate
+    limits, a HotspotCache and the counters of its requests, so several
+    differently configured clients can run in one process. The methods are
+    the functions of the hotspots, challenges, devices and events modules
+    run with the transport of the client. Those functions keep using the
+    default transport, configured from the environment, when they are called
+    directly. A client can be shared between threads::
+
+        with HeliumClient(pool_size=32) as client:
+            hotspot = client.get_hotspot_by_address(address)
+    """
+
+    def __init__(
+        self,
+        api_endpoint: Optional[str] = None,
+        console_endpoint: Optional[str] = None,
+        api_key: Optional[str] = None,
+        pool_size: int = 10,
+        rate_limits: Optional[Dict[str, Optional[RateLimiter]]] = None,
+        hotspot_cache: Optional[HotspotCache] = None,
+        transport: Optional[Transport] = None,
+    ) -> None:
+        """Create a client.
+
+        :param api_endpoint: Base URL of the Blockchain API, see Transport
+        :param console_endpoint: Base URL of the Console API
+        :param api_key: Key of the Console API
+        :param pool_size: Maximum number of connections kept open per host
+        :param rate_limits: Limiters by endpoint, by default only the Console
+            API is limited to 10 requests per second
+        :param hotspot_cache: Cache for hotspot lookups, a new one by default
+        :param transport: Transport to use instead of creating one from the
+            other parameters
+        """
+        self.transport = transport or Transport(
+            api_endpoint=api_endpoint,
+            console_endpoint=console_endpoint,
+            api_key=api_key,
+            pool_size=pool_size,
+            rate_limits=rate_limits,
+        )
+        self.hotspot_cache = hotspot_cache or HotspotCache()
+
+    def __enter__(self) -> "HeliumClient":
+        """Use the client as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the client."""
+        self.close()
+
+    @property
+    def metrics(self) -> Metrics:
+        """Counters of the requests and retries of the client."""
+        return self.transport.metrics
+
+    @contextmanager
+    def activate(self) -> Generator["HeliumClient", None, None]:
+        """Send the requests of the module functions in a block with this client.
+
+        :return: The client
+        """
+        with use_transport(self.transport):
+            yield self
+
+    def close(self) -> None:
+        """Close the open connections of the client."""
+        self.transport.close()
+
+    def get_hotspot_by_address(self, address: str) -> List[Hotspot]:
+        """Load a hotspot, see hotspots.get_hotspot_by_address."""
+        return self.__call(hotspots.get_hotspot_by_address, address)
+
+    def get_hotspot(self, address: str) -> Optional[Hotspot]:
+        """Get a hotspot from the cache of the client or the API.
+
+        :param address: Address of the hotspot
+        :return: Hotspot or None if the API did not return one
+        """
+        return self.__call(self.hotspot_cache.get, address)
+
+    @overload
+    def get_hotspots(
+        self,
+        pages: int = ...,
+        filter_modes: str = ...,
+        as_records: Literal[False] = ...,
+    ) -> List[Hotspot]:
+        ...
+
+    @overload
+    def get_hotspots(
+        self, pages: int = ..., filter_modes: str = ..., *, as_records: Literal[True]
+    ) -> List[HotspotRecord]:
+        ...
+
+    @overload
+    def get_hotspots(
+        self, pages: int = ..., filter_modes: str = ..., as_records: bool = ...
+    ) -> Union[List[Hotspot], List[HotspotRecord]]:
+        ...
+
+    def get_hotspots(
+        self, pages: int = 1, filter_modes: str = "full", as_records: bool = False
+    ) -> Union[List[Hotspot], List[HotspotRecord]]:
+        """Load a list of hotspots, see hotspots.get_hotspots."""
+        return self.__call(hotspots.get_hotspots, pages, filter_modes, as_records)
+
+    def get_hotspot_page(
+        self, cursor: Optional[str] = None, filter_modes: str = "full"
+    ) -> Tuple[List[Hotspot], Optional[str]]:
+        """Load one page of hotspots, see hotspots.get_hotspot_page."""
+        return self.__call(hotspots.get_hotspot_page, cursor, filter_modes)
+
+    def load_roles(
+        self, address: str, limit: int = 5, filter_types: str = "poc_receipts_v2"
+    ) -> List[Role]:
+        """Load the roles of a hotspot, see hotspots.load_roles."""
+        return self.__call(hotspots.load_roles, address, limit, filter_types)
+
+    @overload
+    def get_hotspots_box_search(
+        self,
+        swlat: str,
+        swlon: str,
+        nelat: str,
+        nelon: str,
+        as_records: Literal[False] = ...,
+    ) -> List[Hotspot]:
+        ...
+
+    @overload
+    def get_hotspots_box_search(
+        self,
+        swlat: str,
+        swlon: str,
+        nelat: str,
+        nelon: str,
+        *,
+        as_records: Literal[True]
+    ) -> List[HotspotRecord]:
+        ...
+
+    @overload
+    def get_hotspots_box_search(
+        self, swlat: str, swlon: str, nelat: str, nelon: str, as_records: bool = ...
+    ) -> Union[List[Hotspot], List[HotspotRecord]]:
+        ...
+
+    def get_hotspots_box_search(
+        self, swlat: str, swlon: str, nelat: str, nelon: str, as_records: bool = False
+    ) -> Union[List[Hotspot], List[HotspotRecord]]:
+        """Load the hotspots in a box, see hotspots.get_hotspots_box_search."""
+        return self.__call(
+            hotspots.get_hotspots_box_search, swlat, swlon, nelat, nelon, as_records
+        )
+
+    @overload
+    def get_hotspots_by_position(
+        self, lat: str, lon: str, distance: int, as_records: Literal[False] = ...
+    ) -> List[Hotspot]:
+        ...
+
+    @overload
+    def get_hotspots_by_position(
+        self, lat: str, lon: str, distance: int, *, as_records: Literal[True]
+    ) -> List[HotspotRecord]:
+        ...
+
+    @overload
+    def get_hotspots_by_position(
+        self, lat: str, lon: str, distance: int, as_records: bool = ...
+    ) -> Union[List[Hotspot], List[HotspotRecord]]:
+        ...
+
+    def get_hotspots_by_position(
+        self, lat: str, lon: str, distance: int, as_records: bool = False
+    ) -> Union[List[Hotspot], List[HotspotRecord]]:
+        """Load the hotspots around a position, see hotspots.get_hotspots_by_position."""
+        return self.__call(
+            hotspots.get_hotspots_by_position, lat, lon, distance, as_records
+        )
+
+    def get_challenges(
+        self, limit: int = 50, witness_array: bool = False
+    ) -> List[ChallengeResolved]:
+        """Load a list of challenges, see challenges.get_challenges."""
+        return self.__call(challenges.get_challenges, limit, witness_array)
+
+    def get_challenges_since(
+        self,
+        since: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        witness_array: bool = False,
+    ) -> List[ChallengeResolved]:
+        """Load the latest challenges, see challenges.get_challenges_since."""
+        return self.__call(
+            challenges.get_challenges_since, since, max_pages, witness_array
+        )
+
+    def get_challenge_by_id(
+        self, id: str, witness_array: bool = False
+    ) -> Optional[ChallengeResolved]:
+        """Load a challenge, see challenges.get_challenge_by_id."""
+        return self.__call(challenges.get_challenge_by_id, id, witness_array)
+
+    def get_challenges_by_address(
+        self, address: str, limit: int = 50, witness_array: bool = False
+    ) -> List[ChallengeResolved]:
+        """Load the challenges of a hotspot, see challenges.get_challenges_by_address."""
+        return self.__call(
+            challenges.get_challenges_by_address, address, limit, witness_array
+        )
+
+    def load_challenge_data(
+        self, **options: Any
+    ) -> Generator[Union[ChallengeResult, ChallengeResultRecord], None, None]:
+        """Load challenge data, see challenges.load_challenge_data.
+
+        The hotspots are looked up in the cache of the client unless another
+        hotspot_cache is given.
+
+        :param options: Parameters of challenges.load_challenge_data
+        :return: The challenge results
+        """
+        options.setdefault("hotspot_cache", self.hotspot_cache)
+        return self.__stream(challenges.load_challenge_data, **options)
+
+    def load_challenge_batches(
+        self, **options: Any
+    ) -> Generator["pa.RecordBatch", None, None]:
+        """Load challenge data as record batches, see challenges.load_challenge_batches.
+
+        The hotspots are looked up in the cache of the client unless another
+        hotspot_cache is given.
+
+        :param options: Parameters of challenges.load_challenge_batches
+        :return: The record batches
+        """
+        options.setdefault("hotspot_cache", self.hotspot_cache)
+        return self.__stream(challenges.load_challenge_batches, **options)
+
+    def get_device_by_uuid(self, uuid: str) -> Device:
+        """Load a device, see devices.get_device_by_uuid."""
+        return self.__call(devices.get_device_by_uuid, uuid)
+
+    def iter_devices(
+        self, pages: Optional[int] = None
+    ) -> Generator[Device, None, None]:
+        """Stream the devices of the organization, see devices.iter_devices."""
+        return self.__stream(devices.iter_devices, pages)
+
+    def get_devices(self, pages: Optional[int] = None) -> List[Device]:
+        """Load the devices of the organization, see devices.get_devices."""
+        return self.__call(devices.get_devices, pages)
+
+    def get_devices_by_uuid(
+        self, uuids: Iterable[str], max_workers: int = 8
+    ) -> Generator[Tuple[str, Device], None, None]:
+        """Load many devices concurrently, see devices.get_devices_by_uuid."""
+        return self.__stream(devices.get_devices_by_uuid, uuids, max_workers)
+
+    @overload
+    def get_events_for_device(
+        self, uuid: str, as_records: Literal[False] = ...
+    ) -> List[Event]:
+        ...
+
+    @overload
+    def get_events_for_device(
+        self, uuid: str, *, as_records: Literal[True]
+    ) -> List[EventRecord]:
+        ...
+
+    @overload
+    def get_events_for_device(
+        self, uuid: str, as_records: bool = ...
+    ) -> Union[List[Event], List[EventRecord]]:
+        ...
+
+    def get_events_for_device(
+        self, uuid: str, as_records: bool = False
+    ) -> Union[List[Event], List[EventRecord]]:
+        """Load the events of a device, see devices.get_events_for_device."""
+        return self.__call(devices.get_events_for_device, uuid, as_records)
+
+    def get_events_for_devices(
+        self, uuids: Iterable[str], max_workers: int = 8, as_records: bool = False
+    ) -> Generator[Tuple[str, Union[List[Event], List[EventRecord]]], None, None]:
+        """Load the events of many devices, see devices.get_events_for_devices."""
+        return self.__stream(
+            devices.get_events_for_devices, uuids, max_workers, as_records
+        )
+
+    def get_last_event(self, uuid: str) -> Event:
+        """Load the last event of a device, see devices.get_last_event."""
+        return self.__call(devices.get_last_event, uuid)
+
+    def get_last_integration(self, uuid: str, max_workers: int = 8) -> IntegrationEvent:
+        """Load the last integration of a device, see devices.get_last_integration."""
+        return self.__call(
+            devices.get_last_integration, uuid, self.hotspot_cache, max_workers
+        )
+
+    def get_last_integrations(
+        self, uuids: Iterable[str], max_workers: int = 8
+    ) -> Generator[Tuple[str, IntegrationEvent], None, None]:
+        """Load the last integrations of many devices, see devices.get_last_integrations."""
+        return self.__stream(
+            devices.get_last_integrations, uuids, self.hotspot_cache, max_workers
+        )
+
+    def iter_events(
+        self, uuid: str, query: Optional[EventQuery] = None
+    ) -> Generator[LazyEvent, None, None]:
+        """Stream the matching events of a device, see events.iter_events."""
+        return self.__stream(events.iter_events, uuid, query)
+
+    def query_events(
+        self, uuid: str, query: Optional[EventQuery] = None, lazy: bool = False
+    ) -> Union[List[Event], List[LazyEvent]]:
+        """Load the matching events of a device, see events.query_events."""
+        return self.__call(events.query_events, uuid, query, lazy)
+
+    def __call(
+        self, function: Callable[..., Result], *args: Any, **kwargs: Any
+    ) -> Result:
+        """Call a function with the transport of the client."""
+        with use_transport(self.transport):
+            return function(*args, **kwargs)
+
+    def __stream(
+        self, function: Callable[..., Iterable[Item]], *args: Any, **kwargs: Any
+    ) -> Generator[Item, None, None]:
+        """Stream the items of a generator function with the transport of the client.
+
+        The transport is only active while the next item is produced, so code
+        consuming the stream between two items uses its own transport.
+        """
+        iterator: Iterator[Item] = iter(function(*args, **kwargs))
+        while True:
+            with use_transport(self.transport):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
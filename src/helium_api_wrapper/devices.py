@@ -9,14 +9,31 @@
 """
 
 import logging
+from functools import partial
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import Iterable
 from typing import List
+from typing import Literal
+from typing import Optional
+from typing import Tuple
+from typing import Union
+from typing import overload
 
 from helium_api_wrapper.DataObjects import Device
 from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.DataObjects import EventQuery
+from helium_api_wrapper.DataObjects import Hotspot
 from helium_api_wrapper.DataObjects import IntegrationEvent
 from helium_api_wrapper.DataObjects import IntegrationHotspot
+from helium_api_wrapper.endpoint import concurrent_map
+from helium_api_wrapper.endpoint import iter_pages
 from helium_api_wrapper.endpoint import request
-from helium_api_wrapper.hotspots import get_hotspot_by_address
+from helium_api_wrapper.events import iter_events
+from helium_api_wrapper.hotspots import HotspotCache
+from helium_api_wrapper.records import EventRecord
+from helium_api_wrapper.records import from_dict
 
 
 logging.basicConfig(level=logging.INFO)
@@ -38,57 +55,110 @@ def get_device_by_uuid(uuid: str) -> Device:
         return Device(uuid=uuid)
 
 
-def get_last_integration(uuid: str) -> IntegrationEvent:
-    """Load a device integration events.
+def iter_devices(pages: Optional[int] = None) -> Generator[Device, None, None]:
+    """Stream all devices of the organization page by page.
 
-    :param uuid: UUID of the device
-    :return: Device
+    :param pages: Number of pages to load, None loads all of them
+    :return: Devices
     """
-    logger.info(f"Getting Device Integration Events for uuid {uuid}")
-    events = request(
-        url=f"devices/{uuid}/events?sub_category=uplink_integration_req",
-        endpoint="console",
+    logger.info("Getting Devices of the organization")
+    for page in iter_pages(url="devices", endpoint="console", pages=pages):
+        for device in page:
+            yield Device(**device)
+
+
+def get_devices(pages: Optional[int] = None) -> List[Device]:
+    """Load all devices of the organization.
+
+    :param pages: Number of pages to load, None loads all of them
+    :return: List of devices
+    """
+    return list(iter_devices(pages))
+
+
+def get_devices_by_uuid(
+    uuids: Iterable[str], max_workers: int = 8
+) -> Generator[Tuple[str, Device], None, None]:
+    """Load many devices concurrently.
+
+    Requests share the rate limit of the Console endpoint, see
+    endpoint.set_rate_limit, and at most max_workers run at once.
+
+    :param uuids: UUIDs of the devices
+    :param max_workers: Maximum number of concurrent requests
+    :return: Pairs of UUID and device, as soon as they are loaded
+    """
+    yield from concurrent_map(get_device_by_uuid, uuids, max_workers)
+
+
+def get_events_for_devices(
+    uuids: Iterable[str], max_workers: int = 8, as_records: bool = False
+) -> Generator[Tuple[str, Union[List[Event], List[EventRecord]]], None, None]:
+    """Load the recent events of many devices concurrently.
+
+    :param uuids: UUIDs of the devices
+    :param max_workers: Maximum number of concurrent requests
+    :param as_records: Return compact EventRecords instead of models
+    :return: Pairs of UUID and events, as soon as they are loaded
+    """
+    yield from concurrent_map(
+        partial(get_events_for_device, as_records=as_records), uuids, max_workers
     )
 
-    if len(events) == 0:
-        raise Exception(f"No Integration Events existing for device with uuid {uuid}")
 
-    last_event = None
-    hotspots = []
+def get_last_integration(
+    uuid: str, hotspot_cache: Optional[HotspotCache] = None, max_workers: int = 8
+) -> IntegrationEvent:
+    """Load the last integration event of a device with its hotspots.
 
-    # Handling too long body
-    for event in events:
-        if isinstance(event["data"]["req"]["body"], str):
-            continue
-        last_event = event
-        break
+    The hotspots that received the uplink are looked up concurrently and only
+    once per address. Pass a shared cache, which may be filled from a local
+    snapshot with HotspotCache.update, to skip known hotspots.
 
-    if last_event is None:
-        raise Exception(f"No Integration Events existing for device with uuid {uuid}")
+    :param uuid: UUID of the device
+    :param hotspot_cache: Cache of hotspot lookups, a new one if None
+    :param max_workers: Maximum number of concurrent hotspot requests
+    :return: Device
+    """
+    event = __get_last_integration_event(uuid)
+    cache = hotspot_cache if hotspot_cache is not None else HotspotCache()
+    hotspots = cache.get_many(__gateway_addresses(event), max_workers)
+    return __to_integration_event(event, hotspots)
 
-    if len(last_event["data"]["req"]["body"]["hotspots"]) == 0:
-        raise Exception(
-            f"No Hotspots existing for integration of device with uuid {uuid}"
-        )
 
-    for hotspot in last_event["data"]["req"]["body"]["hotspots"]:
-        hsp = get_hotspot_by_address(hotspot["id"])
-        if len(hsp) == 0:
-            logger.info(f"No Hotspot found for address {hotspot['id']}")
-            continue
-        else:
-            h = hsp[0].dict()
-            h["rssi"] = hotspot["rssi"]
-            h["snr"] = hotspot["snr"]
-            h["datarate"] = hotspot["spreading"]
-            h["frequency"] = hotspot["frequency"]
-            h["reported_at"] = hotspot["reported_at"]
-            # h["status"] = hotspot["snr"]
-            hotspots.append(IntegrationHotspot(**h))
+def get_last_integrations(
+    uuids: Iterable[str],
+    hotspot_cache: Optional[HotspotCache] = None,
+    max_workers: int = 8,
+) -> Generator[Tuple[str, IntegrationEvent], None, None]:
+    """Load the last integration events of many devices.
+
+    The events are loaded concurrently first, then every hotspot that
+    received any of the uplinks is looked up once for all devices. Devices
+    without integration events or whose events fail to load are logged and
+    skipped.
 
-    last_event["hotspots"] = hotspots
+    :param uuids: UUIDs of the devices
+    :param hotspot_cache: Cache of hotspot lookups, a new one if None
+    :param max_workers: Maximum number of concurrent requests
+    :return: Pairs of UUID and integration event
+    """
+    events = {}
+    for uuid, event in concurrent_map(__try_last_integration_event, uuids, max_workers):
+        if event is not None:
+            events[uuid] = event
 
-    return IntegrationEvent(**last_event)
+    cache = hotspot_cache if hotspot_cache is not None else HotspotCache()
+    hotspots = cache.get_many(
+        (
+            address
+            for event in events.values()
+            for address in __gateway_addresses(event)
+        ),
+        max_workers,
+    )
+    for uuid, event in events.items():
+        yield uuid, __to_integration_event(event, hotspots)
 
 
 def get_last_event(uuid: str) -> Event:
@@ -107,12 +177,34 @@ def get_last_event(uuid: str) -> Event:
         return Event(device_id=uuid)
 
 
-def get_events_for_device(uuid: str) -> List[Event]:
+@overload
+def get_events_for_device(uuid: str, as_records: Literal[False] = ...) -> List[Event]:
+    ...
+
+
+@overload
+def get_events_for_device(uuid: str, *, as_records: Literal[True]) -> List[EventRecord]:
+    ...
+
+
+@overload
+def get_events_for_device(
+    uuid: str, as_records: bool = ...
+) -> Union[List[Event], List[EventRecord]]:
+    ...
+
+
+def get_events_for_device(
+    uuid: str, as_records: bool = False
+) -> Union[List[Event], List[EventRecord]]:
     """Get the previous 100 events for the device with the given uuid.
 
     :param uuid: The ID of the Device, defaults to None
     :type uuid: str
 
+    :param as_records: Return compact EventRecords instead of models
+    :type as_records: bool
+
     :return: The Event.
     :rtype: Event
     """
@@ -120,4 +212,76 @@ def get_events_for_device(uuid: str) -> List[Event]:
     events = request(url=f"devices/{uuid}/events", endpoint="console")
     if len(events) == 0:
         logger.info(f"No Events existing for device with uuid {uuid}")
+    if as_records:
+        return [from_dict(EventRecord, event) for event in events]
     return [Event(**event) for event in events]
+
+
+def __find_last_integration_event(uuid: str) -> Optional[Dict[str, Any]]:
+    """Load the latest integration event of a device with a parsed body."""
+    logger.info(f"Getting Device Integration Events for uuid {uuid}")
+    query = EventQuery(sub_category="uplink_integration_req")
+    for event in iter_events(uuid, query):
+        body = event.data["req"]["body"]
+        # Handling too long body
+        if isinstance(body, str):
+            continue
+        if len(body["hotspots"]) == 0:
+            raise Exception(
+                f"No Hotspots existing for integration of device with uuid {uuid}"
+            )
+        return event.payload
+    return None
+
+
+def __try_last_integration_event(uuid: str) -> Optional[Dict[str, Any]]:
+    """Load the latest integration event of a device or None if it fails."""
+    try:
+        event = __find_last_integration_event(uuid)
+    except Exception as error:
+        logger.warning(f"Skipping device with uuid {uuid}: {error}")
+        return None
+    if event is None:
+        logger.info(f"No Integration Events existing for device with uuid {uuid}")
+    return event
+
+
+def __get_last_integration_event(uuid: str) -> Dict[str, Any]:
+    """Load the latest integration event of a device or raise."""
+    event = __find_last_integration_event(uuid)
+    if event is None:
+        raise Exception(f"No Integration Events existing for device with uuid {uuid}")
+    return event
+
+
+def __gateway_addresses(event: Dict[str, Any]) -> List[str]:
+    """Get the addresses of the hotspots that received an uplink."""
+    return [hotspot["id"] for hotspot in event["data"]["req"]["body"]["hotspots"]]
+
+
+def __to_integration_event(
+    event: Dict[str, Any], hotspots: Dict[str, Optional[Hotspot]]
+) -> IntegrationEvent:
+    """Add the resolved hotspots and radio values to an integration event."""
+    integration_hotspots = []
+    for gateway in event["data"]["req"]["body"]["hotspots"]:
+        hotspot = hotspots.get(gateway["id"])
+        if hotspot is None:
+            logger.info(f"No Hotspot found for address {gateway['id']}")
+            continue
+        # The cached hotspot is valid already, so its fields are copied
+        # instead of dumping and validating it again
+        integration_hotspots.append(
+            IntegrationHotspot.construct(
+                **hotspot.__dict__,
+                rssi=float(gateway["rssi"]),
+                snr=float(gateway["snr"]),
+                datarate=gateway["spreading"],
+                frequency=float(gateway["frequency"]),
+                channel=gateway.get("channel"),
+                reported_at=gateway.get("reported_at"),
+            )
+        )
+    return IntegrationEvent.construct(
+        **Event(**event).__dict__, hotspots=integration_hotspots
+    )
@@ -10,21 +10,211 @@
 
 import logging
 import os
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from contextvars import copy_context
+from itertools import islice
 from typing import Any
+from typing import Callable
 from typing import Dict
+from typing import Generator
+from typing import Iterable
 from typing import List
 from typing import Optional
+from typing import Tuple
+from typing import TypeVar
 
 import requests
 from dotenv import find_dotenv
 from dotenv import load_dotenv
 from requests import Response
+from requests.adapters import HTTPAdapter
+
+from helium_api_wrapper.metrics import REQUESTS
+from helium_api_wrapper.metrics import RETRIES
+from helium_api_wrapper.metrics import Metrics
+from helium_api_wrapper.metrics import count
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+class RateLimiter:
+    """Token bucket that limits the rate of requests across threads."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """Create a limiter.
+
+        :param rate: Requests per second
+        :param burst: Requests that may be sent at once after a pause
+        """
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(
+                self.burst, self.__tokens + (now - self.__updated) * self.rate
+            )
+            self.__updated = now
+            self.__tokens -= 1
+            wait = -self.__tokens / self.rate if self.__tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Transport:
+    """Connections and settings used to talk to the APIs.
+
+    A transport owns a session with a connection pool, the rate limiters of
+    the endpoints and the counters of its requests. Endpoints and the API key
+    that are not given are read from the environment or the .env file on
+    every request, like API_ENDPOINT, CONSOLE_ENDPOINT and API_KEY. The
+    functions of this module use the active transport, see use_transport,
+    and the default one otherwise.
+    """
+
+    def __init__(
+        self,
+        api_endpoint: Optional[str] = None,
+        console_endpoint: Optional[str] = None,
+        api_key: Optional[str] = None,
+        pool_size: int = 10,
+        rate_limits: Optional[Dict[str, Optional[RateLimiter]]] = None,
+    ) -> None:
+        """Create a transport, the session is opened on the first request.
+
+        :param api_endpoint: Base URL of the Blockchain API
+        :param console_endpoint: Base URL of the Console API
+        :param api_key: Key of the Console API
+        :param pool_size: Maximum number of connections kept open per host
+        :param rate_limits: Limiters by endpoint, by default only the Console
+            API is limited to 10 requests per second
+        """
+        self.api_endpoint = api_endpoint
+        self.console_endpoint = console_endpoint
+        self.api_key = api_key
+        self.pool_size = pool_size
+        if rate_limits is None:
+            rate_limits = {"api": None, "console": RateLimiter(rate=10, burst=10)}
+        self.rate_limiters = rate_limits
+        self.metrics = Metrics()
+        self.__session: Optional[requests.Session] = None
+        self.__lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Session of the transport, shared by its requests and threads."""
+        with self.__lock:
+            if self.__session is None:
+                self.__session = _create_session(self.pool_size)
+            return self.__session
+
+    def set_pool_size(self, size: int) -> None:
+        """Set the number of open connections per host.
+
+        :param size: Maximum number of connections kept open per host
+        """
+        with self.__lock:
+            self.pool_size = size
+            if self.__session is not None:
+                self.__session.close()
+            self.__session = _create_session(size)
+
+    def set_rate_limit(
+        self, endpoint: str, rate: Optional[float], burst: int = 1
+    ) -> None:
+        """Limit the requests per second to an endpoint.
+
+        :param endpoint: Either "api" or "console"
+        :param rate: Requests per second, None removes the limit
+        :param burst: Requests that may be sent at once after a pause
+        """
+        self.rate_limiters[endpoint] = RateLimiter(rate, burst) if rate else None
+
+    def close(self) -> None:
+        """Close the open connections."""
+        with self.__lock:
+            if self.__session is not None:
+                self.__session.close()
+                self.__session = None
+
+
+__default_transport = Transport()
+__active_transport: ContextVar[Transport] = ContextVar("transport")
+
+# Limits of the endpoints of the default transport
+RATE_LIMITERS = __default_transport.rate_limiters
+
+
+def get_transport() -> Transport:
+    """Get the transport requests are sent with.
+
+    :return: The active transport, the default one outside of use_transport
+    """
+    return __active_transport.get(__default_transport)
+
+
+@contextmanager
+def use_transport(transport: Transport) -> Generator[Transport, None, None]:
+    """Send the requests of a block with a transport.
+
+    The transport is active in the current thread and the threads of
+    concurrent_map, other threads keep using their own.
+
+    :param transport: The transport
+    :return: The transport
+    """
+    token = __active_transport.set(transport)
+    try:
+        yield transport
+    finally:
+        __active_transport.reset(token)
+
+
+def set_rate_limit(endpoint: str, rate: Optional[float], burst: int = 1) -> None:
+    """Limit the requests per second to an endpoint of the active transport.
+
+    :param endpoint: Either "api" or "console"
+    :param rate: Requests per second, None removes the limit
+    :param burst: Requests that may be sent at once after a pause
+    """
+    get_transport().set_rate_limit(endpoint, rate, burst)
+
+
+def get_session() -> requests.Session:
+    """Get the HTTP session of the active transport.
+
+    Connections to the APIs are kept open and reused between requests and
+    threads instead of opening a new one per request.
+
+    :return: The session
+    """
+    return get_transport().session
+
+
+def set_pool_size(size: int) -> None:
+    """Set the number of open connections per host, e.g. to the number of workers.
+
+    :param size: Maximum number of connections kept open per host
+    """
+    get_transport().set_pool_size(size)
+
 
 def request(
     url: str,
@@ -40,26 +230,115 @@ def request(
     :param pages: The number of pages to request
     :return: The response from the API
     """
+    data = []
+    for page in iter_pages(url=url, endpoint=endpoint, params=params, pages=pages):
+        data.extend(page)
+    return data
+
+
+def iter_pages(
+    url: str,
+    endpoint: str = "api",
+    params: Optional[Dict[str, Any]] = None,
+    pages: Optional[int] = None,
+) -> Generator[List[Dict[str, Any]], None, None]:
+    """Request the pages of a resource one by one.
+
+    The cursor of each page is sent with the request of the next one, until
+    the API returns no cursor or the number of pages is reached.
+
+    :param url: The url to request
+    :param endpoint: The endpoint to request. Either "api" or "console".
+    :param params: The parameters to send with the request
+    :param pages: The number of pages to request, None requests all of them
+    :return: The data of each page
+    """
+    for page, _ in iter_cursor_pages(url, endpoint, params, pages):
+        yield page
+
+
+def iter_cursor_pages(
+    url: str,
+    endpoint: str = "api",
+    params: Optional[Dict[str, Any]] = None,
+    pages: Optional[int] = None,
+) -> Generator[Tuple[List[Dict[str, Any]], Optional[str]], None, None]:
+    """Request the pages of a resource with the cursor of the next page.
+
+    Pass the cursor as parameter to continue later where a run stopped.
+
+    :param url: The url to request
+    :param endpoint: The endpoint to request. Either "api" or "console".
+    :param params: The parameters to send with the request, e.g. a cursor
+    :param pages: The number of pages to request, None requests all of them
+    :return: Pairs of the data of a page and the cursor of the next page,
+        None after the last page
+    """
     url = __get_url(url=url, endpoint=endpoint)
     headers = __get_headers(endpoint=endpoint)
-    params = params or {}
-
-    data = []
+    params = dict(params or {})
 
-    for page in range(pages):
+    page = 0
+    while pages is None or page < pages:
+        limiter = get_transport().rate_limiters.get(endpoint)
+        if limiter is not None:
+            limiter.acquire()
         res = __request_with_exponential_backoff(
             url=url, headers=headers, params=params
         )
-        if res["cursor"] == "":
-            logger.debug(f"Finished crawling data at page {page + 1} of {pages}.")
-            break
+        page += 1
 
         if isinstance(res["data"], list):
-            data.extend(res["data"])
-        else:
-            data.append(res["data"])
+            yield res["data"], res["cursor"] or None
+        elif res["data"] is not None:
+            yield [res["data"]], res["cursor"] or None
+
+        if not res["cursor"]:
+            logger.debug(f"Finished crawling data at page {page}.")
+            break
+        params["cursor"] = res["cursor"]
 
-    return data
+
+def concurrent_map(
+    function: Callable[[Item], Result],
+    items: Iterable[Item],
+    max_workers: int = 8,
+) -> Generator[Tuple[Item, Result], None, None]:
+    """Call a function for many items in threads and stream the results.
+
+    At most ``max_workers`` calls run at once and only as many items are
+    taken from the iterable, so the rate limits of the endpoints are kept
+    and long inputs are not loaded up front. Results are yielded as soon as
+    they are done, not in the order of the items.
+
+    :param function: Function to call, e.g. get_device_by_uuid
+    :param items: Arguments of the calls
+    :param max_workers: Maximum number of concurrent calls
+    :return: Pairs of item and result
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: Dict["Future[Result]", Item] = {}
+        for item in islice(items, max_workers):
+            running[executor.submit(copy_context().run, function, item)] = item
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = running.pop(future)
+                yield item, future.result()
+                for next_item in islice(items, 1):
+                    running[
+                        executor.submit(copy_context().run, function, next_item)
+                    ] = next_item
+
+
+def _create_session(pool_size: int) -> requests.Session:
+    """Create a session with a connection pool of the given size."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 def __get_headers(endpoint: str) -> Dict[str, str]:
@@ -70,7 +349,7 @@ def __get_headers(endpoint: str) -> Dict[str, str]:
             dotenv_path = find_dotenv(usecwd=True)
 
         load_dotenv(dotenv_path)
-        api_key = os.getenv("API_KEY")
+        api_key = get_transport().api_key or os.getenv("API_KEY")
 
         if not api_key:
             raise Exception("No api key found in .env")
@@ -103,6 +382,8 @@ def __request_with_exponential_backoff(
         is_error and num_of_retries < max_retries
     ):
         num_of_retries += 1
+        count(RETRIES)
+        get_transport().metrics.add(RETRIES)
         logger.info(
             f"Got status code {response.status_code} "
             f"Sleeping for {exponential_sleep_time} seconds"
@@ -149,7 +430,9 @@ def __handle_response(response: requests.Response) -> Dict[str, Any]:
 def __request(url: str, params: Dict[str, Any], headers: Dict[str, str]) -> Response:
     """Send a simple request to the Helium API and return the response."""
     logger.debug(f"Requesting {url}...")
-    response = requests.request(
+    count(REQUESTS)
+    get_transport().metrics.add(REQUESTS)
+    response = get_session().request(
         "GET",
         url=url,
         params=params,
@@ -169,13 +452,15 @@ def __get_url(url: str, endpoint: str) -> str:
     load_dotenv(dotenv_path)
 
     if endpoint == "console":
-        console_endpoint = os.getenv("CONSOLE_ENDPOINT")
+        console_endpoint = get_transport().console_endpoint or os.getenv(
+            "CONSOLE_ENDPOINT"
+        )
         if not console_endpoint:
             return f"https://{endpoint}.helium.com/api/v1/{url}"
         else:
             return f"{console_endpoint}/{url}"
     else:
-        api_endpoint = os.getenv("API_ENDPOINT")
+        api_endpoint = get_transport().api_endpoint or os.getenv("API_ENDPOINT")
         if not api_endpoint:
             return f"https://{endpoint}.helium.io/v1/{url}"
         else:
@@ -0,0 +1,205 @@
+"""Event Follower Module.
+
+.. module:: event_follower
+
+:synopsis: Stream new events of many devices from the Console API
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import Any
+from typing import AsyncGenerator
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.endpoint import concurrent_map
+from helium_api_wrapper.endpoint import request
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EventKey = Tuple[Any, ...]
+
+
+class EventFollower:
+    """Follow the events of many devices.
+
+    For every device the time of the latest event seen, the high-water mark,
+    is kept and only events after it are parsed into Event models. The
+    Console API always returns the latest events of a device, so the rest of
+    each response is skipped without validating it. A device is polled again
+    after ``min_interval`` seconds if it had new events and the interval
+    grows by ``backoff`` up to ``max_interval`` while it stays idle, so quiet
+    devices cost few requests. Events reported after a later event was seen
+    are skipped. The follower can be iterated in a thread or with
+    ``async for``.
+    """
+
+    def __init__(
+        self,
+        uuids: Iterable[str],
+        min_interval: float = 10.0,
+        max_interval: float = 600.0,
+        backoff: float = 2.0,
+        max_workers: int = 8,
+        since: Optional[Dict[str, int]] = None,
+    ) -> None:
+        """Create a follower, every device is due right away.
+
+        :param uuids: UUIDs of the devices
+        :param min_interval: Seconds between polls of an active device
+        :param max_interval: Maximum seconds between polls of an idle device
+        :param backoff: Factor the interval grows by after a poll without events
+        :param max_workers: Maximum number of concurrent requests
+        :param since: High-water marks to continue from, see marks. Devices
+            without one start with the events the API still returns.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.polls = 0
+        self.events = 0
+        self.__marks: Dict[str, int] = dict(since or {})
+        self.__keys: Dict[str, Set[EventKey]] = {}
+        self.__intervals: Dict[str, float] = {}
+        self.__schedule: List[Tuple[float, str]] = []
+        self.__stopped = threading.Event()
+        now = time.monotonic()
+        for uuid in dict.fromkeys(uuids):
+            self.__intervals[uuid] = min_interval
+            heapq.heappush(self.__schedule, (now, uuid))
+
+    @property
+    def marks(self) -> Dict[str, int]:
+        """High-water marks by device, milliseconds of the latest events."""
+        return dict(self.__marks)
+
+    def poll(self) -> List[Event]:
+        """Poll the devices that are due once.
+
+        :return: New events, oldest first per device
+        """
+        now = time.monotonic()
+        due = []
+        while self.__schedule and self.__schedule[0][0] <= now:
+            due.append(heapq.heappop(self.__schedule)[1])
+
+        new_events: List[Event] = []
+        for uuid, new in concurrent_map(self.__poll_device, due, self.max_workers):
+            # a failing device only backs off itself
+            self.__reschedule(uuid, bool(new))
+            new_events.extend(new or [])
+        self.polls += len(due)
+        self.events += len(new_events)
+        return new_events
+
+    def wait(self) -> bool:
+        """Sleep until the next device is due or the follower is stopped.
+
+        :return: False if the follower was stopped
+        """
+        return not self.__stopped.wait(self.__delay())
+
+    def stop(self) -> None:
+        """Stop the iteration after the running poll."""
+        self.__stopped.set()
+
+    def __iter__(self) -> Generator[Event, None, None]:
+        """Yield new events until the follower is stopped."""
+        while not self.__stopped.is_set():
+            yield from self.poll()
+            if not self.wait():
+                break
+
+    async def __aiter__(self) -> AsyncGenerator[Event, None]:
+        """Yield new events until the follower is stopped, polling in a thread."""
+        while not self.__stopped.is_set():
+            for event in await asyncio.get_running_loop().run_in_executor(
+                None, self.poll
+            ):
+                yield event
+            await asyncio.sleep(self.__delay())
+
+    def __delay(self) -> float:
+        """Seconds until the next device is due."""
+        if not self.__schedule:
+            return self.max_interval
+        return max(self.__schedule[0][0] - time.monotonic(), 0.0)
+
+    def __reschedule(self, uuid: str, active: bool) -> None:
+        """Schedule the next poll of a device."""
+        if active:
+            interval = self.min_interval
+        else:
+            interval = min(self.__intervals[uuid] * self.backoff, self.max_interval)
+        self.__intervals[uuid] = interval
+        heapq.heappush(self.__schedule, (time.monotonic() + interval, uuid))
+
+    def __poll_device(self, uuid: str) -> Optional[List[Event]]:
+        """Load the new events of a device, None if the request failed."""
+        try:
+            return self.__new_events(uuid, self.__request(uuid))
+        except Exception as error:
+            logger.warning(f"Polling device with uuid {uuid} failed: {error}")
+            return None
+
+    def __new_events(self, uuid: str, events: List[Dict[str, Any]]) -> List[Event]:
+        """Parse the events after the high-water mark and move it."""
+        mark = self.__marks.get(uuid)
+        keys = self.__keys.get(uuid, set())
+        new = []
+        for event in events:
+            reported_at = int(event["reported_at"])
+            if mark is not None and (
+                reported_at < mark
+                or (reported_at == mark and _event_key(event) in keys)
+            ):
+                continue
+            new.append((reported_at, event))
+        if not new:
+            return []
+
+        new.sort(key=lambda item: item[0])
+        latest = new[-1][0]
+        if latest != mark:
+            keys = set()
+        keys.update(_event_key(event) for at, event in new if at == latest)
+        # parse before moving the mark so invalid events are not skipped
+        parsed = [Event(**event) for _, event in new]
+        self.__marks[uuid] = latest
+        self.__keys[uuid] = keys
+        logger.debug(f"{len(new)} new events for device with uuid {uuid}")
+        return parsed
+
+    @staticmethod
+    def __request(uuid: str) -> List[Dict[str, Any]]:
+        """Load the latest events of a device without parsing them."""
+        events: List[Dict[str, Any]] = request(
+            url=f"devices/{uuid}/events", endpoint="console"
+        )
+        return events
+
+
+def _event_key(event: Dict[str, Any]) -> EventKey:
+    """Identify an event among the events with the same time."""
+    return (
+        event.get("id"),
+        event["reported_at"],
+        event.get("sub_category"),
+        event.get("frame_up"),
+        event.get("description"),
+    )
@@ -0,0 +1,136 @@
+"""Events Module.
+
+.. module:: events
+
+:synopsis: Filtered queries of Console device events
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import json
+import logging
+from typing import Any
+from typing import Dict
+from typing import Generator
+from typing import List
+from typing import Optional
+from typing import Union
+
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.DataObjects import EventQuery
+from helium_api_wrapper.endpoint import request
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LazyEvent:
+    """Event of the Console API whose data is decoded on first access.
+
+    The metadata like the time or category is read from the payload as it
+    is. The data, the largest part of an event, is kept as received, a dict
+    or a JSON string, and only parsed and validated when it is accessed, so
+    scanning many events for one of them stays cheap.
+    """
+
+    __slots__ = ("_payload", "_data", "_event")
+
+    def __init__(self, payload: Dict[str, Any]) -> None:
+        """Wrap an event payload.
+
+        :param payload: Event as returned by the API or stored
+        """
+        self._payload = payload
+        self._data: Optional[Dict[str, Any]] = None
+        self._event: Optional[Event] = None
+
+    @property
+    def device_id(self) -> str:
+        """UUID of the device."""
+        device_id: str = self._payload["device_id"]
+        return device_id
+
+    @property
+    def category(self) -> Optional[str]:
+        """Category of the event, e.g. uplink."""
+        return self._payload.get("category")
+
+    @property
+    def sub_category(self) -> str:
+        """Sub category of the event, e.g. uplink_integration_req."""
+        sub_category: str = self._payload["sub_category"]
+        return sub_category
+
+    @property
+    def reported_at(self) -> int:
+        """Time of the event in milliseconds."""
+        return int(self._payload["reported_at"])
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """Data of the event, decoded on first access."""
+        if self._data is None:
+            data = self._payload["data"]
+            self._data = json.loads(data) if isinstance(data, str) else data
+        return self._data
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """The event as it was received."""
+        return self._payload
+
+    def to_event(self) -> Event:
+        """Validate the event into an Event model.
+
+        :return: The event
+        """
+        if self._event is None:
+            self._event = Event(**{**self._payload, "data": self.data})
+        return self._event
+
+
+def iter_events(
+    uuid: str, query: Optional[EventQuery] = None
+) -> Generator[LazyEvent, None, None]:
+    """Stream the events of a device that match a query.
+
+    The filters are sent to the Console API and checked again on the
+    metadata of each event, the data is not decoded.
+
+    :param uuid: UUID of the device
+    :param query: Filter of the events, all recent events if None
+    :return: Lazily decoded events, latest first
+    """
+    query = query if query is not None else EventQuery()
+    logger.info(f"Getting Device Events for uuid {uuid}")
+    events = request(
+        url=f"devices/{uuid}/events", endpoint="console", params=query.params()
+    )
+    found = 0
+    for event in events:
+        if query.limit is not None and found >= query.limit:
+            break
+        if not query.matches(event):
+            continue
+        found += 1
+        yield LazyEvent(event)
+
+
+def query_events(
+    uuid: str, query: Optional[EventQuery] = None, lazy: bool = False
+) -> Union[List[Event], List[LazyEvent]]:
+    """Load the events of a device that match a query.
+
+    :param uuid: UUID of the device
+    :param query: Filter of the events, all recent events if None
+    :param lazy: Return LazyEvents that decode their data on access
+    :return: The events, latest first
+    """
+    events = list(iter_events(uuid, query))
+    if len(events) == 0:
+        logger.info(f"No Events existing for device with uuid {uuid}")
+    if lazy:
+        return events
+    return [event.to_event() for event in events]
@@ -9,11 +9,30 @@
 """
 
 import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Literal
+from typing import Optional
+from typing import Tuple
+from typing import Union
+from typing import overload
 
 from helium_api_wrapper.DataObjects import Hotspot
 from helium_api_wrapper.DataObjects import Role
+from helium_api_wrapper.endpoint import concurrent_map
+from helium_api_wrapper.endpoint import iter_cursor_pages
 from helium_api_wrapper.endpoint import request
+from helium_api_wrapper.interning import intern_hotspot
+from helium_api_wrapper.metrics import CACHE_HITS
+from helium_api_wrapper.metrics import CACHE_MISSES
+from helium_api_wrapper.metrics import count
+from helium_api_wrapper.records import HotspotRecord
+from helium_api_wrapper.records import from_dict
 
 
 logging.basicConfig(level=logging.INFO)
@@ -31,16 +50,151 @@ def get_hotspot_by_address(address: str) -> List[Hotspot]:
     # returning empty lists if the hotspot is temporarily not found
     try:
         hotspot = request(url=f"hotspots/{address}", endpoint="api")
+        intern_hotspot(hotspot[0])
         return [Hotspot(**hotspot[0])]
-    except TypeError:
+    except (IndexError, TypeError):
         return []
 
 
-def get_hotspots(pages: int = 1, filter_modes: str = "full") -> List[Hotspot]:
+class HotspotCache:
+    """Cache of hotspot lookups by address.
+
+    Found hotspots are kept in a bounded LRU cache. Addresses the API did not
+    return a hotspot for are remembered for ``negative_ttl`` seconds, so a
+    hotspot that is temporarily missing is not requested again for every
+    challenge it appears in. The cache can be shared between threads.
+    """
+
+    def __init__(self, negative_ttl: float = 30.0, max_size: int = 100_000) -> None:
+        """Create an empty cache.
+
+        :param negative_ttl: Seconds to remember that a hotspot was not found
+        :param max_size: Maximum number of cached hotspots
+        """
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.__hotspots: "OrderedDict[str, Hotspot]" = OrderedDict()
+        self.__missing: Dict[str, float] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, address: str, refresh: bool = False) -> Optional[Hotspot]:
+        """Get a hotspot from the cache or the API.
+
+        :param address: Address of the hotspot
+        :param refresh: Request the hotspot even if it is known to be missing
+        :return: Hotspot or None if the API did not return one
+        """
+        with self.__lock:
+            hotspot = self.__hotspots.get(address)
+            if hotspot is not None:
+                self.__hotspots.move_to_end(address)
+                self.hits += 1
+                count(CACHE_HITS)
+                return hotspot
+            if not refresh and self.__is_missing(address):
+                self.negative_hits += 1
+                count(CACHE_HITS)
+                return None
+            self.misses += 1
+            count(CACHE_MISSES)
+
+        found = get_hotspot_by_address(address)
+
+        with self.__lock:
+            if len(found) == 0:
+                self.__missing[address] = time.monotonic() + self.negative_ttl
+                return None
+            self.__missing.pop(address, None)
+            self.__hotspots[address] = found[0]
+            if len(self.__hotspots) > self.max_size:
+                self.__hotspots.popitem(last=False)
+            return found[0]
+
+    def get_many(
+        self, addresses: Iterable[str], max_workers: int = 8
+    ) -> Dict[str, Optional[Hotspot]]:
+        """Get many hotspots, requesting the unknown ones concurrently.
+
+        Every address is looked up once, no matter how often it is given.
+
+        :param addresses: Addresses of the hotspots
+        :param max_workers: Maximum number of concurrent requests
+        :return: Hotspot or None by address
+        """
+        unique = list(dict.fromkeys(addresses))
+        return dict(concurrent_map(self.get, unique, max_workers))
+
+    def update(self, hotspots: Iterable[Hotspot]) -> None:
+        """Add known hotspots, e.g. of a local snapshot, to the cache.
+
+        :param hotspots: The hotspots
+        """
+        with self.__lock:
+            for hotspot in hotspots:
+                self.__missing.pop(hotspot.address, None)
+                self.__hotspots[hotspot.address] = hotspot
+                self.__hotspots.move_to_end(hotspot.address)
+            while len(self.__hotspots) > self.max_size:
+                self.__hotspots.popitem(last=False)
+
+    def is_missing(self, address: str) -> bool:
+        """Check if a hotspot was recently not found.
+
+        :param address: Address of the hotspot
+        :return: True if the address is in the negative cache
+        """
+        with self.__lock:
+            return self.__is_missing(address)
+
+    def clear(self) -> None:
+        """Remove all cached hotspots and missing addresses."""
+        with self.__lock:
+            self.__hotspots.clear()
+            self.__missing.clear()
+
+    def __is_missing(self, address: str) -> bool:
+        """Check the negative cache, the lock has to be held."""
+        expires = self.__missing.get(address)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self.__missing[address]
+            return False
+        return True
+
+
+@overload
+def get_hotspots(
+    pages: int = ..., filter_modes: str = ..., as_records: Literal[False] = ...
+) -> List[Hotspot]:
+    ...
+
+
+@overload
+def get_hotspots(
+    pages: int = ..., filter_modes: str = ..., *, as_records: Literal[True]
+) -> List[HotspotRecord]:
+    ...
+
+
+@overload
+def get_hotspots(
+    pages: int = ..., filter_modes: str = ..., as_records: bool = ...
+) -> Union[List[Hotspot], List[HotspotRecord]]:
+    ...
+
+
+def get_hotspots(
+    pages: int = 1, filter_modes: str = "full", as_records: bool = False
+) -> Union[List[Hotspot], List[HotspotRecord]]:
     """Load a list of hotspots.
 
     :param pages: Amount of pages to load
     :param filter_modes: Filter modes
+    :param as_records: Return compact HotspotRecords instead of models
     :return: List of hotspots
     """
     logger.info("Getting hotspots")
@@ -50,7 +204,30 @@ def get_hotspots(pages: int = 1, filter_modes: str = "full") -> List[Hotspot]:
         params={"filter_modes": filter_modes},
         pages=pages,
     )
-    return [Hotspot(**i) for i in hotspots]
+    return __parse_hotspots(hotspots, as_records)
+
+
+def get_hotspot_page(
+    cursor: Optional[str] = None, filter_modes: str = "full"
+) -> Tuple[List[Hotspot], Optional[str]]:
+    """Load one page of hotspots.
+
+    Pass the returned cursor to load the next page, e.g. to refresh all
+    hotspots a few pages at a time.
+
+    :param cursor: Cursor of the page, None loads the first page
+    :param filter_modes: Filter modes
+    :return: The hotspots of the page and the cursor of the next page, None
+        after the last page
+    """
+    params = {"filter_modes": filter_modes}
+    if cursor is not None:
+        params["cursor"] = cursor
+    for page, next_cursor in iter_cursor_pages(
+        url="hotspots/", endpoint="api", params=params, pages=1
+    ):
+        return __parse_hotspots(page, False), next_cursor
+    return [], None
 
 
 def load_roles(
@@ -73,9 +250,30 @@ def load_roles(
     return [Role(**i) for i in roles]
 
 
+@overload
 def get_hotspots_box_search(
-    swlat: str, swlon: str, nelat: str, nelon: str
+    swlat: str, swlon: str, nelat: str, nelon: str, as_records: Literal[False] = ...
 ) -> List[Hotspot]:
+    ...
+
+
+@overload
+def get_hotspots_box_search(
+    swlat: str, swlon: str, nelat: str, nelon: str, *, as_records: Literal[True]
+) -> List[HotspotRecord]:
+    ...
+
+
+@overload
+def get_hotspots_box_search(
+    swlat: str, swlon: str, nelat: str, nelon: str, as_records: bool = ...
+) -> Union[List[Hotspot], List[HotspotRecord]]:
+    ...
+
+
+def get_hotspots_box_search(
+    swlat: str, swlon: str, nelat: str, nelon: str, as_records: bool = False
+) -> Union[List[Hotspot], List[HotspotRecord]]:
     """Get a list of hotspots by box search.
 
     :param swlat: The latitude of the southwest corner, defaults to None
@@ -90,6 +288,9 @@ def get_hotspots_box_search(
     :param nelon: The longitude of the northeast corner, defaults to None
     :type nelon: float
 
+    :param as_records: Return compact HotspotRecords instead of models
+    :type as_records: bool
+
     :return: The hotspots.
     :rtype: list[Hotspot]
     """
@@ -99,10 +300,33 @@ def get_hotspots_box_search(
         endpoint="api",
         params={"swlat": swlat, "swlon": swlon, "nelat": nelat, "nelon": nelon},
     )
-    return [Hotspot(**i) for i in hotspots]
+    return __parse_hotspots(hotspots, as_records)
+
+
+@overload
+def get_hotspots_by_position(
+    lat: str, lon: str, distance: int, as_records: Literal[False] = ...
+) -> List[Hotspot]:
+    ...
 
 
-def get_hotspots_by_position(lat: str, lon: str, distance: int) -> List[Hotspot]:
+@overload
+def get_hotspots_by_position(
+    lat: str, lon: str, distance: int, *, as_records: Literal[True]
+) -> List[HotspotRecord]:
+    ...
+
+
+@overload
+def get_hotspots_by_position(
+    lat: str, lon: str, distance: int, as_records: bool = ...
+) -> Union[List[Hotspot], List[HotspotRecord]]:
+    ...
+
+
+def get_hotspots_by_position(
+    lat: str, lon: str, distance: int, as_records: bool = False
+) -> Union[List[Hotspot], List[HotspotRecord]]:
     """Get a list of hotspots by position.
 
     :param lat: The latitude of the position, defaults to None
@@ -114,6 +338,9 @@ def get_hotspots_by_position(lat: str, lon: str, distance: int) -> List[Hotspot]
     :param distance: The distance in meters, defaults to None
     :type distance: int
 
+    :param as_records: Return compact HotspotRecords instead of models
+    :type as_records: bool
+
     :return: The hotspots.
     :rtype: list[Hotspot]
     """
@@ -122,4 +349,34 @@ def get_hotspots_by_position(lat: str, lon: str, distance: int) -> List[Hotspot]
         "hotspots/location/distance",
         params={"lat": lat, "lon": lon, "distance": distance},
     )
+    return __parse_hotspots(hotspots, as_records)
+
+
+@overload
+def __parse_hotspots(
+    hotspots: List[Dict[str, Any]], as_records: Literal[False]
+) -> List[Hotspot]:
+    ...
+
+
+@overload
+def __parse_hotspots(
+    hotspots: List[Dict[str, Any]], as_records: bool
+) -> Union[List[Hotspot], List[HotspotRecord]]:
+    ...
+
+
+def __parse_hotspots(
+    hotspots: List[Dict[str, Any]], as_records: bool
+) -> Union[List[Hotspot], List[HotspotRecord]]:
+    """Parse hotspots from the API to models or records.
+
+    :param hotspots: Hotspots from the API
+    :param as_records: Return compact HotspotRecords instead of models
+    :return: List of hotspots
+    """
+    for hotspot in hotspots:
+        intern_hotspot(hotspot)
+    if as_records:
+        return [from_dict(HotspotRecord, i) for i in hotspots]
     return [Hotspot(**i) for i in hotspots]
@@ -0,0 +1,131 @@
+"""Interning module.
+
+.. module:: interning
+
+:synopsis: String interning of repeated identifiers
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import threading
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+
+
+HOTSPOT_FIELDS = ("address", "owner", "location", "name")
+GEOCODE_FIELDS = (
+    "long_city",
+    "long_country",
+    "long_state",
+    "long_street",
+    "short_city",
+    "short_country",
+    "short_state",
+    "short_street",
+    "city_id",
+)
+WITNESS_FIELDS = ("gateway", "owner", "location", "location_hex", "datarate")
+CHALLENGE_FIELDS = (
+    "challengee",
+    "challengee_owner",
+    "challengee_location",
+    "challengee_location_hex",
+    "challenger",
+    "challenger_owner",
+    "challenger_location",
+)
+
+# Columns of the exported data that hold repeated identifiers
+DICTIONARY_FIELDS = frozenset(
+    HOTSPOT_FIELDS
+    + GEOCODE_FIELDS
+    + WITNESS_FIELDS
+    + CHALLENGE_FIELDS
+    + ("witness", "datarate")
+)
+
+
+class StringPool:
+    """Pool of unique strings.
+
+    Interning makes all equal strings parsed from API payloads share one
+    object, so millions of repeated addresses cost memory only once. The
+    pool is cleared when it reaches ``max_size`` and can be shared between
+    threads.
+    """
+
+    def __init__(self, max_size: int = 5_000_000) -> None:
+        """Create an empty pool.
+
+        :param max_size: Maximum number of strings in the pool
+        """
+        self.max_size = max_size
+        self.__pool: Dict[str, str] = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of strings in the pool."""
+        return len(self.__pool)
+
+    def intern(self, value: Optional[str]) -> Optional[str]:
+        """Get the pooled instance of a string, adding it to the pool.
+
+        :param value: The string
+        :return: The equal string from the pool
+        """
+        if value is None:
+            return None
+        with self.__lock:
+            if len(self.__pool) >= self.max_size and value not in self.__pool:
+                self.__pool = {}
+            return self.__pool.setdefault(value, value)
+
+    def intern_fields(self, data: Dict[str, Any], fields: Iterable[str]) -> None:
+        """Intern the string values of some fields of a payload in place.
+
+        :param data: The payload from the API
+        :param fields: Names of the fields to intern
+        """
+        for field in fields:
+            value = data.get(field)
+            if isinstance(value, str):
+                data[field] = self.intern(value)
+
+    def clear(self) -> None:
+        """Remove all strings from the pool."""
+        with self.__lock:
+            self.__pool = {}
+
+
+STRING_POOL = StringPool()
+
+
+def intern_hotspot(data: Dict[str, Any], pool: StringPool = STRING_POOL) -> None:
+    """Intern the repeated identifiers of a hotspot payload in place.
+
+    :param data: Hotspot payload from the API
+    :param pool: Pool to intern the strings in
+    """
+    pool.intern_fields(data, HOTSPOT_FIELDS)
+    geocode = data.get("geocode")
+    if isinstance(geocode, dict):
+        pool.intern_fields(geocode, GEOCODE_FIELDS)
+
+
+def intern_challenge(data: Dict[str, Any], pool: StringPool = STRING_POOL) -> None:
+    """Intern the repeated identifiers of a challenge payload in place.
+
+    :param data: Challenge payload from the API
+    :param pool: Pool to intern the strings in
+    """
+    pool.intern_fields(data, CHALLENGE_FIELDS)
+    for path in data.get("path") or []:
+        pool.intern_fields(path, CHALLENGE_FIELDS)
+        geocode = path.get("geocode")
+        if isinstance(geocode, dict):
+            pool.intern_fields(geocode, GEOCODE_FIELDS)
+        for witness in path.get("witnesses") or []:
+            pool.intern_fields(witness, WITNESS_FIELDS)
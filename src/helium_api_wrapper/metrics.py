@@ -0,0 +1,279 @@
+"""Metrics Module.
+
+.. module:: metrics
+
+:synopsis: Counters, progress reports and profiles of long running jobs
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from types import TracebackType
+from typing import TYPE_CHECKING
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import Optional
+from typing import TextIO
+from typing import Tuple
+from typing import Type
+from typing import TypeVar
+
+
+# The profilers are imported by profile, they are rarely needed
+if TYPE_CHECKING:
+    import cProfile
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Item = TypeVar("Item")
+
+# Names of the counters the package reports
+REQUESTS = "requests"
+RETRIES = "retries"
+CACHE_HITS = "cache_hits"
+CACHE_MISSES = "cache_misses"
+CHALLENGES = "challenges"
+ROWS = "rows"
+
+__collectors: Tuple["Metrics", ...] = ()
+__COLLECTORS_LOCK = threading.Lock()
+
+
+class Metrics:
+    """Counters of what the package does while it is active.
+
+    While a Metrics is entered as a context manager, the requests and
+    retries of endpoint, the lookups of every HotspotCache and the
+    challenges of load_challenge_data are counted in it. Several can be
+    active at once, e.g. in nested jobs.
+    """
+
+    def __init__(self) -> None:
+        """Create a Metrics with all counters at zero."""
+        self.started = time.monotonic()
+        self.__counters: Dict[str, int] = {}
+        self.__lock = threading.Lock()
+
+    def __enter__(self) -> "Metrics":
+        """Start counting."""
+        self.started = time.monotonic()
+        _register(self)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Stop counting."""
+        _unregister(self)
+
+    def add(self, name: str, value: int = 1) -> None:
+        """Increase a counter.
+
+        :param name: Name of the counter, e.g. REQUESTS
+        :param value: Amount to add
+        """
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        """Get the value of a counter.
+
+        :param name: Name of the counter
+        :return: The value, zero if it was never increased
+        """
+        return self.__counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Get all counters.
+
+        :return: Values by counter name
+        """
+        with self.__lock:
+            return dict(self.__counters)
+
+    def rate(self, name: str) -> float:
+        """Get the mean rate of a counter since the start.
+
+        :param name: Name of the counter
+        :return: Increase per second
+        """
+        elapsed = time.monotonic() - self.started
+        return self.get(name) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """Share of hotspot lookups answered by a cache, None without lookups."""
+        hits = self.get(CACHE_HITS)
+        lookups = hits + self.get(CACHE_MISSES)
+        return hits / lookups if lookups else None
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increase a counter of every active Metrics.
+
+    :param name: Name of the counter, e.g. REQUESTS
+    :param value: Amount to add
+    """
+    for metrics in __collectors:
+        metrics.add(name, value)
+
+
+class Progress:
+    """Periodic report of the throughput of a job.
+
+    A line with the rows, requests and their rates, the cache hit rate, the
+    retries and, if the number of challenges is known, the estimated time
+    left is written every ``interval`` seconds from a background thread. The
+    rows are counted by passing the data through track::
+
+        with Progress(total=1000) as progress:
+            for result in progress.track(load_challenge_data(limit=1000)):
+                ...
+    """
+
+    def __init__(
+        self,
+        total: Optional[int] = None,
+        interval: float = 1.0,
+        file: Optional[TextIO] = None,
+    ) -> None:
+        """Create a progress report.
+
+        :param total: Number of challenges of the job for the ETA
+        :param interval: Seconds between two reports
+        :param file: Where the reports are written, stderr by default
+        """
+        self.total = total
+        self.interval = interval
+        self.file = file if file is not None else sys.stderr
+        self.metrics = Metrics()
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "Progress":
+        """Start counting and reporting."""
+        self.metrics.__enter__()
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Stop reporting and write the final report."""
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.metrics.__exit__(exc_type, exc_value, traceback)
+        self.file.write(self.report() + "\n")
+        self.file.flush()
+
+    def track(self, data: Iterable[Item]) -> Generator[Item, None, None]:
+        """Count the rows of a stream and pass them on.
+
+        :param data: Models, records or record batches
+        :return: The same stream
+        """
+        for item in data:
+            self.metrics.add(ROWS, getattr(item, "num_rows", 1))
+            yield item
+
+    def report(self) -> str:
+        """Describe the current progress.
+
+        :return: One line of the counters and rates
+        """
+        metrics = self.metrics
+        parts = [
+            f"rows {metrics.get(ROWS):,} ({metrics.rate(ROWS):,.1f}/s)",
+            f"requests {metrics.get(REQUESTS):,} ({metrics.rate(REQUESTS):,.1f}/s)",
+        ]
+        hit_rate = metrics.hit_rate
+        if hit_rate is not None:
+            parts.append(f"cache hits {hit_rate:.1%}")
+        parts.append(f"retries {metrics.get(RETRIES):,}")
+        if self.total is not None:
+            done = metrics.get(CHALLENGES)
+            parts.append(f"challenges {done:,}/{self.total:,}")
+            rate = metrics.rate(CHALLENGES)
+            if rate > 0:
+                left = max(self.total - done, 0) / rate
+                parts.append(f"ETA {timedelta(seconds=round(left))}")
+        return " | ".join(parts)
+
+    def __run(self) -> None:
+        """Write a report every interval until stopped."""
+        end = "\r" if self.file.isatty() else "\n"
+        while not self.__stopped.wait(self.interval):
+            self.file.write(self.report() + end)
+            self.file.flush()
+
+
+@contextmanager
+def profile(path: str, frames: int = 25) -> Generator["cProfile.Profile", None, None]:
+    """Profile the time and memory of a block.
+
+    The cProfile statistics of the calling thread are written to ``path``,
+    to be read with pstats or snakeviz, and a tracemalloc snapshot with
+    ``frames`` frames per allocation to ``path.tracemalloc``, to be read with
+    tracemalloc.Snapshot.load. The peak memory is logged.
+
+    :param path: Path of the profile
+    :param frames: Number of frames stored per memory allocation
+    :return: The running profiler
+    """
+    import cProfile
+    import tracemalloc
+
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(frames)
+    # reset_peak is new in Python 3.9, before the peak may predate the block
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        snapshot.dump(f"{path}.tracemalloc")
+        logger.info(
+            f"Peak memory {peak / 1e6:,.1f} MB, profile written to {path} "
+            f"and {path}.tracemalloc"
+        )
+
+
+def _register(metrics: Metrics) -> None:
+    """Add a Metrics to the active ones."""
+    global __collectors
+    with __COLLECTORS_LOCK:
+        __collectors = (*__collectors, metrics)
+
+
+def _unregister(metrics: Metrics) -> None:
+    """Remove a Metrics from the active ones."""
+    global __collectors
+    with __COLLECTORS_LOCK:
+        __collectors = tuple(active for active in __collectors if active is not metrics)
@@ -0,0 +1,155 @@
+"""Records module.
+
+.. module:: records
+
+:synopsis: Compact tuple based records of the high volume DataObjects
+
+.. moduleauthor:: DSIA21
+
+"""
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Type
+from typing import TypeVar
+from typing import Union
+
+from pydantic import BaseModel
+
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.DataObjects import Geocode
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.DataObjects import Witness
+
+
+class HotspotRecord(NamedTuple):
+    """Record of a Hotspot."""
+
+    address: str
+    lat: float
+    lng: float
+    block: Optional[int] = None
+    block_added: Optional[int] = None
+    geocode: Optional[Union[Geocode, Dict[str, Any]]] = None
+    location: Optional[str] = None
+    name: Optional[str] = None
+    nonce: Optional[int] = None
+    owner: Optional[str] = None
+    reward_scale: Optional[float] = None
+
+
+class WitnessRecord(NamedTuple):
+    """Record of a Witness."""
+
+    timestamp: int
+    signal: int
+    packet_hash: str
+    owner: str
+    location: str
+    gateway: str
+    is_valid: Optional[bool] = None
+    datarate: Optional[str] = None
+    snr: Optional[float] = None
+
+
+class ChallengeResultRecord(NamedTuple):
+    """Record of a ChallengeResult."""
+
+    challengee: Optional[str] = None
+    challengee_lat: Optional[float] = None
+    challengee_lng: Optional[float] = None
+    witness: Optional[str] = None
+    witness_lat: Optional[float] = None
+    witness_lng: Optional[float] = None
+    signal: Optional[int] = None
+    snr: Optional[float] = None
+    datarate: Optional[str] = None
+    is_valid: Optional[bool] = None
+    hash: Optional[str] = None
+    time: Optional[int] = None
+    distance: Optional[float] = None
+
+
+class EventRecord(NamedTuple):
+    """Record of an Event."""
+
+    data: Dict[str, Any]
+    description: str
+    device_id: str
+    frame_down: Optional[int]
+    frame_up: Optional[int]
+    organization_id: str
+    reported_at: str
+    router_uuid: str
+    sub_category: str
+
+
+Record = Union[HotspotRecord, WitnessRecord, ChallengeResultRecord, EventRecord]
+RecordType = TypeVar(
+    "RecordType", HotspotRecord, WitnessRecord, ChallengeResultRecord, EventRecord
+)
+
+RECORD_TYPES: Dict[Type[BaseModel], Any] = {
+    Hotspot: HotspotRecord,
+    Witness: WitnessRecord,
+    ChallengeResult: ChallengeResultRecord,
+    Event: EventRecord,
+}
+MODEL_TYPES: Dict[Any, Type[BaseModel]] = {
+    record: model for model, record in RECORD_TYPES.items()
+}
+
+
+def from_dict(record_type: Type[RecordType], data: Mapping[str, Any]) -> RecordType:
+    """Create a record from an API payload without validation.
+
+    Keys that are not fields of the record are ignored.
+
+    :param record_type: Type of the record, e.g. HotspotRecord
+    :param data: Payload from the API
+    :return: The record
+    """
+    values: List[Any] = [data.get(field) for field in record_type._fields]
+    return record_type(*values)
+
+
+def from_model(model: BaseModel) -> Record:
+    """Create a record from a DataObjects model.
+
+    Models derived from a recorded model, e.g. an IntegrationHotspot, are
+    stored in the record of their base and lose their additional fields.
+
+    :param model: The model, e.g. a Hotspot
+    :raises ValueError: If there is no record for the model
+    :return: The record
+    """
+    record_type = __record_type(type(model))
+    values = model.__dict__
+    record: Record = record_type(*[values[field] for field in record_type._fields])
+    return record
+
+
+def __record_type(model_type: Type[BaseModel]) -> Any:
+    """Get the record type of a model or of its closest recorded base."""
+    for base in model_type.__mro__:
+        if base in RECORD_TYPES:
+            return RECORD_TYPES[base]
+    raise ValueError(f"No record type for {model_type.__name__}.")
+
+
+def to_model(record: Record, validate: bool = False) -> BaseModel:
+    """Create a DataObjects model from a record.
+
+    :param record: The record
+    :param validate: Validate the values, which also parses nested dicts
+    :return: The model
+    """
+    model = MODEL_TYPES[type(record)]
+    if validate:
+        return model(**record._asdict())
+    return model.construct(**record._asdict())
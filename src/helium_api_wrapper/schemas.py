@@ -0,0 +1,211 @@
+"""Schemas Module.
+
+.. module:: schemas
+
+:synopsis: Arrow schemas derived from the DataObjects models
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import json
+from functools import lru_cache
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Type
+from typing import Union
+
+import pyarrow as pa
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST
+from pydantic.fields import SHAPE_SINGLETON
+from pydantic.fields import ModelField
+
+from helium_api_wrapper.interning import DICTIONARY_FIELDS
+from helium_api_wrapper.records import MODEL_TYPES
+from helium_api_wrapper.records import Record
+
+
+# Measurements that do not need double precision in exported files
+FLOAT32_FIELDS = frozenset(("snr", "distance", "rssi", "frequency", "reward_scale"))
+
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+
+__SCALAR_TYPES = {
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+}
+
+
+@lru_cache(maxsize=None)
+def arrow_schema(
+    model: Type[BaseModel], dictionary_encode: bool = True, downcast: bool = True
+) -> pa.Schema:
+    """Derive the Arrow schema of a DataObjects model.
+
+    Every field is nullable. Integers are int64, so missing values stay
+    missing instead of turning ints into floats. Strings of repeated
+    identifiers like addresses are dictionary encoded and measurements like
+    snr are float32. Nested models become structs with plain strings, and
+    lists of models become lists of structs. Fields of any other type, e.g.
+    the data of an Event, are stored as JSON strings.
+
+    :param model: The model, e.g. ChallengeResult
+    :param dictionary_encode: Dictionary encode repeated identifiers
+    :param downcast: Store measurements as float32
+    :return: The schema with the fields in the order of the model
+    """
+    return pa.schema(
+        [
+            pa.field(name, __field_type(field, dictionary_encode, downcast))
+            for name, field in model.__fields__.items()
+        ]
+    )
+
+
+def record_schema(
+    record_type: Any, dictionary_encode: bool = True, downcast: bool = True
+) -> pa.Schema:
+    """Derive the Arrow schema of a record type from its model.
+
+    :param record_type: The record type, e.g. ChallengeResultRecord
+    :param dictionary_encode: Dictionary encode repeated identifiers
+    :param downcast: Store measurements as float32
+    :return: The schema with the fields in the order of the record
+    """
+    schema = arrow_schema(MODEL_TYPES[record_type], dictionary_encode, downcast)
+    return pa.schema([schema.field(name) for name in record_type._fields])
+
+
+def schema_of(
+    row: Union[BaseModel, Record], dictionary_encode: bool = True
+) -> pa.Schema:
+    """Get the schema of the exported rows of a model or record.
+
+    :param row: A model or record
+    :param dictionary_encode: Dictionary encode repeated identifiers
+    :return: The schema
+    """
+    if isinstance(row, BaseModel):
+        return arrow_schema(type(row), dictionary_encode)
+    return record_schema(type(row), dictionary_encode)
+
+
+def file_schema(schema: pa.Schema, dictionary_encode: bool = True) -> pa.Schema:
+    """Apply the types of exported files to the schema of record batches.
+
+    Measurements are downcast to float32 and dictionary encoded strings are
+    decoded if dictionary_encode is off.
+
+    :param schema: Schema of the batches, e.g. CHALLENGE_RESULT_SCHEMA
+    :param dictionary_encode: Keep dictionary encoded strings
+    :return: The schema of the file
+    """
+    fields = []
+    for field in schema:
+        if field.name in FLOAT32_FIELDS and pa.types.is_float64(field.type):
+            field = field.with_type(pa.float32())
+        elif pa.types.is_dictionary(field.type) and not dictionary_encode:
+            field = field.with_type(field.type.value_type)
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def to_record_batch(
+    rows: Sequence[Union[BaseModel, Record]], schema: pa.Schema
+) -> pa.RecordBatch:
+    """Build a record batch from models or records without pandas.
+
+    :param rows: Models or records of the same type
+    :param schema: Schema of the batch, see arrow_schema
+    :return: The record batch
+    """
+    arrays = []
+    for field in schema:
+        values = [getattr(row, field.name) for row in rows]
+        arrays.append(pa.array(__to_arrow_values(values, field.type), field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def nullable_pandas_type(data_type: pa.DataType) -> Any:
+    """Map Arrow types to pandas extension types that keep missing values.
+
+    Pass it as ``types_mapper`` to ``to_pandas``, so integer and boolean
+    columns with missing values keep their dtype instead of becoming floats
+    or objects.
+
+    :param data_type: The Arrow type
+    :return: The pandas dtype or None for the default conversion
+    """
+    import pandas as pd
+
+    types: Dict[pa.DataType, Any] = {
+        pa.int8(): pd.Int8Dtype(),
+        pa.int16(): pd.Int16Dtype(),
+        pa.int32(): pd.Int32Dtype(),
+        pa.int64(): pd.Int64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+    return types.get(data_type)
+
+
+def __field_type(
+    field: ModelField, dictionary_encode: bool, downcast: bool
+) -> pa.DataType:
+    """Get the Arrow type of a pydantic field."""
+    if field.shape == SHAPE_SINGLETON:
+        return __item_type(field.name, field.outer_type_, dictionary_encode, downcast)
+    if field.shape == SHAPE_LIST and field.sub_fields:
+        return pa.list_(__field_type(field.sub_fields[0], dictionary_encode, downcast))
+    return pa.string()
+
+
+def __item_type(
+    name: str, item: Any, dictionary_encode: bool, downcast: bool
+) -> pa.DataType:
+    """Get the Arrow type of a single value of a field."""
+    if isinstance(item, type) and issubclass(item, BaseModel):
+        return pa.struct(arrow_schema(item, False, downcast))
+    if item is str and dictionary_encode and name in DICTIONARY_FIELDS:
+        return DICTIONARY_STRING
+    if item is float and downcast and name in FLOAT32_FIELDS:
+        return pa.float32()
+    return __SCALAR_TYPES.get(item, pa.string())
+
+
+def __to_arrow_values(values: List[Any], data_type: pa.DataType) -> List[Any]:
+    """Convert field values to values Arrow accepts for a type."""
+    if pa.types.is_struct(data_type):
+        return [__to_dict(value) for value in values]
+    if pa.types.is_list(data_type):
+        return [
+            None
+            if value is None
+            else __to_arrow_values(list(value), data_type.value_type)
+            for value in values
+        ]
+    if pa.types.is_string(data_type):
+        return [
+            value if value is None or isinstance(value, str) else __to_json(value)
+            for value in values
+        ]
+    return values
+
+
+def __to_dict(value: Any) -> Any:
+    """Convert a nested model to a dict."""
+    if isinstance(value, BaseModel):
+        return value.dict()
+    return value
+
+
+def __to_json(value: Any) -> str:
+    """Serialize a value of an unknown type to JSON."""
+    value = __to_dict(value)
+    if isinstance(value, Sequence) and not isinstance(value, str):
+        value = [__to_dict(item) for item in value]
+    return json.dumps(value, default=str)
@@ -0,0 +1,201 @@
+"""Seen Challenges Module.
+
+.. module:: seen_challenges
+
+:synopsis: Persistent index of challenges that were already loaded
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+from types import TracebackType
+from typing import Iterable
+from typing import Optional
+from typing import Set
+from typing import Type
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SeenChallengeIndex:
+    """Persistent set of challenge hashes.
+
+    Hashes are stored as 16 byte digests in an SQLite table on disk, so the
+    exact set is not held in memory. A Bloom filter in front of the table
+    answers most lookups of unseen challenges without touching the disk. Its
+    size only depends on ``capacity`` and ``error_rate``, which keeps memory
+    bounded for hundreds of millions of hashes. The filter is saved next to
+    the database and rebuilt from the table if it is missing or outdated.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = 10_000_000,
+        error_rate: float = 0.01,
+        commit_every: int = 10_000,
+    ) -> None:
+        """Open or create the index.
+
+        :param path: Path of the SQLite database
+        :param capacity: Expected number of hashes, sizes the Bloom filter
+        :param error_rate: False positive rate of the Bloom filter at capacity
+        :param commit_every: Number of pending hashes after which to commit.
+            Call flush once the loaded data is stored to commit earlier.
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self.__bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.__hashes = max(1, round(self.__bits / capacity * math.log(2)))
+        self.__pending: Set[bytes] = set()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS seen (digest BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+        self.__bloom = self.__load_bloom()
+
+    def __contains__(self, challenge_hash: object) -> bool:
+        """Check if a challenge was already seen."""
+        if not isinstance(challenge_hash, str):
+            return False
+        digest = self.__digest(challenge_hash)
+        if not self.__bloom_contains(digest):
+            return False
+        if digest in self.__pending:
+            return True
+        row = self.__connection.execute(
+            "SELECT 1 FROM seen WHERE digest = ?", (digest,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        """Return the number of seen challenges."""
+        self.flush()
+        return self.__count()
+
+    def __enter__(self) -> "SeenChallengeIndex":
+        """Use the index as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Save and close the index.
+
+        Hashes that were not flushed yet are dropped if the block raised, so
+        challenges of an aborted export are loaded again on the next run.
+        """
+        if exc_type is not None:
+            self.__pending = set()
+        self.close()
+
+    def add(self, challenge_hash: str) -> None:
+        """Mark a challenge as seen.
+
+        :param challenge_hash: Hash of the challenge
+        """
+        digest = self.__digest(challenge_hash)
+        self.__bloom_add(digest)
+        self.__pending.add(digest)
+        if len(self.__pending) >= self.commit_every:
+            self.flush()
+
+    def update(self, challenge_hashes: Iterable[str]) -> None:
+        """Mark several challenges as seen.
+
+        :param challenge_hashes: Hashes of the challenges
+        """
+        for challenge_hash in challenge_hashes:
+            self.add(challenge_hash)
+
+    def flush(self) -> None:
+        """Write pending hashes to the database."""
+        if not self.__pending:
+            return
+        with self.__connection:
+            self.__connection.executemany(
+                "INSERT OR IGNORE INTO seen (digest) VALUES (?)",
+                ((digest,) for digest in self.__pending),
+            )
+        self.__pending = set()
+
+    def close(self) -> None:
+        """Write pending hashes, save the Bloom filter and close the database."""
+        self.flush()
+        self.__save_bloom()
+        self.__connection.close()
+
+    def __count(self) -> int:
+        """Count the hashes in the database."""
+        count: int = self.__connection.execute("SELECT COUNT(*) FROM seen").fetchone()[
+            0
+        ]
+        return count
+
+    def __bloom_positions(self, digest: bytes) -> Iterable[int]:
+        """Get the bit positions of a digest by double hashing."""
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.__bits for i in range(self.__hashes))
+
+    def __bloom_add(self, digest: bytes) -> None:
+        """Set the bits of a digest in the Bloom filter."""
+        for position in self.__bloom_positions(digest):
+            self.__bloom[position >> 3] |= 1 << (position & 7)
+
+    def __bloom_contains(self, digest: bytes) -> bool:
+        """Check if all bits of a digest are set in the Bloom filter."""
+        return all(
+            self.__bloom[position >> 3] & (1 << (position & 7))
+            for position in self.__bloom_positions(digest)
+        )
+
+    def __bloom_path(self) -> str:
+        """Get the path of the Bloom filter for the current parameters."""
+        return f"{self.path}.bloom-{self.__bits}-{self.__hashes}"
+
+    def __load_bloom(self) -> bytearray:
+        """Load the saved Bloom filter or rebuild it from the database."""
+        size = (self.__bits + 7) // 8
+        bloom_path = self.__bloom_path()
+        count = self.__count()
+        if os.path.exists(bloom_path):
+            with open(bloom_path, "rb") as file:
+                saved_count = int.from_bytes(file.read(8), "little")
+                bloom = bytearray(file.read())
+            if saved_count == count and len(bloom) == size:
+                return bloom
+
+        logger.info(f"Rebuilding Bloom filter of {self.path} from {count} hashes")
+        self.__bloom = bytearray(size)
+        for (digest,) in self.__connection.execute("SELECT digest FROM seen"):
+            self.__bloom_add(digest)
+        return self.__bloom
+
+    def __save_bloom(self) -> None:
+        """Save the Bloom filter together with the number of hashes it holds."""
+        count = self.__count()
+        tmp_path = f"{self.__bloom_path()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(count.to_bytes(8, "little"))
+            file.write(self.__bloom)
+        os.replace(tmp_path, self.__bloom_path())
+
+    @staticmethod
+    def __digest(challenge_hash: str) -> bytes:
+        """Hash a challenge hash to a fixed size digest."""
+        return hashlib.blake2b(challenge_hash.encode(), digest_size=16).digest()
@@ -0,0 +1,337 @@
+"""SQLite Store Module.
+
+.. module:: sqlite_store
+
+:synopsis: Local SQLite database of challenge and hotspot data
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from itertools import chain
+from itertools import islice
+from types import TracebackType
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Type
+from typing import Union
+
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
+from pydantic.fields import ModelField
+
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.records import ChallengeResultRecord
+from helium_api_wrapper.records import HotspotRecord
+from helium_api_wrapper.records import Record
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Time = Union[int, datetime]
+
+
+class SQLiteStore:
+    """SQLite database of challenge results and hotspots.
+
+    Challenge results are stored once per challenge hash and witness and
+    hotspots once per address, the latest version wins. Rows are inserted in
+    batches with one prepared statement per table in a single transaction.
+    The database runs in WAL mode, so it can be queried while data is added.
+    Indexes on the addresses and the time turn the usual lookups, like all
+    witnesses of a hotspot in the last week, into index seeks.
+    """
+
+    TABLES: Dict[Type[BaseModel], str] = {
+        ChallengeResult: "challenge_results",
+        Hotspot: "hotspots",
+    }
+    KEYS: Dict[Type[BaseModel], Tuple[str, ...]] = {
+        ChallengeResult: ("hash", "witness"),
+        Hotspot: ("address",),
+    }
+    INDEXES: Dict[Type[BaseModel], Tuple[Tuple[str, ...], ...]] = {
+        ChallengeResult: (("challengee", "time"), ("witness", "time"), ("time",)),
+        Hotspot: (("owner",),),
+    }
+
+    def __init__(self, path: str, batch_size: int = 10_000) -> None:
+        """Open or create the database.
+
+        :param path: Path of the database file
+        :param batch_size: Number of rows inserted per transaction
+        """
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        with self.__connection:
+            for model in self.TABLES:
+                self.__create_table(model)
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def __enter__(self) -> "SQLiteStore":
+        """Use the store as a context manager."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the store."""
+        self.close()
+
+    def write(self, data: Iterable[Any]) -> int:
+        """Insert challenge results or hotspots.
+
+        :param data: ChallengeResult or Hotspot models, their records or record
+            batches of load_challenge_batches
+        :raises TypeError: If the data is neither challenge nor hotspot data
+        :return: Number of inserted rows
+        """
+        items = iter(data)
+        first = next(items, None)
+        if first is None:
+            return 0
+        items = chain([first], items)
+        if hasattr(first, "to_pylist"):
+            return self.__insert(
+                ChallengeResult, (row for batch in items for row in batch.to_pylist())
+            )
+        model = self.__model_of(first)
+        return self.__insert(model, items)
+
+    def get_witnesses(
+        self,
+        address: str,
+        start: Optional[Time] = None,
+        end: Optional[Time] = None,
+        limit: Optional[int] = None,
+    ) -> List[ChallengeResult]:
+        """Get the challenges a hotspot witnessed.
+
+        :param address: Address of the witness
+        :param start: Earliest time of the challenges
+        :param end: Time before which the challenges are
+        :param limit: Maximum number of challenges, latest first
+        :return: The challenge results
+        """
+        return self.__query_results("witness", address, start, end, limit)
+
+    def get_challenges(
+        self,
+        address: str,
+        start: Optional[Time] = None,
+        end: Optional[Time] = None,
+        limit: Optional[int] = None,
+    ) -> List[ChallengeResult]:
+        """Get the witnesses of the challenges of a hotspot.
+
+        :param address: Address of the challengee
+        :param start: Earliest time of the challenges
+        :param end: Time before which the challenges are
+        :param limit: Maximum number of rows, latest first
+        :return: The challenge results
+        """
+        return self.__query_results("challengee", address, start, end, limit)
+
+    def get_hotspot(self, address: str) -> Optional[Hotspot]:
+        """Get a stored hotspot.
+
+        :param address: Address of the hotspot
+        :return: The hotspot or None if it is not stored
+        """
+        hotspots = self.__select(Hotspot, "WHERE address = ?", [address])
+        return hotspots[0] if hotspots else None
+
+    def get_hotspots_of_owner(self, owner: str) -> List[Hotspot]:
+        """Get the stored hotspots of an owner.
+
+        :param owner: Address of the owner
+        :return: The hotspots
+        """
+        return self.__select(Hotspot, "WHERE owner = ?", [owner])
+
+    def get_state(self, name: str) -> Optional[str]:
+        """Get a value saved with set_state, e.g. a checkpoint of a sync.
+
+        :param name: Name of the value
+        :return: The value or None if it is not set
+        """
+        row = self.__connection.execute(
+            "SELECT value FROM sync_state WHERE name = ?", [name]
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, name: str, value: Optional[str]) -> None:
+        """Save a value in the database, e.g. a checkpoint of a sync.
+
+        :param name: Name of the value
+        :param value: The value, None removes it
+        """
+        with self.__connection:
+            if value is None:
+                self.__connection.execute(
+                    "DELETE FROM sync_state WHERE name = ?", [name]
+                )
+            else:
+                self.__connection.execute(
+                    "INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)",
+                    [name, value],
+                )
+
+    def count(self, model: Type[BaseModel] = ChallengeResult) -> int:
+        """Count the stored rows of a model.
+
+        :param model: ChallengeResult or Hotspot
+        :return: Number of rows
+        """
+        table = self.TABLES[model]
+        count: int = self.__connection.execute(
+            f"SELECT COUNT(*) FROM {table}"  # noqa: S608
+        ).fetchone()[0]
+        return count
+
+    def close(self) -> None:
+        """Close the database."""
+        self.__connection.close()
+
+    def __create_table(self, model: Type[BaseModel]) -> None:
+        """Create the table and indexes of a model."""
+        table = self.TABLES[model]
+        columns = ", ".join(
+            f"{name} {self.__sql_type(field)}"
+            for name, field in model.__fields__.items()
+        )
+        key = ", ".join(self.KEYS[model])
+        self.__connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ({columns}, PRIMARY KEY ({key}))"
+        )
+        for index in self.INDEXES[model]:
+            name = f"{table}_{'_'.join(index)}"
+            self.__connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(index)})"
+            )
+
+    def __insert(self, model: Type[BaseModel], rows: Iterable[Any]) -> int:
+        """Insert rows of a model in batches."""
+        table = self.TABLES[model]
+        fields = list(model.__fields__)
+        conflict = "IGNORE" if model is ChallengeResult else "REPLACE"
+        statement = (
+            f"INSERT OR {conflict} INTO {table} ({', '.join(fields)}) "  # noqa: S608
+            f"VALUES ({', '.join('?' * len(fields))})"
+        )
+        inserted = 0
+        values = (self.__to_values(row, fields) for row in rows)
+        while batch := list(islice(values, self.batch_size)):
+            with self.__connection:
+                cursor = self.__connection.executemany(statement, batch)
+            inserted += max(cursor.rowcount, 0)
+        logger.debug(f"Inserted {inserted} rows into {table} of {self.path}")
+        return inserted
+
+    def __query_results(
+        self,
+        column: str,
+        address: str,
+        start: Optional[Time],
+        end: Optional[Time],
+        limit: Optional[int],
+    ) -> List[ChallengeResult]:
+        """Select the challenge results of an address in a time range."""
+        where = [f"{column} = ?"]
+        parameters: List[Any] = [address]
+        if start is not None:
+            where.append("time >= ?")
+            parameters.append(self.__timestamp(start))
+        if end is not None:
+            where.append("time < ?")
+            parameters.append(self.__timestamp(end))
+        clause = f"WHERE {' AND '.join(where)} ORDER BY time DESC"
+        if limit is not None:
+            clause += " LIMIT ?"
+            parameters.append(limit)
+        return self.__select(ChallengeResult, clause, parameters)
+
+    def __select(
+        self, model: Type[Any], clause: str, parameters: Sequence[Any]
+    ) -> List[Any]:
+        """Select rows of a model and parse them."""
+        fields = model.__fields__
+        cursor = self.__connection.execute(
+            f"SELECT {', '.join(fields)} FROM {self.TABLES[model]} {clause}",  # noqa: S608
+            parameters,
+        )
+        nested = [
+            name for name, field in fields.items() if self.__sql_type(field) == "JSON"
+        ]
+        models = []
+        for row in cursor:
+            values = dict(zip(fields, row))
+            for name in nested:
+                if values[name] is not None:
+                    values[name] = json.loads(values[name])
+            models.append(model(**values))
+        return models
+
+    @staticmethod
+    def __model_of(row: Any) -> Type[BaseModel]:
+        """Get the model of a row."""
+        if isinstance(row, (ChallengeResult, ChallengeResultRecord)):
+            return ChallengeResult
+        if isinstance(row, (Hotspot, HotspotRecord)):
+            return Hotspot
+        raise TypeError(f"Can not store {type(row).__name__} in SQLite.")
+
+    @staticmethod
+    def __to_values(
+        row: Union[BaseModel, Record, Dict[str, Any]], fields: List[str]
+    ) -> List[Any]:
+        """Get the column values of a row, nested values as JSON."""
+        if isinstance(row, dict):
+            values: Iterator[Any] = (row.get(field) for field in fields)
+        else:
+            values = (getattr(row, field) for field in fields)
+        return [
+            value
+            if value is None or isinstance(value, (int, float, str))
+            else json.dumps(value.dict() if isinstance(value, BaseModel) else value)
+            for value in values
+        ]
+
+    @staticmethod
+    def __sql_type(field: ModelField) -> str:
+        """Get the column type of a pydantic field."""
+        if field.shape != SHAPE_SINGLETON:
+            return "JSON"
+        types = {bool: "INTEGER", int: "INTEGER", float: "REAL", str: "TEXT"}
+        return types.get(field.outer_type_, "JSON")
+
+    @staticmethod
+    def __timestamp(value: Time) -> int:
+        """Convert a datetime to a timestamp in seconds."""
+        if isinstance(value, datetime):
+            return int(value.timestamp())
+        return value
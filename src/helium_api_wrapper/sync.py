@@ -0,0 +1,243 @@
+"""Sync Module.
+
+.. module:: sync
+
+:synopsis: Long-running mirror of hotspots and challenges in SQLite
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from pydantic import BaseModel
+
+from helium_api_wrapper.challenges import get_challenges_since
+from helium_api_wrapper.challenges import load_challenge_data
+from helium_api_wrapper.DataObjects import ChallengeResolved
+from helium_api_wrapper.hotspots import HotspotCache
+from helium_api_wrapper.hotspots import get_hotspot_page
+from helium_api_wrapper.metrics import Metrics
+from helium_api_wrapper.sqlite_store import SQLiteStore
+
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Names of the checkpoints in the store
+CHALLENGES_CHECKPOINT = "challenges.time"
+HOTSPOTS_CHECKPOINT = "hotspots.cursor"
+
+
+class JobStatus(BaseModel):
+    """Health of a job of the sync daemon."""
+
+    interval: float
+    runs: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    rows: int = 0
+    last_success: Optional[datetime] = None
+    last_error: Optional[str] = None
+    last_duration: Optional[float] = None
+
+
+class SyncDaemon:
+    """Mirror the hotspots and challenges of the chain in a SQLiteStore.
+
+    Two jobs run on their own intervals. The challenge job follows the head
+    of the chain: it loads the challenges since the latest stored one,
+    resolves them with their hotspots and stores both. The hotspot job
+    refreshes ``hotspot_pages`` pages of all hotspots per run and continues
+    with the next pages in the following run, so every hotspot is refreshed
+    once per round without requesting all of them at once.
+
+    The progress of both jobs is checkpointed in the store after their rows
+    are written, so a restarted daemon continues where it stopped and loses
+    nothing if it is killed in between. A failing job is logged and retried
+    on its next interval, the other job keeps running. stop ends the loop
+    after the running job.
+    """
+
+    def __init__(
+        self,
+        store: SQLiteStore,
+        challenge_interval: float = 60.0,
+        hotspot_interval: float = 600.0,
+        hotspot_pages: int = 1,
+        initial_pages: int = 1,
+        hotspot_cache: Optional[HotspotCache] = None,
+        health_path: Optional[str] = None,
+    ) -> None:
+        """Create a daemon, both jobs are due right away.
+
+        :param store: Store the data is written to
+        :param challenge_interval: Seconds between two challenge syncs
+        :param hotspot_interval: Seconds between two hotspot refreshes
+        :param hotspot_pages: Pages of hotspots refreshed per run
+        :param initial_pages: Pages of challenges loaded into an empty store
+        :param hotspot_cache: Cache for hotspot lookups, a new one by default
+        :param health_path: File the health is written to as JSON after
+            every job
+        """
+        self.store = store
+        self.hotspot_pages = hotspot_pages
+        self.initial_pages = initial_pages
+        self.hotspot_cache = hotspot_cache or HotspotCache()
+        self.health_path = health_path
+        self.metrics = Metrics()
+        self.started = datetime.now(timezone.utc)
+        self.jobs: Dict[str, Callable[[], int]] = {
+            "challenges": self.sync_challenges,
+            "hotspots": self.sync_hotspots,
+        }
+        self.status = {
+            "challenges": JobStatus(interval=challenge_interval),
+            "hotspots": JobStatus(interval=hotspot_interval),
+        }
+        now = time.monotonic()
+        self.__due = {name: now for name in self.jobs}
+        self.__stopped = threading.Event()
+
+    def sync_challenges(self) -> int:
+        """Store the challenges since the checkpoint with their hotspots.
+
+        :return: Number of stored rows
+        """
+        checkpoint = self.store.get_state(CHALLENGES_CHECKPOINT)
+        since = int(checkpoint) if checkpoint is not None else None
+        challenges = get_challenges_since(
+            since=since, max_pages=None if since is not None else self.initial_pages
+        )
+        if not challenges:
+            return 0
+
+        rows = self.store.write(
+            load_challenge_data(
+                challenges=challenges,
+                limit=len(challenges),
+                hotspot_cache=self.hotspot_cache,
+            )
+        )
+        found = self.hotspot_cache.get_many(self.__addresses(challenges))
+        rows += self.store.write(
+            hotspot for hotspot in found.values() if hotspot is not None
+        )
+        self.store.set_state(
+            CHALLENGES_CHECKPOINT, str(max(challenge.time for challenge in challenges))
+        )
+        return rows
+
+    def sync_hotspots(self) -> int:
+        """Refresh the next pages of hotspots.
+
+        :return: Number of stored rows
+        """
+        cursor = self.store.get_state(HOTSPOTS_CHECKPOINT)
+        rows = 0
+        for _ in range(self.hotspot_pages):
+            hotspots, cursor = get_hotspot_page(cursor)
+            rows += self.store.write(hotspots)
+            self.hotspot_cache.update(hotspots)
+            self.store.set_state(HOTSPOTS_CHECKPOINT, cursor)
+            if cursor is None:
+                logger.info("Refreshed all hotspots, starting the next round")
+                break
+        return rows
+
+    def run_pending(self) -> None:
+        """Run the jobs that are due once."""
+        for name, job in self.jobs.items():
+            if self.__stopped.is_set():
+                break
+            if self.__due[name] <= time.monotonic():
+                self.__run_job(name, job)
+
+    def run(self) -> None:
+        """Run the jobs on their intervals until the daemon is stopped."""
+        logger.info(f"Syncing into {self.store.path}")
+        with self.metrics:
+            while not self.__stopped.is_set():
+                self.run_pending()
+                self.__stopped.wait(self.__delay())
+        logger.info("Sync stopped")
+
+    def stop(self) -> None:
+        """Stop the daemon after the running job."""
+        self.__stopped.set()
+
+    def health(self) -> Dict[str, Any]:
+        """Describe the state of the daemon.
+
+        :return: Uptime, status of the jobs, checkpoints and counters. The
+            daemon is healthy while the last run of every job succeeded.
+        """
+        return {
+            "healthy": all(
+                status.consecutive_failures == 0 for status in self.status.values()
+            ),
+            "started": self.started.isoformat(),
+            "uptime": (datetime.now(timezone.utc) - self.started).total_seconds(),
+            "jobs": {
+                name: json.loads(status.json()) for name, status in self.status.items()
+            },
+            "checkpoints": {
+                name: self.store.get_state(name)
+                for name in (CHALLENGES_CHECKPOINT, HOTSPOTS_CHECKPOINT)
+            },
+            "counters": self.metrics.snapshot(),
+        }
+
+    def __run_job(self, name: str, job: Callable[[], int]) -> None:
+        """Run a job, record its status and schedule the next run."""
+        status = self.status[name]
+        started = time.monotonic()
+        try:
+            rows = job()
+        except Exception as error:
+            status.failures += 1
+            status.consecutive_failures += 1
+            status.last_error = f"{type(error).__name__}: {error}"
+            logger.exception(f"Sync of {name} failed")
+        else:
+            status.consecutive_failures = 0
+            status.rows += rows
+            status.last_success = datetime.now(timezone.utc)
+            logger.info(f"Synced {rows} rows of {name}")
+        status.runs += 1
+        status.last_duration = time.monotonic() - started
+        self.__due[name] = time.monotonic() + status.interval
+        if self.health_path is not None:
+            self.__write_health(self.health_path)
+
+    def __write_health(self, path: str) -> None:
+        """Replace the health file, readers never see a partial file."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(self.health(), file, indent=2)
+        os.replace(temporary, path)
+
+    def __delay(self) -> float:
+        """Seconds until the next job is due."""
+        return max(min(self.__due.values()) - time.monotonic(), 0.0)
+
+    @staticmethod
+    def __addresses(challenges: List[ChallengeResolved]) -> List[str]:
+        """Get the addresses of the challengees and witnesses."""
+        addresses = []
+        for challenge in challenges:
+            if challenge.challengee is not None:
+                addresses.append(challenge.challengee)
+            addresses.extend(witness.gateway for witness in challenge.witnesses or [])
+        return addresses
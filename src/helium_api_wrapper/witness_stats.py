@@ -0,0 +1,334 @@
+"""Witness Statistics Module.
+
+.. module:: witness_stats
+
+:synopsis: Incremental per hotspot statistics of challenge data
+
+.. moduleauthor:: DSIA21
+
+"""
+
+import logging
+import math
+from typing import TYPE_CHECKING
+from typing import Dict
+from typing import Generator
+from typing import Iterable
+from typing import Optional
+from typing import Union
+
+from pydantic import BaseModel
+
+from helium_api_wrapper.DataObjects import ChallengeResult
+
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Moments(BaseModel):
+    """Running count, mean and variance after Welford."""
+
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Sample variance of the values."""
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self) -> Optional[float]:
+        """Sample standard deviation of the values."""
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def add(self, value: float) -> None:
+        """Add a value.
+
+        :param value: The value to add
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "Moments") -> None:
+        """Merge the moments of another set of values.
+
+        :param other: The moments to merge
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+
+class QuantileSketch(BaseModel):
+    """Mergeable quantile sketch with relative accuracy (DDSketch).
+
+    Values are counted in logarithmic buckets, so a quantile is off by at
+    most ``relative_accuracy`` of its value. Positive and negative values are
+    kept in separate buckets, which covers RSSI and SNR as well as distances.
+    """
+
+    relative_accuracy: float = 0.01
+    count: int = 0
+    zero_count: int = 0
+    positive: Dict[int, int] = {}
+    negative: Dict[int, int] = {}
+
+    @property
+    def gamma(self) -> float:
+        """Ratio between the bounds of a bucket."""
+        return (1 + self.relative_accuracy) / (1 - self.relative_accuracy)
+
+    def add(self, value: float) -> None:
+        """Add a value.
+
+        :param value: The value to add
+        """
+        self.count += 1
+        if value == 0:
+            self.zero_count += 1
+            return
+        buckets = self.positive if value > 0 else self.negative
+        key = math.ceil(math.log(abs(value), self.gamma))
+        buckets[key] = buckets.get(key, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Merge another sketch with the same relative accuracy.
+
+        :param other: The sketch to merge
+        :raises ValueError: If the relative accuracies differ
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can not merge sketches with different accuracy")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile.
+
+        :param q: The quantile between 0 and 1
+        :return: The estimated value or None for an empty sketch
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self.__bucket_value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self.__bucket_value(key)
+        return None
+
+    def __bucket_value(self, key: int) -> float:
+        """Get the representative value of a bucket."""
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+
+class Distribution(BaseModel):
+    """Moments and quantiles of a value."""
+
+    moments: Moments = Moments()
+    sketch: QuantileSketch = QuantileSketch()
+
+    def add(self, value: Optional[float]) -> None:
+        """Add a value, missing values are ignored.
+
+        :param value: The value to add
+        """
+        if value is None:
+            return
+        self.moments.add(value)
+        self.sketch.add(value)
+
+    def merge(self, other: "Distribution") -> None:
+        """Merge another distribution.
+
+        :param other: The distribution to merge
+        """
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile.
+
+        :param q: The quantile between 0 and 1
+        :return: The estimated value
+        """
+        return self.sketch.quantile(q)
+
+
+class HotspotWitnessStats(BaseModel):
+    """Summary of the witness rows of a hotspot."""
+
+    address: str
+    witness_count: int = 0
+    valid_count: int = 0
+    invalid_count: int = 0
+    first_time: Optional[int] = None
+    last_time: Optional[int] = None
+    signal: Distribution = Distribution()
+    snr: Distribution = Distribution()
+    distance: Distribution = Distribution()
+
+    @property
+    def validity_rate(self) -> Optional[float]:
+        """Share of valid witnesses among the ones with a known validity."""
+        known = self.valid_count + self.invalid_count
+        return self.valid_count / known if known else None
+
+    def add(self, result: ChallengeResult) -> None:
+        """Add a witness row.
+
+        :param result: The challenge data of a witness
+        """
+        self.witness_count += 1
+        if result.is_valid is True:
+            self.valid_count += 1
+        elif result.is_valid is False:
+            self.invalid_count += 1
+        if result.time is not None:
+            if self.first_time is None or result.time < self.first_time:
+                self.first_time = result.time
+            if self.last_time is None or result.time > self.last_time:
+                self.last_time = result.time
+        self.signal.add(result.signal)
+        self.snr.add(result.snr)
+        self.distance.add(result.distance)
+
+    def merge(self, other: "HotspotWitnessStats") -> None:
+        """Merge the summary of the same hotspot from another aggregator.
+
+        :param other: The summary to merge
+        """
+        self.witness_count += other.witness_count
+        self.valid_count += other.valid_count
+        self.invalid_count += other.invalid_count
+        times = [
+            t
+            for t in (
+                self.first_time,
+                self.last_time,
+                other.first_time,
+                other.last_time,
+            )
+            if t is not None
+        ]
+        if times:
+            self.first_time = min(times)
+            self.last_time = max(times)
+        self.signal.merge(other.signal)
+        self.snr.merge(other.snr)
+        self.distance.merge(other.distance)
+
+
+class WitnessStatsAggregator(BaseModel):
+    """Per hotspot statistics that are updated row by row.
+
+    Summaries are keyed by the ``witness`` or the ``challengee`` address of
+    the rows. Aggregators of different processes or runs can be merged and
+    are stored as JSON.
+    """
+
+    key: str = "witness"
+    hotspots: Dict[str, HotspotWitnessStats] = {}
+
+    def add(self, result: ChallengeResult) -> None:
+        """Add a witness row.
+
+        :param result: The challenge data of a witness
+        """
+        address = getattr(result, self.key)
+        if address is None:
+            return
+        stats = self.hotspots.get(address)
+        if stats is None:
+            stats = self.hotspots[address] = HotspotWitnessStats(address=address)
+        stats.add(result)
+
+    def add_batch(self, batch: "pa.RecordBatch") -> None:
+        """Add the rows of a record batch from load_challenge_batches.
+
+        :param batch: The record batch
+        """
+        for row in batch.to_pylist():
+            self.add(ChallengeResult.construct(**row))
+
+    def consume(
+        self, results: Iterable[Union[ChallengeResult, "pa.RecordBatch"]]
+    ) -> Generator[Union[ChallengeResult, "pa.RecordBatch"], None, None]:
+        """Add rows of a stream and pass them on.
+
+        :param results: Stream of challenge data from load_challenge_data or
+            load_challenge_batches
+        :return: The same stream
+        """
+        for result in results:
+            if hasattr(result, "to_pylist"):
+                self.add_batch(result)
+            else:
+                self.add(result)
+            yield result
+
+    def merge(self, other: "WitnessStatsAggregator") -> None:
+        """Merge another aggregator with the same key.
+
+        :param other: The aggregator to merge
+        :raises ValueError: If the aggregators use different keys
+        """
+        if other.key != self.key:
+            raise ValueError("Can not merge aggregators with different keys")
+        for address, stats in other.hotspots.items():
+            if address in self.hotspots:
+                self.hotspots[address].merge(stats)
+            else:
+                self.hotspots[address] = stats.copy(deep=True)
+
+    def dump(self, path: str) -> None:
+        """Save the aggregator as JSON.
+
+        :param path: Path of the file
+        """
+        with open(path, "w") as file:
+            file.write(self.json())
+        logger.info(f"Saved statistics of {len(self.hotspots)} hotspots to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> "WitnessStatsAggregator":
+        """Load an aggregator from JSON.
+
+        :param path: Path of the file
+        :return: The aggregator
+        """
+        return cls.parse_file(path)
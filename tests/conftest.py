@@ -0,0 +1,41 @@
+"""Fixtures shared by the test cases."""
+import json
+from typing import Any
+
+import pytest
+
+
+@pytest.fixture
+def mock_hotspots() -> Any:
+    """Mock hotspots.
+
+    :return: List of hotspots
+    :rtype: Any
+    """
+    with open("tests/data/hotspots.json") as file:
+        hotspot = json.load(file)
+    return hotspot
+
+
+@pytest.fixture
+def mock_challenges() -> Any:
+    """Mock challenges.
+
+    :return: List of Challenges
+    :rtype: Any
+    """
+    with open("tests/data/challenges.json") as file:
+        challenge = json.load(file)
+    return challenge
+
+
+@pytest.fixture
+def mock_events() -> Any:
+    """Mock events.
+
+    :return: List of events
+    :rtype: Any
+    """
+    with open("tests/data/events.json") as file:
+        event = json.load(file)
+    return event
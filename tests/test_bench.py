@@ -0,0 +1,66 @@
+"""Test cases for the benchmarks."""
+import json
+import os
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from helium_api_wrapper import hotspots as hotspots
+from helium_api_wrapper.__main__ import bench
+from helium_api_wrapper.bench import PAGE_SIZE
+from helium_api_wrapper.bench import StandInAPI
+from helium_api_wrapper.bench import load_fixtures
+from helium_api_wrapper.bench import run_benchmarks
+
+
+def test_stand_in_api_serves_pages() -> None:
+    """It answers paginated hotspot requests and restores the endpoint."""
+    endpoint = os.environ.get("API_ENDPOINT")
+
+    with StandInAPI(load_fixtures(), pages=3) as api:
+        assert os.environ["API_ENDPOINT"] == api.url
+        result = hotspots.get_hotspots(pages=5)
+        found = hotspots.get_hotspot_by_address("some_address")
+
+    assert len(result) == 3 * PAGE_SIZE
+    assert found[0].address == "some_address"
+    assert api.requests == 4
+    assert os.environ.get("API_ENDPOINT") == endpoint
+
+
+def test_run_benchmarks() -> None:
+    """It reports the results of each benchmark as JSON."""
+    results = run_benchmarks(
+        n=20, only=["challenge_data", "resolve_challenge", "write_formats"]
+    )
+
+    benchmarks = json.loads(json.dumps(results))["benchmarks"]
+    assert sorted(benchmarks) == [
+        "challenge_data",
+        "resolve_challenge",
+        "write_formats",
+    ]
+    assert benchmarks["challenge_data"]["rows"] > 0
+    assert benchmarks["challenge_data"]["rows_per_s"] > 0
+    assert benchmarks["resolve_challenge"]["us_per_challenge"] > 0
+    assert {"csv", "parquet", "sqlite"} <= set(benchmarks["write_formats"])
+
+
+def test_run_benchmarks_unknown_name() -> None:
+    """It rejects unknown benchmarks."""
+    with pytest.raises(ValueError, match="Unknown benchmarks"):
+        run_benchmarks(only=["nothing"])
+
+
+def test_bench_command(tmp_path: Path) -> None:
+    """It writes the results to a file."""
+    output = tmp_path / "bench.json"
+
+    result = CliRunner().invoke(
+        bench, ["--n", "10", "--only", "model_construction", "--output", str(output)]
+    )
+
+    assert result.exit_code == 0
+    results = json.loads(output.read_text())
+    assert results["benchmarks"]["model_construction"]["Hotspot"]["us_per_object"] > 0
@@ -1,9 +1,20 @@
 """Test cases for the __main__ module."""
+import json
+from pathlib import Path
+from typing import Any
+from typing import List
+
 import pytest
 from click.testing import CliRunner
+from pytest_mock import MockFixture
 
+from helium_api_wrapper.__main__ import get_device
 from helium_api_wrapper.__main__ import get_hotspot
+from helium_api_wrapper.__main__ import load_challenges
 from helium_api_wrapper.__main__ import load_hotspots
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.seen_challenges import SeenChallengeIndex
+from helium_api_wrapper.sqlite_store import SQLiteStore
 
 
 @pytest.fixture
@@ -28,3 +39,182 @@ def c_load_hotspots(runner: CliRunner) -> None:
         ["--n", "1"],
     )
     assert result.exit_code == 0
+
+
+def test_load_challenges_incremental(
+    runner: CliRunner, mocker: MockFixture, tmp_path: Path
+) -> None:
+    """It stores the challenges while loading and marks them as seen."""
+    with open("tests/data/challenges.json") as file:
+        mocker.patch(
+            "helium_api_wrapper.challenges.request", return_value=json.load(file)
+        )
+    with open("tests/data/hotspots.json") as file:
+        hotspot: Any = json.load(file)[0]
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**hotspot)],
+    )
+    index_path = str(tmp_path / "seen.sqlite")
+
+    result = runner.invoke(
+        load_challenges,
+        [
+            "--n",
+            "5",
+            "--incremental",
+            "--flush_every",
+            "2",
+            "--file_format",
+            "sqlite",
+            "--path",
+            str(tmp_path),
+            "--seen_index",
+            index_path,
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    with SQLiteStore(str(tmp_path / "challenges.sqlite")) as store:
+        assert store.count() > 0
+    with SeenChallengeIndex(index_path) as index:
+        assert len(index) > 0
+
+
+def test_load_challenges_marks_seen_after_writing(
+    runner: CliRunner, mocker: MockFixture, tmp_path: Path
+) -> None:
+    """It marks no challenge as seen when writing the output fails."""
+    with open("tests/data/challenges.json") as file:
+        mocker.patch(
+            "helium_api_wrapper.challenges.request", return_value=json.load(file)
+        )
+    with open("tests/data/hotspots.json") as file:
+        hotspot: Any = json.load(file)[0]
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**hotspot)],
+    )
+
+    def fail(data: Any, **kwargs: Any) -> None:
+        list(data)
+        raise OSError("disk full")
+
+    mocker.patch("helium_api_wrapper.ResultHandler.write", side_effect=fail)
+    index_path = str(tmp_path / "seen.sqlite")
+
+    result = runner.invoke(
+        load_challenges,
+        ["--n", "5", "--path", str(tmp_path), "--seen_index", index_path],
+    )
+
+    assert isinstance(result.exception, OSError)
+    with SeenChallengeIndex(index_path) as index:
+        assert len(index) == 0
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ["--incremental", "--dataset", "--file_format", "parquet"],
+        ["--incremental", "--shards", "2"],
+        ["--dataset", "--shards", "2", "--file_format", "parquet"],
+        ["--dataset", "--file_format", "csv"],
+    ],
+)
+def test_load_challenges_rejects_conflicting_options(
+    runner: CliRunner, mocker: MockFixture, options: List[str]
+) -> None:
+    """It fails before loading anything if the output options conflict."""
+    load = mocker.patch("helium_api_wrapper.challenges.load_challenge_data")
+
+    result = runner.invoke(load_challenges, ["--n", "5", *options])
+
+    assert result.exit_code == 2
+    load.assert_not_called()
+
+
+def test_load_challenges_progress_and_profile(
+    runner: CliRunner, mocker: MockFixture, tmp_path: Path
+) -> None:
+    """It reports the progress and saves a profile."""
+    with open("tests/data/challenges.json") as file:
+        mocker.patch(
+            "helium_api_wrapper.challenges.request", return_value=json.load(file)
+        )
+    with open("tests/data/hotspots.json") as file:
+        hotspot: Any = json.load(file)[0]
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**hotspot)],
+    )
+    profile_path = tmp_path / "load.prof"
+
+    result = runner.invoke(
+        load_challenges,
+        [
+            "--n",
+            "5",
+            "--file_format",
+            "csv",
+            "--path",
+            str(tmp_path),
+            "--progress",
+            "--profile",
+            str(profile_path),
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "challenges 5/5" in result.output
+    assert profile_path.exists()
+    assert (tmp_path / "load.prof.tracemalloc").exists()
+
+
+def test_get_hotspot_batch(runner: CliRunner, mocker: MockFixture) -> None:
+    """It prints a JSON line per address and reports missing ones."""
+    with open("tests/data/hotspots.json") as file:
+        hotspot: Any = json.load(file)[0]
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        side_effect=lambda address: []
+        if address == "missing"
+        else [Hotspot(**{**hotspot, "address": address})],
+    )
+
+    result = runner.invoke(
+        get_hotspot,
+        ["--input", "-", "--workers", "2"],
+        input="first\n\n# comment\nmissing\nsecond\n",
+    )
+
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert result.exit_code == 1
+    assert sorted(line["id"] for line in lines) == ["first", "missing", "second"]
+    by_id = {line["id"]: line for line in lines}
+    assert by_id["first"]["result"]["address"] == "first"
+    assert by_id["missing"]["error"].startswith("LookupError")
+
+
+def test_get_device_batch(
+    runner: CliRunner, mocker: MockFixture, tmp_path: Path
+) -> None:
+    """It reads the UUIDs from a file."""
+    with open("tests/data/devices.json") as file:
+        devices: Any = json.load(file)
+    mocker.patch(
+        "helium_api_wrapper.devices.request",
+        side_effect=lambda url, endpoint: [{**devices[0], "id": url.split("/")[1]}],
+    )
+    input_path = tmp_path / "uuids.txt"
+    input_path.write_text("a\nb\nc\n")
+
+    result = runner.invoke(get_device, ["--input", str(input_path)])
+
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert result.exit_code == 0
+    assert {line["id"]: line["result"]["id"] for line in lines} == {
+        "a": "a",
+        "b": "b",
+        "c": "c",
+    }
@@ -0,0 +1,46 @@
+"""Test cases for the Helium client."""
+from helium_api_wrapper import endpoint as endpoint
+from helium_api_wrapper import hotspots as hotspots
+from helium_api_wrapper.bench import PAGE_SIZE
+from helium_api_wrapper.bench import StandInAPI
+from helium_api_wrapper.bench import load_fixtures
+from helium_api_wrapper.client import HeliumClient
+from helium_api_wrapper.metrics import REQUESTS
+
+
+def test_clients_use_their_own_transport() -> None:
+    """It sends the requests of each client to its own endpoint."""
+    fixtures = load_fixtures()
+
+    with StandInAPI(fixtures, pages=2) as first, StandInAPI(fixtures) as second:
+        with HeliumClient(api_endpoint=first.url) as a, HeliumClient(
+            api_endpoint=second.url
+        ) as b:
+            assert len(a.get_hotspots(pages=5)) == 2 * PAGE_SIZE
+            assert b.get_hotspot_by_address("some_address")[0].address == (
+                "some_address"
+            )
+            # the module functions keep using the default transport
+            hotspots.get_hotspot_by_address("some_address")
+
+    assert first.requests == 2
+    assert second.requests == 2
+    assert a.metrics.get(REQUESTS) == 2
+    assert b.metrics.get(REQUESTS) == 1
+
+
+def test_client_streams_and_threads_use_its_transport() -> None:
+    """It keeps its transport for generators and the threads of concurrent_map."""
+    with StandInAPI(load_fixtures()) as api:
+        client = HeliumClient(api_endpoint=api.url)
+        rows = client.load_challenge_data(limit=5)
+        assert endpoint.get_transport() is not client.transport
+        assert len(list(rows)) > 0
+        with client.activate():
+            assert endpoint.get_transport() is client.transport
+            found = client.hotspot_cache.get_many(["a", "b", "c"], max_workers=3)
+        client.close()
+
+    assert sorted(found) == ["a", "b", "c"]
+    assert client.metrics.get(REQUESTS) == api.requests
+    assert endpoint.get_transport() is not client.transport
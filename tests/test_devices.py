@@ -0,0 +1,162 @@
+"""Test cases for fleet wide device queries."""
+import json
+from typing import Any
+from typing import Dict
+
+import pytest
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import devices as devices
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.hotspots import HotspotCache
+
+
+@pytest.fixture
+def mock_devices() -> Any:
+    """Mock devices.
+
+    :return: List of devices
+    :rtype: Any
+    """
+    with open("tests/data/devices.json") as file:
+        device = json.load(file)
+    return device
+
+
+@pytest.fixture
+def mock_integration_events() -> Any:
+    """Mock integration events.
+
+    :return: List of integration events
+    :rtype: Any
+    """
+    with open("tests/data/integration_events.json") as file:
+        event = json.load(file)
+    return event
+
+
+def test_iter_devices_pages(mocker: MockFixture, mock_devices: Any) -> None:
+    """It streams the devices of all pages."""
+    mocker.patch(
+        "helium_api_wrapper.devices.iter_pages",
+        return_value=iter([mock_devices[:1], mock_devices[1:]]),
+    )
+
+    result = devices.get_devices()
+
+    assert [device.id for device in result] == [d["id"] for d in mock_devices]
+
+
+def test_get_devices_by_uuid(mocker: MockFixture, mock_devices: Any) -> None:
+    """It loads every requested device."""
+    by_uuid: Dict[str, Any] = {device["id"]: device for device in mock_devices}
+    mocker.patch(
+        "helium_api_wrapper.devices.request",
+        side_effect=lambda url, endpoint: [by_uuid[url.split("/")[1]]],
+    )
+
+    result = dict(devices.get_devices_by_uuid(list(by_uuid), max_workers=2))
+
+    assert {uuid: device.id for uuid, device in result.items()} == {
+        uuid: uuid for uuid in by_uuid
+    }
+
+
+def test_get_events_for_devices(mocker: MockFixture, mock_events: Any) -> None:
+    """It loads the events of every device."""
+    mocker.patch("helium_api_wrapper.devices.request", return_value=mock_events)
+
+    result = dict(
+        devices.get_events_for_devices(["a", "b", "c"], max_workers=2, as_records=True)
+    )
+
+    assert sorted(result) == ["a", "b", "c"]
+    assert all(len(events) == len(mock_events) for events in result.values())
+
+
+def test_get_last_integration(
+    mocker: MockFixture, mock_integration_events: Any, mock_hotspots: Any
+) -> None:
+    """It adds the radio values of the uplink to the hotspots."""
+    mocker.patch(
+        "helium_api_wrapper.events.request", return_value=mock_integration_events
+    )
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    gateway = mock_integration_events[0]["data"]["req"]["body"]["hotspots"][0]
+
+    result = devices.get_last_integration("some_uuid")
+
+    assert result.device_id == mock_integration_events[0]["device_id"]
+    assert len(result.hotspots) == 1
+    hotspot = result.hotspots[0]
+    assert hotspot.address == mock_hotspots[0]["address"]
+    assert hotspot.rssi == gateway["rssi"]
+    assert hotspot.datarate == gateway["spreading"]
+    assert hotspot.channel == gateway["channel"]
+    assert result.dict()["hotspots"][0]["snr"] == gateway["snr"]
+
+
+def test_get_last_integrations_shares_lookups(
+    mocker: MockFixture, mock_integration_events: Any, mock_hotspots: Any
+) -> None:
+    """It looks up every hotspot once for all devices."""
+    mocker.patch(
+        "helium_api_wrapper.events.request", return_value=mock_integration_events
+    )
+    lookup = mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+
+    result = dict(devices.get_last_integrations(["a", "b", "c"], max_workers=2))
+
+    assert sorted(result) == ["a", "b", "c"]
+    assert lookup.call_count == 1
+
+
+def test_get_last_integrations_skips_failing_devices(
+    mocker: MockFixture, mock_integration_events: Any, mock_hotspots: Any
+) -> None:
+    """It skips devices whose integration events can not be loaded."""
+    without_hotspots = json.loads(json.dumps(mock_integration_events))
+    without_hotspots[0]["data"]["req"]["body"]["hotspots"] = []
+    responses = {
+        "devices/a/events": mock_integration_events,
+        "devices/b/events": without_hotspots,
+    }
+
+    def respond(url: str, endpoint: str, params: Dict[str, Any]) -> Any:
+        if url not in responses:
+            raise OSError("not found")
+        return responses[url]
+
+    mocker.patch("helium_api_wrapper.events.request", side_effect=respond)
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+
+    result = dict(devices.get_last_integrations(["a", "b", "c"], max_workers=2))
+
+    assert list(result) == ["a"]
+
+
+def test_get_last_integration_uses_snapshot(
+    mocker: MockFixture, mock_integration_events: Any, mock_hotspots: Any
+) -> None:
+    """It does not request hotspots of a preloaded cache."""
+    mocker.patch(
+        "helium_api_wrapper.events.request", return_value=mock_integration_events
+    )
+    lookup = mocker.patch("helium_api_wrapper.hotspots.get_hotspot_by_address")
+    gateway = mock_integration_events[0]["data"]["req"]["body"]["hotspots"][0]
+    cache = HotspotCache()
+    cache.update([Hotspot(**{**mock_hotspots[0], "address": gateway["id"]})])
+
+    result = devices.get_last_integration("some_uuid", hotspot_cache=cache)
+
+    assert [hotspot.address for hotspot in result.hotspots] == [gateway["id"]]
+    lookup.assert_not_called()
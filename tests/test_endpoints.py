@@ -1,5 +1,7 @@
 """Test cases for Endpoints."""
 import json
+import threading
+import time
 from typing import Any
 
 import pytest
@@ -7,6 +9,7 @@ from pytest_mock import MockFixture
 
 from helium_api_wrapper import challenges as challenges
 from helium_api_wrapper import devices as devices
+from helium_api_wrapper import endpoint as endpoint
 from helium_api_wrapper import hotspots as hotspots
 from helium_api_wrapper.DataObjects import Challenge
 from helium_api_wrapper.DataObjects import Device
@@ -197,3 +200,62 @@ def test_get_device_integration(mocker: MockFixture, mock_integrations: Any) ->
 
     assert type(result).__name__ == "Event"
     assert result.sub_category == "uplink_integration_req"
+
+
+"""Test cases for the endpoint module."""
+
+
+def test_request_follows_cursor(mocker: MockFixture) -> None:
+    """It sends the cursor of each page with the next request."""
+    responses = [
+        {"data": [{"n": 1}], "cursor": "a"},
+        {"data": [{"n": 2}], "cursor": "b"},
+        {"data": [{"n": 3}], "cursor": None},
+    ]
+    cursors = []
+
+    def respond(url: str, headers: Any, params: Any) -> Any:
+        cursors.append(params.get("cursor"))
+        return responses[len(cursors) - 1]
+
+    mocker.patch(
+        "helium_api_wrapper.endpoint.__request_with_exponential_backoff",
+        side_effect=respond,
+    )
+
+    assert endpoint.request("challenges", pages=2) == [{"n": 1}, {"n": 2}]
+    cursors.clear()
+    assert len(endpoint.request("challenges", pages=10)) == 3
+    assert cursors == [None, "a", "b"]
+
+
+def test_rate_limiter_spaces_requests() -> None:
+    """It lets a burst pass and then waits for new tokens."""
+    limiter = endpoint.RateLimiter(rate=50, burst=2)
+
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+
+    assert time.monotonic() - started >= 0.05
+
+
+def test_concurrent_map_caps_concurrency() -> None:
+    """It never runs more calls at once than allowed."""
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def call(item: int) -> int:
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01)
+        with lock:
+            running[0] -= 1
+        return item * 2
+
+    results = dict(endpoint.concurrent_map(call, range(20), max_workers=3))
+
+    assert results == {item: item * 2 for item in range(20)}
+    assert peak[0] <= 3
@@ -0,0 +1,112 @@
+"""Test cases for the event follower."""
+import asyncio
+from typing import Any
+from typing import List
+
+from pytest_mock import MockFixture
+
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.event_follower import EventFollower
+
+
+def test_follower_yields_only_new_events(mocker: MockFixture, mock_events: Any) -> None:
+    """It parses each event once and keeps the high-water mark."""
+    responses: List[Any] = [mock_events[10:], mock_events[10:], mock_events]
+    mocker.patch(
+        "helium_api_wrapper.event_follower.request",
+        side_effect=lambda url, endpoint: responses.pop(0),
+    )
+    follower = EventFollower(["a"], min_interval=0, max_interval=0)
+
+    first = follower.poll()
+    second = follower.poll()
+    third = follower.poll()
+
+    latest = max(int(event["reported_at"]) for event in mock_events)
+    assert len(first) == len(mock_events) - 10
+    assert [int(e.reported_at) for e in first] == sorted(
+        int(e["reported_at"]) for e in mock_events[10:]
+    )
+    assert second == []
+    assert [int(e.reported_at) for e in third] == sorted(
+        int(e["reported_at"])
+        for e in mock_events[:10]
+        if int(e["reported_at"]) >= int(first[-1].reported_at)
+    )
+    assert follower.marks == {"a": latest}
+    assert follower.events == len(mock_events) - 10 + len(third)
+
+
+def test_follower_backs_off_idle_devices(mocker: MockFixture, mock_events: Any) -> None:
+    """It polls idle devices less often."""
+    mocker.patch("helium_api_wrapper.event_follower.request", return_value=mock_events)
+    clock = mocker.patch("helium_api_wrapper.event_follower.time")
+    clock.monotonic.return_value = 0
+    follower = EventFollower(["a", "b"], min_interval=10, max_interval=30)
+    polls = []
+
+    for now in (0, 10, 20, 30, 50, 60):
+        clock.monotonic.return_value = now
+        events = follower.poll()
+        polls.append((follower.polls, len(events)))
+
+    assert polls == [
+        (2, 2 * len(mock_events)),
+        (4, 0),
+        (4, 0),
+        (6, 0),
+        (6, 0),
+        (8, 0),
+    ]
+
+
+def test_follower_keeps_devices_after_failed_poll(
+    mocker: MockFixture, mock_events: Any
+) -> None:
+    """It polls a failed device again and keeps the events of the others."""
+
+    def respond(url: str, endpoint: str) -> Any:
+        if url == "devices/bad/events" and not failed:
+            failed.append(url)
+            raise OSError("down")
+        return mock_events
+
+    failed: List[str] = []
+    mocker.patch("helium_api_wrapper.event_follower.request", side_effect=respond)
+    follower = EventFollower(["good", "bad"], min_interval=0, max_interval=0)
+
+    first = follower.poll()
+    second = follower.poll()
+
+    latest = max(int(event["reported_at"]) for event in mock_events)
+    assert len(first) == len(mock_events)
+    assert follower.polls == 4
+    assert len(second) == len(mock_events)
+    assert follower.marks == {"good": latest, "bad": latest}
+
+
+def test_follower_continues_from_marks(mocker: MockFixture, mock_events: Any) -> None:
+    """It skips events up to the given high-water marks."""
+    mocker.patch("helium_api_wrapper.event_follower.request", return_value=mock_events)
+    mark = sorted(int(event["reported_at"]) for event in mock_events)[-5]
+
+    result = EventFollower(["a"], since={"a": mark}).poll()
+
+    assert all(int(event.reported_at) >= mark for event in result)
+    assert 0 < len(result) <= 5
+
+
+def test_follower_async_iteration(mocker: MockFixture, mock_events: Any) -> None:
+    """It streams events with async for until it is stopped."""
+    mocker.patch("helium_api_wrapper.event_follower.request", return_value=mock_events)
+    follower = EventFollower(["a"], min_interval=0)
+
+    async def collect() -> List[Event]:
+        events = []
+        async for event in follower:
+            events.append(event)
+            if len(events) == len(mock_events):
+                follower.stop()
+        return events
+
+    assert len(asyncio.run(collect())) == len(mock_events)
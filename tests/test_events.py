@@ -0,0 +1,101 @@
+"""Test cases for event queries."""
+import json
+from datetime import datetime
+from datetime import timezone
+from typing import Any
+
+import pytest
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import devices as devices
+from helium_api_wrapper import events as events
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.DataObjects import EventQuery
+
+
+@pytest.fixture
+def mock_integration_failed() -> Any:
+    """Mock integration events with a too long body.
+
+    :return: List of integration events
+    :rtype: Any
+    """
+    with open("tests/data/integration_events_failed.json") as file:
+        integration = json.load(file)
+    return integration
+
+
+def test_event_query_params() -> None:
+    """It sends the set filters with times in milliseconds."""
+    query = EventQuery(
+        sub_category="uplink_integration_req",
+        start=datetime(2022, 11, 24, tzinfo=timezone.utc),
+        end=1669299359092,
+        limit=5,
+    )
+
+    assert query.params() == {
+        "sub_category": "uplink_integration_req",
+        "start": 1669248000000,
+        "end": 1669299359092,
+        "limit": 5,
+    }
+    # integers are milliseconds, however small they are
+    assert EventQuery(start=1000).params() == {"start": 1000}
+
+
+def test_iter_events_filters(mocker: MockFixture, mock_events: Any) -> None:
+    """It pushes the query to the API and checks the returned events."""
+    request = mocker.patch(
+        "helium_api_wrapper.events.request", return_value=mock_events
+    )
+    query = EventQuery(category="uplink", start=1669295751369, limit=3)
+
+    result = list(events.iter_events("some_uuid", query))
+
+    assert request.call_args.kwargs["params"] == {
+        "category": "uplink",
+        "start": 1669295751369,
+        "limit": 3,
+    }
+    assert len(result) == 3
+    assert all(event.category == "uplink" for event in result)
+    assert all(event.reported_at >= 1669295751369 for event in result)
+    assert all(event._data is None for event in result)
+
+
+def test_lazy_event_decodes_data_on_access(mock_events: Any) -> None:
+    """It parses JSON data only when it is accessed."""
+    payload = {**mock_events[0], "data": json.dumps(mock_events[0]["data"])}
+    event = events.LazyEvent(payload)
+
+    assert event._data is None
+    assert event.data == mock_events[0]["data"]
+    assert event.to_event() == Event(**mock_events[0])
+
+
+def test_query_events_models(mocker: MockFixture, mock_events: Any) -> None:
+    """It validates the events unless they are lazy."""
+    mocker.patch("helium_api_wrapper.events.request", return_value=mock_events)
+    query = EventQuery(sub_category="uplink_confirmed")
+
+    result = events.query_events("some_uuid", query)
+
+    assert all(isinstance(event, Event) for event in result)
+    assert {event.sub_category for event in result} == {"uplink_confirmed"}
+
+
+def test_last_integration_skips_long_bodies(
+    mocker: MockFixture, mock_integration_failed: Any
+) -> None:
+    """It queries integration requests and skips unparsed bodies."""
+    request = mocker.patch(
+        "helium_api_wrapper.events.request", return_value=mock_integration_failed
+    )
+
+    with pytest.raises(Exception, match="No Integration Events"):
+        devices.get_last_integration("some_uuid")
+    assert request.call_args.kwargs["url"] == "devices/some_uuid/events"
+    assert request.call_args.kwargs["params"] == {
+        "sub_category": "uplink_integration_req"
+    }
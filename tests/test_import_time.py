@@ -0,0 +1,53 @@
+"""Test cases for the import time of the CLI."""
+import os
+import subprocess  # noqa: S404
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+
+SRC = str(Path(__file__).parents[1] / "src")
+HEAVY_MODULES = ("pandas", "pyarrow", "haversine", "numpy")
+
+
+def __import_times(module: str) -> Dict[str, int]:
+    """Import a module in a new interpreter and get the cumulative import times.
+
+    :param module: Name of the module
+    :return: Microseconds by imported module
+    """
+    env = {**os.environ, "PYTHONPATH": SRC}
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "helium_api_wrapper",
+        "helium_api_wrapper.__main__",
+        "helium_api_wrapper.hotspots",
+        "helium_api_wrapper.devices",
+        "helium_api_wrapper.challenges",
+    ],
+)
+def test_import_skips_heavy_modules(module: str) -> None:
+    """It does not import pandas, pyarrow or haversine up front."""
+    times = __import_times(module)
+
+    assert module in times
+    assert [name for name in HEAVY_MODULES if name in times] == []
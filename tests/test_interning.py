@@ -0,0 +1,67 @@
+"""Test cases for string interning."""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.interning import StringPool
+from helium_api_wrapper.ResultHandler import write
+
+
+def test_string_pool_interns() -> None:
+    """It returns one object for equal strings."""
+    pool = StringPool(max_size=2)
+    first = "".join(["11BCGP", "grFa2S"])
+    second = "".join(["11BCGPgr", "Fa2S"])
+
+    assert first is not second
+    assert pool.intern(first) is pool.intern(second)
+    assert len(pool) == 1
+    assert pool.intern("a") == "a"
+    # the pool is cleared when full, interned strings stay equal
+    assert pool.intern("b") == "b"
+    assert len(pool) == 1
+
+
+def test_string_pool_is_thread_safe() -> None:
+    """It never returns a different string while other threads clear it."""
+    pool = StringPool(max_size=10)
+    values = [f"address-{number}" for number in range(100)]
+
+    def intern_all(offset: int) -> bool:
+        return all(
+            pool.intern(value) == value for value in values[offset:] + values[:offset]
+        )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert all(executor.map(intern_all, range(0, 100, 5)))
+
+
+def test_parsed_challenges_share_strings(
+    mocker: MockFixture, mock_challenges: Any
+) -> None:
+    """It interns identifiers when parsing API payloads."""
+    mocker.patch("helium_api_wrapper.challenges.request", return_value=mock_challenges)
+
+    resolved = challenges.get_challenges(limit=5)
+
+    owners = [w.owner for c in resolved for w in c.witnesses or []]
+    by_value = {owner: owner for owner in owners}
+    assert all(owner is by_value[owner] for owner in owners)
+
+
+def test_write_dictionary_encodes_identifiers(
+    tmp_path: Path, mock_hotspots: Any
+) -> None:
+    """It stores repeated identifiers as categorical columns."""
+    data = [Hotspot(**hotspot) for hotspot in mock_hotspots * 10]
+
+    write(data, path=str(tmp_path), file_name="hotspots", file_format="parquet")
+
+    frame = pd.read_parquet(tmp_path / "hotspots.parquet")
+    assert frame["address"].dtype == "category"
+    assert frame["lat"].dtype == float
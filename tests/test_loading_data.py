@@ -1,6 +1,9 @@
 """Test cases data loading."""
 import json
+from collections import Counter
+from pathlib import Path
 from typing import Any
+from typing import List
 
 import pandas as pd
 import pytest
@@ -8,8 +11,11 @@ from numpy import int64
 from pytest_mock import MockFixture
 
 from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper import hotspots as hotspots
 from helium_api_wrapper.DataObjects import Challenge
+from helium_api_wrapper.DataObjects import ChallengeResult
 from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.seen_challenges import SeenChallengeIndex
 
 
 column_types = {
@@ -71,8 +77,9 @@ def test_challenge_loading_trilateration(
         autospec=True,
     )
 
-    data = challenges.load_challenge_data(limit=1)
-    test_df = pd.DataFrame([challenge.dict() for challenge in data])
+    data = list(challenges.load_challenge_data(limit=1))
+    test_df = pd.DataFrame([c.dict() for c in data if isinstance(c, ChallengeResult)])
+    assert len(test_df) == len(data)
 
     # TESTING COLUMNS AND DATATYPES
     # Following assertion is deactivated because we return everything, and don't filter it before.
@@ -89,3 +96,194 @@ def test_challenge_loading_trilateration(
     assert (
         len(test_df[["challengee"]].drop_duplicates()) == 1
     ), "Wrong number of challengees"
+
+
+def test_select_witnesses_top_k(mock_challenges: Any) -> None:
+    """Function testing if the strongest witnesses are selected."""
+    challenge = challenges.__resolve_challenge(Challenge(**mock_challenges[1]))
+    witnesses = challenge.witnesses or []
+
+    best = challenges.select_witnesses(witnesses, k=1)
+    top = challenges.select_witnesses(witnesses, k=3, key="snr")
+
+    assert best[0].signal == max(w.signal for w in witnesses)
+    snrs = [w.snr for w in witnesses if w.snr is not None]
+    assert [w.snr for w in top] == sorted(snrs, reverse=True)[: len(top)]
+
+
+def test_select_witnesses_filters(mock_challenges: Any) -> None:
+    """Function testing if witness filters are applied before selection."""
+    challenge = challenges.__resolve_challenge(Challenge(**mock_challenges[1]))
+    witnesses = challenge.witnesses or []
+
+    selected = challenges.select_witnesses(
+        witnesses,
+        filters=[challenges.is_valid, challenges.min_snr(0)],
+    )
+
+    assert len(selected) == 1
+    assert all(w.is_valid and w.snr is not None and w.snr >= 0 for w in selected)
+
+
+def test_challenge_loading_skips_filtered_witnesses(
+    mocker: MockFixture,
+    mock_hotspots: Any,
+    mock_challenges: Any,
+) -> None:
+    """Function testing if dropped witnesses are never looked up."""
+    lookup = mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    challenge = challenges.__resolve_challenge(Challenge(**mock_challenges[1]))
+
+    data = list(challenges.load_challenge_data([challenge], load_type="best_signal"))
+
+    assert len(data) == 1
+    assert lookup.call_count == 2
+
+
+def test_challenge_batches_match_results(
+    mocker: MockFixture,
+    mock_hotspots: Any,
+    mock_challenges: Any,
+) -> None:
+    """Function testing if record batches hold the same data as the models."""
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    resolved = [
+        challenges.__resolve_challenge(Challenge(**challenge))
+        for challenge in mock_challenges
+    ]
+
+    batches = list(challenges.load_challenge_batches(resolved, batch_size=10))
+    results = list(challenges.load_challenge_data(resolved))
+
+    assert all(batch.schema == challenges.CHALLENGE_RESULT_SCHEMA for batch in batches)
+    assert [batch.num_rows for batch in batches] == [10, 10, 10, 6]
+    rows = [row for batch in batches for row in batch.to_pylist()]
+    assert rows == [
+        result.dict() for result in results if isinstance(result, ChallengeResult)
+    ]
+    assert len(rows) == len(results)
+
+
+def test_challenge_loading_retries_missing_hotspots(
+    mocker: MockFixture,
+    mock_hotspots: Any,
+    mock_challenges: Any,
+) -> None:
+    """Function testing if temporarily missing hotspots are retried."""
+    failures = {"114qCeyTcnArowArUuLfYZszKrV37f4WNd1gFNCQciajPJgTcQW": 1}
+
+    def lookup(address: str) -> Any:
+        if failures.get(address, 0) > 0:
+            failures[address] -= 1
+            return []
+        return [Hotspot(**{**mock_hotspots[0], "address": address})]
+
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address", side_effect=lookup
+    )
+    challenge = challenges.__resolve_challenge(Challenge(**mock_challenges[0]))
+    report = challenges.ResolutionReport()
+
+    data = list(challenges.load_challenge_data([challenge], report=report))
+
+    assert [result.witness for result in data] == list(failures)
+    assert (report.deferred, report.recovered, report.unresolved_count) == (1, 1, 0)
+
+
+def test_challenge_retry_requests_each_missing_hotspot_once(
+    mocker: MockFixture,
+    mock_hotspots: Any,
+    mock_challenges: Any,
+) -> None:
+    """Function testing if shared missing hotspots are retried only once."""
+    challengee = mock_challenges[0]["path"][0]["challengee"]
+    witness = mock_challenges[1]["path"][0]["witnesses"][0]["gateway"]
+    lookups: Counter[str] = Counter()
+
+    def lookup(address: str) -> Any:
+        lookups[address] += 1
+        if address in (challengee, witness):
+            return []
+        return [Hotspot(**{**mock_hotspots[0], "address": address})]
+
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address", side_effect=lookup
+    )
+    resolved = [
+        challenges.__resolve_challenge(
+            Challenge(**{**mock_challenges[number % 2], "hash": str(number)})
+        )
+        for number in range(500)
+    ]
+    report = challenges.ResolutionReport()
+
+    data = list(challenges.load_challenge_data(resolved, report=report))
+
+    assert (lookups[challengee], lookups[witness]) == (2, 2)
+    assert max(lookups.values()) == 2
+    assert len(data) == 250 * 5
+    assert report.unresolved == {challengee: 250, witness: 250}
+
+
+def test_challenge_retry_does_not_emit_rows_twice(
+    tmp_path: Path,
+    mocker: MockFixture,
+    mock_hotspots: Any,
+    mock_challenges: Any,
+) -> None:
+    """Function testing if a failed retry emits no rows of the challenge."""
+    witness = mock_challenges[1]["path"][0]["witnesses"][0]["gateway"]
+    failures = {witness: 1}
+
+    def lookup(address: str) -> Any:
+        if failures.get(address, 0) > 0:
+            failures[address] -= 1
+            return []
+        if address == witness and down:
+            raise OSError("down")
+        return [Hotspot(**{**mock_hotspots[0], "address": address})]
+
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address", side_effect=lookup
+    )
+    challenge = challenges.__resolve_challenge(Challenge(**mock_challenges[1]))
+    first: List[Any] = []
+
+    with SeenChallengeIndex(str(tmp_path / "seen.db"), capacity=1000) as index:
+        down = True
+        with pytest.raises(OSError):
+            for result in challenges.load_challenge_data([challenge], seen_index=index):
+                first.append(result)
+        down = False
+        second = list(challenges.load_challenge_data([challenge], seen_index=index))
+
+    assert first == []
+    assert len({result.witness for result in second}) == len(second) == 6
+
+
+def test_hotspot_cache_remembers_missing_hotspots(
+    mocker: MockFixture, mock_hotspots: Any
+) -> None:
+    """Function testing the positive and negative hotspot cache."""
+    lookup = mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        side_effect=lambda address: (
+            [] if address == "missing" else [Hotspot(**mock_hotspots[0])]
+        ),
+    )
+    cache = hotspots.HotspotCache(negative_ttl=60)
+
+    assert cache.get("found") is not None
+    assert cache.get("found") is not None
+    assert cache.get("missing") is None
+    assert cache.get("missing") is None
+    assert lookup.call_count == 2
+    assert cache.get("missing", refresh=True) is None
+    assert lookup.call_count == 3
+    assert (cache.hits, cache.negative_hits) == (1, 1)
@@ -0,0 +1,95 @@
+"""Test cases for metrics, progress reports and profiles."""
+import io
+import pstats
+import tracemalloc
+from pathlib import Path
+from typing import Any
+from unittest.mock import Mock
+
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper import endpoint as endpoint
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.hotspots import HotspotCache
+from helium_api_wrapper.metrics import CACHE_HITS
+from helium_api_wrapper.metrics import CACHE_MISSES
+from helium_api_wrapper.metrics import CHALLENGES
+from helium_api_wrapper.metrics import REQUESTS
+from helium_api_wrapper.metrics import RETRIES
+from helium_api_wrapper.metrics import ROWS
+from helium_api_wrapper.metrics import Metrics
+from helium_api_wrapper.metrics import Progress
+from helium_api_wrapper.metrics import profile
+
+
+def test_metrics_count_requests_and_retries(mocker: MockFixture) -> None:
+    """It counts every request and retry while it is active."""
+    session = mocker.patch("helium_api_wrapper.endpoint.get_session")
+    session.return_value.request.side_effect = [
+        Mock(status_code=503),
+        Mock(status_code=200, json=lambda: {"data": [{"a": 1}]}),
+        Mock(status_code=200, json=lambda: {"data": [{"a": 1}]}),
+    ]
+    mocker.patch("helium_api_wrapper.endpoint.time.sleep")
+
+    with Metrics() as metrics:
+        endpoint.request(url="hotspots")
+    endpoint.request(url="hotspots")
+
+    assert metrics.get(REQUESTS) == 2
+    assert metrics.get(RETRIES) == 1
+
+
+def test_metrics_count_cache_lookups(mocker: MockFixture, mock_hotspots: Any) -> None:
+    """It counts the hits and misses of hotspot caches."""
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    cache = HotspotCache()
+
+    with Metrics() as metrics, Metrics() as nested:
+        cache.get("a")
+        cache.get("a")
+        cache.get("b")
+        cache.get("a")
+
+    assert metrics.snapshot() == nested.snapshot() == {CACHE_HITS: 2, CACHE_MISSES: 2}
+    assert metrics.hit_rate == 0.5
+
+
+def test_progress_tracks_load_challenge_data(
+    mocker: MockFixture, mock_challenges: Any, mock_hotspots: Any
+) -> None:
+    """It reports rows, challenges and the time left."""
+    mocker.patch("helium_api_wrapper.challenges.request", return_value=mock_challenges)
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    output = io.StringIO()
+
+    with Progress(total=10, interval=0.01, file=output) as progress:
+        rows = list(progress.track(challenges.load_challenge_data(limit=5)))
+
+    assert progress.metrics.get(ROWS) == len(rows)
+    assert progress.metrics.get(CHALLENGES) == len(mock_challenges)
+    report = output.getvalue().splitlines()[-1]
+    assert f"rows {len(rows)}" in report
+    assert f"challenges {len(mock_challenges)}/10" in report
+    assert "ETA" in report
+
+
+def test_profile_writes_statistics(tmp_path: Path) -> None:
+    """It saves the cProfile statistics and a memory snapshot."""
+    path = str(tmp_path / "job.prof")
+
+    with profile(path):
+        sorted(str(number) for number in range(10_000))
+
+    _, functions = pstats.Stats(path).get_print_list([])
+    assert len(functions) > 0
+    snapshot = tracemalloc.Snapshot.load(f"{path}.tracemalloc")
+    assert snapshot.traceback_limit == 25
+    assert not tracemalloc.is_tracing()
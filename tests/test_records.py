@@ -0,0 +1,55 @@
+"""Test cases for the compact records."""
+from typing import Any
+
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import hotspots as hotspots
+from helium_api_wrapper import records as records
+from helium_api_wrapper.challenges import CHALLENGE_RESULT_FIELDS
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.DataObjects import IntegrationHotspot
+
+
+def test_record_round_trip(mock_hotspots: Any, mock_events: Any) -> None:
+    """It converts models to records and back without losing data."""
+    hotspot = Hotspot(**mock_hotspots[0])
+    event = Event(**mock_events[0])
+
+    assert records.to_model(records.from_model(hotspot)) == hotspot
+    assert records.to_model(records.from_model(event)) == event
+
+
+def test_record_of_derived_models(mock_hotspots: Any) -> None:
+    """It stores derived models in the record of their base."""
+    hotspot = IntegrationHotspot(
+        **mock_hotspots[0], rssi=-100.0, snr=5.5, datarate="SF9BW125", frequency=904.1
+    )
+
+    record = records.from_model(hotspot)
+
+    assert isinstance(record, records.HotspotRecord)
+    assert records.to_model(record) == Hotspot(**mock_hotspots[0])
+    assert records.EventRecord._fields == tuple(Event.__fields__)
+
+
+def test_record_from_dict(mock_hotspots: Any) -> None:
+    """It builds records from API payloads and validates them on request."""
+    record = records.from_dict(records.HotspotRecord, mock_hotspots[0])
+
+    assert record.address == mock_hotspots[0]["address"]
+    assert records.to_model(record, validate=True) == Hotspot(**mock_hotspots[0])
+    assert records.ChallengeResultRecord._fields == CHALLENGE_RESULT_FIELDS
+
+
+def test_get_hotspots_as_records(mocker: MockFixture, mock_hotspots: Any) -> None:
+    """It returns records when asked."""
+    mocker.patch(
+        "helium_api_wrapper.hotspots.request",
+        return_value=mock_hotspots,
+    )
+
+    result = hotspots.get_hotspots(as_records=True)
+
+    assert type(result[0]).__name__ == "HotspotRecord"
+    assert len(result) == 3
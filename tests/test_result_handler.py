@@ -0,0 +1,456 @@
+"""Test cases for writing results to files."""
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+from typing import Any
+from typing import Iterator
+from typing import List
+from unittest.mock import Mock
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.challenges import CHALLENGE_RESULT_SCHEMA
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.ResultHandler import compact_dataset
+from helium_api_wrapper.ResultHandler import read
+from helium_api_wrapper.ResultHandler import read_manifest
+from helium_api_wrapper.ResultHandler import read_pickle
+from helium_api_wrapper.ResultHandler import write
+from helium_api_wrapper.ResultHandler import write_dataset
+from helium_api_wrapper.ResultHandler import write_incremental
+from helium_api_wrapper.ResultHandler import write_sharded
+from helium_api_wrapper.schemas import to_record_batch
+from helium_api_wrapper.sqlite_store import SQLiteStore
+
+
+def __read(path: Path, file_format: str) -> pd.DataFrame:
+    """Read a written file back to a data frame."""
+    if file_format == "csv":
+        return pd.read_csv(path, index_col=0)
+    if file_format == "json":
+        return pd.read_json(path, orient="records")
+    if file_format == "jsonl":
+        return pd.read_json(path, orient="records", lines=True)
+    if file_format == "pickle":
+        return pd.read_pickle(path)
+    if file_format == "pickle-chunks":
+        return read_pickle(str(path))
+    if file_format == "feather":
+        return pd.read_feather(path)
+    return pd.read_parquet(path)
+
+
+def __read_table(path: Path, **filters: Any) -> pa.Table:
+    """Read an export back to an arrow table."""
+    table = read(str(path), **filters)
+    assert isinstance(table, pa.Table)
+    return table
+
+
+@pytest.mark.parametrize(
+    "file_format,extension",
+    [
+        ("csv", "csv"),
+        ("json", "json"),
+        ("jsonl", "jsonl"),
+        ("pickle", "pkl"),
+        ("pickle-chunks", "chunks.pkl"),
+        ("feather", "feather"),
+        ("parquet", "parquet"),
+    ],
+)
+def test_write_in_chunks(
+    tmp_path: Path, mock_hotspots: Any, file_format: str, extension: str
+) -> None:
+    """It writes the same rows in chunks as at once."""
+    data = [Hotspot(**hotspot) for hotspot in mock_hotspots * 7]
+
+    write(data, str(tmp_path), "once", file_format, chunk_size=len(data))
+    write(iter(data), str(tmp_path), "chunks", file_format, chunk_size=3)
+
+    once = __read(tmp_path / f"once.{extension}", file_format)
+    chunks = __read(tmp_path / f"chunks.{extension}", file_format)
+    assert len(chunks) == len(data)
+    pd.testing.assert_frame_equal(chunks, once)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_write_pickle_as_one_data_frame(tmp_path: Path, mock_hotspots: Any) -> None:
+    """It pickles the chunks as one data frame without categorical columns."""
+    data = [Hotspot(**hotspot) for hotspot in mock_hotspots * 3]
+
+    write(data, str(tmp_path), "hotspots", "pickle", chunk_size=2)
+
+    frame = pd.read_pickle(tmp_path / "hotspots.pkl")
+    assert len(frame) == len(data)
+    assert frame["address"].dtype == object
+
+
+def test_write_streams_record_batches(
+    tmp_path: Path, mocker: MockFixture, mock_challenges: Any, mock_hotspots: Any
+) -> None:
+    """It writes record batches of load_challenge_batches in chunks."""
+    mocker.patch("helium_api_wrapper.challenges.request", return_value=mock_challenges)
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    batches = challenges.load_challenge_batches(limit=5, batch_size=4)
+
+    write(batches, str(tmp_path), "challenges", "parquet", chunk_size=8)
+
+    frame = pd.read_parquet(tmp_path / "challenges.parquet")
+    assert list(frame.columns) == list(ChallengeResult.__fields__)
+    assert len(frame) > 0
+
+
+def test_write_removes_partial_file(tmp_path: Path, mock_hotspots: Any) -> None:
+    """It leaves no file behind if the data stream fails."""
+
+    def data() -> Iterator[Hotspot]:
+        yield Hotspot(**mock_hotspots[0])
+        raise RuntimeError("API not reachable")
+
+    with pytest.raises(RuntimeError):
+        write(data(), str(tmp_path), "hotspots", "parquet", chunk_size=1)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_write_empty_data(tmp_path: Path) -> None:
+    """It writes an empty file for empty data."""
+    write([], str(tmp_path), "empty", "pickle")
+    write([], str(tmp_path), "empty", "pickle-chunks")
+
+    assert pd.read_pickle(tmp_path / "empty.pkl").empty
+    assert read_pickle(str(tmp_path / "empty.chunks.pkl")).empty
+
+
+def test_write_dataset_partitions_by_date(tmp_path: Path) -> None:
+    """It appends new files to the partitions of a dataset."""
+    day = 24 * 60 * 60
+    results = [
+        ChallengeResult.parse_obj(
+            dict(hash=str(i), signal=-100 + i, time=1_672_531_200 + i * day)
+        )
+        for i in range(3)
+    ]
+    path = tmp_path / "challenges"
+
+    write_dataset(results, str(path), chunk_size=2)
+    write_dataset(results[:1], str(path))
+
+    manifest = read_manifest(str(path))
+    assert manifest["format"] == "parquet"
+    assert [entry["partition"] for entry in manifest["files"]] == [
+        "date=2023-01-01",
+        "date=2023-01-02",
+        "date=2023-01-03",
+        "date=2023-01-01",
+    ]
+    assert all((path / entry["path"]).exists() for entry in manifest["files"])
+    table = ds.dataset(str(path), format="parquet", partitioning="hive").to_table()
+    assert table.num_rows == 4
+    assert sorted(table["date"].to_pylist())[:2] == ["2023-01-01"] * 2
+
+
+def test_write_dataset_partitions_by_region(tmp_path: Path) -> None:
+    """It partitions the rows by the grid cell of the challengee."""
+    results = [
+        ChallengeResult.parse_obj(
+            dict(challengee_lat=52.5, challengee_lng=13.4, time=0)
+        ),
+        ChallengeResult.parse_obj(
+            dict(challengee_lat=-33.9, challengee_lng=-70.6, time=0)
+        ),
+        ChallengeResult.parse_obj(
+            dict(challengee_lat=None, challengee_lng=None, time=None)
+        ),
+    ]
+
+    entries = write_dataset(results, str(tmp_path), region=True)
+
+    assert sorted(entry["partition"] for entry in entries) == [
+        "date=1970-01-01/region=N50E010",
+        "date=1970-01-01/region=S40W080",
+        "date=__HIVE_DEFAULT_PARTITION__/region=__HIVE_DEFAULT_PARTITION__",
+    ]
+
+
+def test_compact_dataset(tmp_path: Path) -> None:
+    """It merges small files without losing or duplicating rows."""
+    for i in range(3):
+        write_dataset(
+            [ChallengeResult.parse_obj(dict(challengee=str(i), hash=str(i), time=0))],
+            str(tmp_path),
+            "feather",
+        )
+
+    assert compact_dataset(str(tmp_path)) == 3
+
+    files = read_manifest(str(tmp_path))["files"]
+    assert len(files) == 1
+    assert files[0]["rows"] == 3
+    assert len(list((tmp_path / "date=1970-01-01").iterdir())) == 1
+    table = ds.dataset(str(tmp_path), format="feather").to_table()
+    assert sorted(table["hash"].to_pylist()) == ["0", "1", "2"]
+
+
+@pytest.fixture
+def challenge_dataset(tmp_path: Path) -> Path:
+    """Dataset of two challenges a day over five days.
+
+    :return: Path of the dataset
+    """
+    day = 24 * 60 * 60
+    results = [
+        ChallengeResult.parse_obj(
+            dict(
+                challengee=f"challengee-{i % 2}",
+                witness=f"witness-{i % 3}",
+                signal=-120 + i,
+                hash=str(i),
+                time=1_672_531_200 + i * day // 2,
+            )
+        )
+        for i in range(10)
+    ]
+    path = tmp_path / "challenges"
+    write_dataset(results, str(path), region=True)
+    return path
+
+
+def test_read_filters_dataset(challenge_dataset: Path) -> None:
+    """It only returns the rows that match all filters."""
+    table = __read_table(
+        challenge_dataset,
+        columns=["hash", "signal"],
+        start=datetime(2023, 1, 2, tzinfo=timezone.utc),
+        end=datetime(2023, 1, 4, tzinfo=timezone.utc),
+        addresses=["witness-0", "challengee-1"],
+        min_signal=-117,
+    )
+
+    assert table.column_names == ["hash", "signal"]
+    assert sorted(table["hash"].to_pylist(), key=int) == ["3", "5"]
+
+
+def test_read_outputs(challenge_dataset: Path) -> None:
+    """It returns data frames and models."""
+    frame = read(str(challenge_dataset), output="pandas", min_signal=-112)
+    models = list(read(str(challenge_dataset), output="models", min_signal=-112))
+
+    assert isinstance(frame, pd.DataFrame)
+    assert len(frame) == len(models) == 2
+    assert str(frame["signal"].dtype) == "Int64"
+    assert all(isinstance(model, ChallengeResult) for model in models)
+    assert {model.hash for model in models} == {"8", "9"}
+
+
+def test_read_memory_maps_feather_files(tmp_path: Path) -> None:
+    """It reads single feather files."""
+    results = [
+        ChallengeResult.parse_obj(dict(hash=str(i), signal=-100 - i)) for i in range(5)
+    ]
+    write(results, str(tmp_path), "challenges", "feather", chunk_size=2)
+
+    table = __read_table(tmp_path / "challenges.feather", min_signal=-102)
+
+    assert table["hash"].to_pylist() == ["0", "1", "2"]
+
+
+def __challenge_results(challenges: int, witnesses: int = 2) -> List[ChallengeResult]:
+    """Rows of some challenges with some witnesses each."""
+    return [
+        ChallengeResult.parse_obj(
+            dict(hash=str(i), witness=f"witness-{j}", signal=-100, time=i)
+        )
+        for i in range(challenges)
+        for j in range(witnesses)
+    ]
+
+
+def test_write_incremental_flushes_whole_challenges(tmp_path: Path) -> None:
+    """It appends a file every few challenges."""
+    on_flush = Mock()
+
+    flushes = write_incremental(
+        __challenge_results(5),
+        str(tmp_path),
+        "challenges",
+        "parquet",
+        every=2,
+        on_flush=on_flush,
+    )
+
+    assert flushes == on_flush.call_count == 3
+    files = read_manifest(str(tmp_path / "challenges"))["files"]
+    assert [entry["rows"] for entry in files] == [4, 4, 2]
+    assert __read_table(tmp_path / "challenges").num_rows == 10
+
+
+def test_write_incremental_keeps_flushed_data(tmp_path: Path) -> None:
+    """It keeps what was flushed before the loading failed."""
+
+    def data() -> Iterator[ChallengeResult]:
+        yield from __challenge_results(3)
+        raise RuntimeError("API not reachable")
+
+    with pytest.raises(RuntimeError):
+        write_incremental(data(), str(tmp_path), "challenges", "sqlite", every=1)
+
+    with SQLiteStore(str(tmp_path / "challenges.sqlite")) as store:
+        assert store.count() == 4
+    with pytest.raises(RuntimeError):
+        write_incremental(data(), str(tmp_path), "parts", "jsonl", every=1)
+    with pytest.raises(RuntimeError):
+        write_incremental(data(), str(tmp_path), "parts", "jsonl", every=1)
+    parts = list((tmp_path / "parts").iterdir())
+    assert len(parts) == 4
+    assert all(path.suffix == ".jsonl" for path in parts)
+
+
+def test_write_incremental_flushes_after_interval(tmp_path: Path) -> None:
+    """It flushes record batches once the interval passed."""
+    batches = [
+        to_record_batch(__challenge_results(2), CHALLENGE_RESULT_SCHEMA)
+        for _ in range(3)
+    ]
+
+    flushes = write_incremental(
+        batches, str(tmp_path), "challenges", "feather", every=100, interval=0
+    )
+
+    # the last challenge of each batch is flushed with the next batch
+    assert flushes == 4
+    assert __read_table(tmp_path / "challenges").num_rows == 12
+
+
+def test_write_incremental_keeps_challenges_of_batches_together(
+    tmp_path: Path, mocker: MockFixture, mock_challenges: Any, mock_hotspots: Any
+) -> None:
+    """It flushes challenges split over record batches at once."""
+    mocker.patch("helium_api_wrapper.challenges.request", return_value=mock_challenges)
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    expected = pd.Series(
+        [result.hash for result in challenges.load_challenge_data(limit=5)]
+    ).value_counts()
+
+    write_incremental(
+        challenges.load_challenge_batches(limit=5, batch_size=4),
+        str(tmp_path),
+        "parts",
+        "jsonl",
+        every=1,
+    )
+
+    parts = pd.concat(
+        pd.read_json(path, orient="records", lines=True).assign(part=path.name)
+        for path in (tmp_path / "parts").iterdir()
+    )
+    assert parts["part"].nunique() > 1
+    assert (parts.groupby("hash")["part"].nunique() == 1).all()
+    pd.testing.assert_series_equal(
+        parts["hash"].value_counts().sort_index(),
+        expected.sort_index(),
+        check_names=False,
+    )
+
+
+def test_write_sharded_threads(tmp_path: Path) -> None:
+    """It spreads the challenges over compressed shards."""
+    results = __challenge_results(20, witnesses=3)
+
+    entries = write_sharded(
+        results, str(tmp_path), "challenges", shards=3, compression="zstd", chunk_size=7
+    )
+
+    assert sum(entry["rows"] for entry in entries) == 60
+    assert read_manifest(str(tmp_path / "challenges"))["files"] == entries
+    for entry in entries:
+        parquet = pq.ParquetFile(tmp_path / "challenges" / entry["path"])
+        assert parquet.metadata.row_group(0).column(0).compression == "ZSTD"
+        hashes = parquet.read(columns=["hash"])["hash"].to_pylist()
+        assert all(hashes.count(value) == 3 for value in hashes)
+    table = __read_table(tmp_path / "challenges")
+    assert sorted(table["hash"].to_pylist()) == sorted(str(r.hash) for r in results)
+
+
+def test_write_sharded_processes(tmp_path: Path) -> None:
+    """It writes csv shards by time in separate processes."""
+    results = [
+        result.copy(update={"time": int(result.time or 0) * 24 * 60 * 60})
+        for result in __challenge_results(4)
+    ]
+
+    entries = write_sharded(
+        results,
+        str(tmp_path),
+        "challenges",
+        "csv",
+        shards=2,
+        shard_by="time",
+        workers="process",
+    )
+
+    assert sorted(entry["partition"] for entry in entries) == [
+        "shard=00000",
+        "shard=00001",
+    ]
+    frames = [pd.read_csv(tmp_path / "challenges" / e["path"]) for e in entries]
+    assert sum(len(frame) for frame in frames) == 8
+
+
+def test_write_sharded_rejects_unsupported_compression(tmp_path: Path) -> None:
+    """It only compresses formats whose writers support it."""
+    for file_format in ("csv", "json", "jsonl"):
+        with pytest.raises(ValueError):
+            write_sharded(
+                [], str(tmp_path), "challenges", file_format, compression="zip"
+            )
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_write_sharded_fails_if_a_worker_dies(
+    tmp_path: Path, mocker: MockFixture
+) -> None:
+    """It raises instead of waiting for a worker that died."""
+    mocker.patch("helium_api_wrapper.ResultHandler.__WORKER_POLL", 0.01)
+    mocker.patch(
+        "helium_api_wrapper.ResultHandler.__open_writer",
+        side_effect=[OSError("disk full"), *[Mock()] * 3],
+    )
+
+    with pytest.raises(RuntimeError, match="died"):
+        write_sharded(
+            __challenge_results(20),
+            str(tmp_path),
+            "challenges",
+            shards=2,
+            chunk_size=1,
+            queue_size=1,
+        )
+
+
+def test_write_sharded_aborts(tmp_path: Path) -> None:
+    """It removes all shards if the data stream fails."""
+
+    def data() -> Iterator[ChallengeResult]:
+        yield from __challenge_results(3)
+        raise RuntimeError("API not reachable")
+
+    with pytest.raises(RuntimeError):
+        write_sharded(data(), str(tmp_path), "challenges", shards=2, chunk_size=1)
+
+    assert read_manifest(str(tmp_path / "challenges"))["files"] == []
+    assert not list((tmp_path / "challenges").glob("*/*"))
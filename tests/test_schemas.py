@@ -0,0 +1,81 @@
+"""Test cases for the Arrow schemas of the DataObjects."""
+import json
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.DataObjects import Event
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.records import ChallengeResultRecord
+from helium_api_wrapper.records import from_model
+from helium_api_wrapper.ResultHandler import read_pickle
+from helium_api_wrapper.ResultHandler import write
+from helium_api_wrapper.schemas import arrow_schema
+from helium_api_wrapper.schemas import record_schema
+from helium_api_wrapper.schemas import to_record_batch
+
+
+def test_arrow_schema_of_challenge_result() -> None:
+    """It derives typed, compact columns from the model."""
+    schema = arrow_schema(ChallengeResult)
+
+    assert schema.names == list(ChallengeResult.__fields__)
+    assert schema.field("challengee").type == pa.dictionary(pa.int32(), pa.string())
+    assert schema.field("challengee_lat").type == pa.float64()
+    assert schema.field("signal").type == pa.int64()
+    assert schema.field("snr").type == pa.float32()
+    assert schema.field("is_valid").type == pa.bool_()
+    assert schema.field("hash").type == pa.string()
+    assert record_schema(ChallengeResultRecord) == schema
+    assert arrow_schema(ChallengeResult) is schema
+    assert challenges.CHALLENGE_RESULT_SCHEMA is challenges.CHALLENGE_RESULT_SCHEMA
+
+
+def test_arrow_schema_of_nested_models(mock_hotspots: Any) -> None:
+    """It stores nested models as structs."""
+    hotspots = [Hotspot(**hotspot) for hotspot in mock_hotspots]
+
+    batch = to_record_batch(hotspots, arrow_schema(Hotspot))
+
+    assert pa.types.is_struct(batch.schema.field("geocode").type)
+    geocode = hotspots[0].geocode
+    assert geocode is not None
+    assert batch.column("geocode").to_pylist()[0] == geocode.dict()
+
+
+def test_arrow_schema_serializes_unknown_types(mock_events: Any) -> None:
+    """It stores fields without a fixed type as JSON."""
+    events = [Event(**event) for event in mock_events]
+
+    batch = to_record_batch(events, arrow_schema(Event))
+
+    assert batch.schema.field("data").type == pa.string()
+    assert json.loads(batch.column("data")[0].as_py()) == events[0].data
+
+
+def test_write_keeps_types_of_missing_values(tmp_path: Path) -> None:
+    """It writes the same schema for chunks with and without missing values."""
+    results = [
+        ChallengeResult.parse_obj(dict(signal=-100, snr=5.5, time=1, hash="a")),
+        ChallengeResult.parse_obj(dict(signal=None, snr=None, time=None, hash="b")),
+    ]
+
+    write(results, str(tmp_path), "models", "parquet", chunk_size=1)
+    write(
+        map(from_model, results),
+        str(tmp_path),
+        "records",
+        "pickle-chunks",
+        chunk_size=1,
+    )
+
+    parquet = pq.ParquetFile(tmp_path / "models.parquet")
+    assert parquet.num_row_groups == 2
+    assert parquet.schema_arrow == arrow_schema(ChallengeResult)
+    frame = read_pickle(str(tmp_path / "records.chunks.pkl"))
+    assert str(frame["signal"].dtype) == "Int64"
+    assert frame["signal"].isna().tolist() == [False, True]
@@ -0,0 +1,63 @@
+"""Test cases for the seen challenge index."""
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.DataObjects import Challenge
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.seen_challenges import SeenChallengeIndex
+
+
+def test_seen_index_persists(tmp_path: Path) -> None:
+    """It keeps seen hashes across runs."""
+    path = str(tmp_path / "seen.db")
+    with SeenChallengeIndex(path, capacity=1000) as index:
+        index.update(["a", "b"])
+        assert "a" in index
+        assert "c" not in index
+
+    with SeenChallengeIndex(path, capacity=1000) as index:
+        assert "a" in index and "b" in index
+        assert "c" not in index
+        assert len(index) == 2
+
+
+def test_seen_index_drops_pending_on_error(tmp_path: Path) -> None:
+    """It does not store hashes of an aborted export."""
+    path = str(tmp_path / "seen.db")
+    with pytest.raises(RuntimeError):
+        with SeenChallengeIndex(path, capacity=1000) as index:
+            index.add("a")
+            raise RuntimeError()
+
+    with SeenChallengeIndex(path, capacity=1000) as index:
+        assert "a" not in index
+
+
+def test_challenge_loading_skips_seen_challenges(
+    tmp_path: Path,
+    mocker: MockFixture,
+    mock_hotspots: Any,
+    mock_challenges: Any,
+) -> None:
+    """It does not look up hotspots of seen challenges."""
+    lookup = mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    resolved = [
+        challenges.__resolve_challenge(Challenge(**challenge))
+        for challenge in mock_challenges
+    ]
+
+    with SeenChallengeIndex(str(tmp_path / "seen.db"), capacity=1000) as index:
+        first = list(challenges.load_challenge_data(resolved, seen_index=index))
+        calls = lookup.call_count
+        second = list(challenges.load_challenge_data(resolved, seen_index=index))
+
+    assert len(first) == 36
+    assert second == []
+    assert lookup.call_count == calls
@@ -0,0 +1,77 @@
+"""Test cases for the SQLite store."""
+from pathlib import Path
+from typing import Any
+
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.DataObjects import ChallengeResult
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.records import from_model
+from helium_api_wrapper.ResultHandler import write
+from helium_api_wrapper.sqlite_store import SQLiteStore
+
+
+def test_store_deduplicates_challenge_results(tmp_path: Path) -> None:
+    """It stores each witness of a challenge once."""
+    results = [
+        ChallengeResult.parse_obj(
+            dict(hash="a", witness="w1", challengee="c", time=1, is_valid=True)
+        ),
+        ChallengeResult.parse_obj(dict(hash="a", witness="w2", challengee="c", time=1)),
+        ChallengeResult.parse_obj(
+            dict(hash="b", witness="w1", challengee="d", time=2, signal=-90)
+        ),
+    ]
+
+    with SQLiteStore(str(tmp_path / "helium.sqlite"), batch_size=2) as store:
+        assert store.write(results) == 3
+        assert store.write(map(from_model, results)) == 0
+
+        assert store.count() == 3
+        witnessed = store.get_witnesses("w1")
+        assert [result.hash for result in witnessed] == ["b", "a"]
+        assert witnessed[0] == results[2]
+        assert witnessed[1].is_valid is True
+        assert [r.hash for r in store.get_witnesses("w1", start=2)] == ["b"]
+        assert sorted(str(r.witness) for r in store.get_challenges("c", end=2)) == [
+            "w1",
+            "w2",
+        ]
+
+
+def test_store_replaces_hotspots(tmp_path: Path, mock_hotspots: Any) -> None:
+    """It keeps the latest version of a hotspot."""
+    hotspot = Hotspot(**mock_hotspots[0])
+    renamed = hotspot.copy(update={"name": "renamed"})
+
+    with SQLiteStore(str(tmp_path / "helium.sqlite")) as store:
+        store.write([hotspot])
+        store.write([renamed])
+
+        assert store.count(Hotspot) == 1
+        assert store.get_hotspot(hotspot.address) == renamed
+        assert store.get_hotspots_of_owner(str(hotspot.owner)) == [renamed]
+        assert store.get_hotspot("unknown") is None
+
+
+def test_write_sqlite(
+    tmp_path: Path, mocker: MockFixture, mock_challenges: Any, mock_hotspots: Any
+) -> None:
+    """It adds record batches to a database with write."""
+    mocker.patch("helium_api_wrapper.challenges.request", return_value=mock_challenges)
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+    results = list(challenges.load_challenge_data(limit=5))
+
+    write(
+        challenges.load_challenge_batches(limit=5, batch_size=4),
+        str(tmp_path),
+        "helium",
+        "sqlite",
+    )
+
+    with SQLiteStore(str(tmp_path / "helium.sqlite")) as store:
+        assert store.count() == len({(r.hash, r.witness) for r in results})
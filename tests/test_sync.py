@@ -0,0 +1,157 @@
+"""Test cases for the sync daemon."""
+import json
+import threading
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+
+import pytest
+from click.testing import CliRunner
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.__main__ import sync
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.sqlite_store import SQLiteStore
+from helium_api_wrapper.sync import CHALLENGES_CHECKPOINT
+from helium_api_wrapper.sync import HOTSPOTS_CHECKPOINT
+from helium_api_wrapper.sync import SyncDaemon
+
+
+@pytest.fixture
+def timed_challenges(mock_challenges: Any) -> Any:
+    """Mock challenges, one second apart and newest first.
+
+    :return: List of Challenges
+    :rtype: Any
+    """
+    for age, item in enumerate(mock_challenges):
+        item["time"] -= age
+    return mock_challenges
+
+
+def __pages(challenge_list: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split challenges into pages of two."""
+    return [challenge_list[i : i + 2] for i in range(0, len(challenge_list), 2)]
+
+
+def test_get_challenges_since(mocker: MockFixture, timed_challenges: Any) -> None:
+    """It stops at the first page that reaches back before the time."""
+    pages = mocker.patch(
+        "helium_api_wrapper.challenges.iter_pages",
+        return_value=iter(__pages(timed_challenges)),
+    )
+    since = timed_challenges[2]["time"]
+
+    result = challenges.get_challenges_since(since=since)
+
+    assert [challenge.time for challenge in result] == [
+        item["time"] for item in timed_challenges[:3]
+    ]
+    pages.assert_called_once_with(url="challenges", endpoint="api", pages=None)
+
+
+def test_sync_challenges_continues_from_checkpoint(
+    mocker: MockFixture, timed_challenges: Any, mock_hotspots: Any, tmp_path: Path
+) -> None:
+    """It stores challenges and hotspots and only loads newer ones again."""
+    pages = mocker.patch(
+        "helium_api_wrapper.challenges.iter_pages",
+        side_effect=lambda **_: iter(__pages(timed_challenges)),
+    )
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        return_value=[Hotspot(**mock_hotspots[0])],
+    )
+
+    with SQLiteStore(str(tmp_path / "helium.sqlite")) as store:
+        daemon = SyncDaemon(store, initial_pages=3)
+        assert daemon.sync_challenges() > 0
+        stored = store.count()
+        assert stored > 0
+        assert store.count(Hotspot) == 1
+        assert store.get_state(CHALLENGES_CHECKPOINT) == str(
+            timed_challenges[0]["time"]
+        )
+
+        daemon.sync_challenges()
+        assert store.count() == stored
+
+    assert pages.call_args_list[0].kwargs["pages"] == 3
+    assert pages.call_args_list[1].kwargs["pages"] is None
+
+
+def test_sync_hotspots_refreshes_pages_in_rounds(
+    mocker: MockFixture, mock_hotspots: Any, tmp_path: Path
+) -> None:
+    """It refreshes the next page per run and starts over after the last one."""
+    pages = mocker.patch(
+        "helium_api_wrapper.hotspots.iter_cursor_pages",
+        side_effect=[
+            iter([(mock_hotspots[:2], "next")]),
+            iter([(mock_hotspots[2:], None)]),
+            iter([(mock_hotspots[:2], "next")]),
+        ],
+    )
+
+    with SQLiteStore(str(tmp_path / "helium.sqlite")) as store:
+        daemon = SyncDaemon(store)
+        assert daemon.sync_hotspots() == 2
+        assert store.get_state(HOTSPOTS_CHECKPOINT) == "next"
+        assert daemon.sync_hotspots() == 1
+        assert store.get_state(HOTSPOTS_CHECKPOINT) is None
+        daemon.sync_hotspots()
+        assert store.count(Hotspot) == 3
+
+    cursors = [call.kwargs["params"].get("cursor") for call in pages.call_args_list]
+    assert cursors == [None, "next", None]
+    assert daemon.hotspot_cache.get(mock_hotspots[2]["address"]) is not None
+
+
+def test_daemon_records_failures_and_stops(mocker: MockFixture, tmp_path: Path) -> None:
+    """It keeps running the other job when one fails and reports its health."""
+    mocker.patch.object(SyncDaemon, "sync_challenges", side_effect=OSError("down"))
+    mocker.patch.object(SyncDaemon, "sync_hotspots", return_value=5)
+    health_path = tmp_path / "health.json"
+
+    with SQLiteStore(str(tmp_path / "helium.sqlite")) as store:
+        daemon = SyncDaemon(store, health_path=str(health_path))
+        daemon.run_pending()
+        daemon.run_pending()
+
+        thread = threading.Thread(target=daemon.run)
+        thread.start()
+        daemon.stop()
+        thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    health = json.loads(health_path.read_text())
+    assert health["healthy"] is False
+    assert health["jobs"]["challenges"]["failures"] == 1
+    assert health["jobs"]["challenges"]["last_error"] == "OSError: down"
+    assert health["jobs"]["hotspots"]["rows"] == 5
+    assert health["jobs"]["hotspots"]["last_success"] is not None
+
+
+def test_sync_command_once(mocker: MockFixture, tmp_path: Path) -> None:
+    """It runs every job once and writes the health file."""
+    mocker.patch.object(SyncDaemon, "sync_challenges", return_value=3)
+    mocker.patch.object(SyncDaemon, "sync_hotspots", return_value=2)
+    health_path = tmp_path / "health.json"
+
+    result = CliRunner().invoke(
+        sync,
+        [
+            "--path",
+            str(tmp_path / "helium.sqlite"),
+            "--health",
+            str(health_path),
+            "--once",
+        ],
+    )
+
+    assert result.exit_code == 0
+    health = json.loads(health_path.read_text())
+    assert health["healthy"] is True
+    assert health["jobs"]["challenges"]["runs"] == 1
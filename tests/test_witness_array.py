@@ -0,0 +1,82 @@
+"""Test cases for the array backed witness storage."""
+import json
+from typing import Any
+
+import pytest
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.DataObjects import Challenge
+from helium_api_wrapper.DataObjects import WitnessArray
+
+
+def test_witness_array_behaves_like_list(mock_challenges: Any) -> None:
+    """It keeps list like access to the witnesses."""
+    listed = challenges.__resolve_challenge(Challenge(**mock_challenges[1]))
+    arrayed = challenges.__resolve_challenge(
+        Challenge(**mock_challenges[1]), witness_array=True
+    )
+    witnesses = listed.witnesses or []
+
+    assert isinstance(arrayed.witnesses, WitnessArray)
+    assert len(arrayed.witnesses) == len(witnesses)
+    assert list(arrayed.witnesses) == witnesses
+    assert arrayed.witnesses[-1] == witnesses[-1]
+    assert list(arrayed.witnesses[1:3]) == witnesses[1:3]
+    assert (
+        json.loads(arrayed.json())["witnesses"]
+        == json.loads(listed.json())["witnesses"]
+    )
+
+
+@pytest.mark.parametrize("key", ["signal", "snr"])
+def test_witness_array_selection_matches_list(mock_challenges: Any, key: str) -> None:
+    """It selects the same witnesses vectorized as from a list."""
+    listed = challenges.__resolve_challenge(Challenge(**mock_challenges[2]))
+    arrayed = challenges.__resolve_challenge(
+        Challenge(**mock_challenges[2]), witness_array=True
+    )
+    filters = [challenges.is_valid, challenges.min_snr(-15)]
+
+    for k in (1, 3, None):
+        expected = challenges.select_witnesses(
+            listed.witnesses or [], k=k, key=key, filters=filters
+        )
+        selected = challenges.select_witnesses(
+            arrayed.witnesses or [], k=k, key=key, filters=filters
+        )
+        assert [w.gateway for w in selected] == [w.gateway for w in expected]
+
+
+@pytest.mark.parametrize("largest", [True, False])
+def test_missing_snr_is_ranked_last(mock_challenges: Any, largest: bool) -> None:
+    """It ranks witnesses without snr last in both selection paths."""
+    challenge = json.loads(json.dumps(mock_challenges[2]))
+    for witness in challenge["path"][0]["witnesses"][::3]:
+        witness["snr"] = None
+    listed = challenges.__resolve_challenge(Challenge(**challenge))
+    arrayed = challenges.__resolve_challenge(Challenge(**challenge), witness_array=True)
+
+    for k in (1, 3, None):
+        expected = challenges.select_witnesses(
+            listed.witnesses or [], k=k, key="snr", largest=largest
+        )
+        selected = challenges.select_witnesses(
+            arrayed.witnesses or [], k=k, key="snr", largest=largest
+        )
+        assert [w.gateway for w in selected] == [w.gateway for w in expected]
+        assert expected[0].snr is not None
+    assert expected[-1].snr is None
+
+
+def test_witness_array_filter(mock_challenges: Any) -> None:
+    """It filters witnesses with boolean masks."""
+    challenge = challenges.__resolve_challenge(
+        Challenge(**mock_challenges[1]), witness_array=True
+    )
+    witnesses = challenge.witnesses
+    assert isinstance(witnesses, WitnessArray)
+
+    valid = witnesses.filter(witnesses.mask(valid_only=True))
+
+    assert len(valid) == 3
+    assert all(witness.is_valid for witness in valid)
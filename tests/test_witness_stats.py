@@ -0,0 +1,91 @@
+"""Test cases for the witness statistics."""
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pytest_mock import MockFixture
+
+from helium_api_wrapper import challenges as challenges
+from helium_api_wrapper.DataObjects import Challenge
+from helium_api_wrapper.DataObjects import Hotspot
+from helium_api_wrapper.witness_stats import Moments
+from helium_api_wrapper.witness_stats import QuantileSketch
+from helium_api_wrapper.witness_stats import WitnessStatsAggregator
+
+
+@pytest.fixture
+def mock_results(mocker: MockFixture) -> Any:
+    """Mock challenge data.
+
+    :param mocker: Mocker
+    :return: List of challenge data
+    :rtype: Any
+    """
+    with open("tests/data/hotspots.json") as file:
+        hotspots = json.load(file)
+    with open("tests/data/challenges.json") as file:
+        mock_challenges = json.load(file)
+
+    mocker.patch(
+        "helium_api_wrapper.hotspots.get_hotspot_by_address",
+        side_effect=lambda address: [Hotspot(**{**hotspots[1], "address": address})],
+    )
+    resolved = [
+        challenges.__resolve_challenge(Challenge(**challenge))
+        for challenge in mock_challenges
+    ]
+    return list(challenges.load_challenge_data(resolved))
+
+
+def test_moments_merge() -> None:
+    """It merges moments like they were computed at once."""
+    values = [-120.0, -100.5, -98.0, -87.25, -110.0]
+    whole, first, second = Moments(), Moments(), Moments()
+    for value in values:
+        whole.add(value)
+    for value in values[:2]:
+        first.add(value)
+    for value in values[2:]:
+        second.add(value)
+
+    first.merge(second)
+
+    assert first.count == whole.count
+    assert first.mean == pytest.approx(whole.mean)
+    assert first.variance == pytest.approx(whole.variance)
+    assert (first.min, first.max) == (whole.min, whole.max)
+
+
+def test_quantile_sketch_accuracy() -> None:
+    """It estimates quantiles within the relative accuracy."""
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    values = list(range(-140, 31))
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.quantile(0.5) == pytest.approx(-55, rel=0.01)
+    assert sketch.quantile(0.0) == pytest.approx(-140, rel=0.01)
+    assert sketch.quantile(1.0) == pytest.approx(30, rel=0.01)
+
+
+def test_aggregator_merge_and_serialization(tmp_path: Path, mock_results: Any) -> None:
+    """It merges partial aggregates and survives a round trip to disk."""
+    whole = WitnessStatsAggregator()
+    first = WitnessStatsAggregator()
+    second = WitnessStatsAggregator()
+    assert list(whole.consume(mock_results)) == mock_results
+    list(first.consume(mock_results[:10]))
+    list(second.consume(mock_results[10:]))
+
+    first.dump(str(tmp_path / "first.json"))
+    merged = WitnessStatsAggregator.load(str(tmp_path / "first.json"))
+    merged.merge(second)
+
+    assert merged.hotspots.keys() == whole.hotspots.keys()
+    for address, stats in whole.hotspots.items():
+        other = merged.hotspots[address]
+        assert other.witness_count == stats.witness_count
+        assert other.validity_rate == stats.validity_rate
+        assert other.signal.sketch == stats.signal.sketch
+        assert other.signal.moments.mean == pytest.approx(stats.signal.moments.mean)